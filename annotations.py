@@ -2,12 +2,39 @@
 Functions related to plotting spotify data. 
 """
 
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from matplotlib.patches import Polygon
 import data_collector
+from lazy import lazy_import
+from profiling import profiled, rows_of_first_arg
 
+plt = lazy_import("matplotlib.pyplot")
+patches = lazy_import("matplotlib.patches")
 
+
+@profiled
+def finish_figure(fig, path=None, show=True):
+    """
+    Saves, shows or returns a finished figure
+
+    Args: fig, a matplotlib figure. path, a string, an image file to save
+    the figure to and then close it, with the format taken from the file
+    extension. show, a bool, False to return the figure instead of showing
+    it when there is no path.
+
+    Return: fig if there is no path and show is False, otherwise None
+    """
+    if path is not None:
+        fig.savefig(path)
+        plt.close(fig)
+        return None
+    if show:
+        plt.show()
+        return None
+    return fig
+
+
+@profiled(rows=rows_of_first_arg)
 def make_levels(names):
     """
     Create levels for the graph_songs_percentile function
@@ -39,6 +66,7 @@ def make_levels(names):
     return levels
 
 
+@profiled(rows=rows_of_first_arg)
 def shorten_names_for_display(names, length=20):
     """ """
     shortened = []
@@ -51,7 +79,22 @@ def shorten_names_for_display(names, length=20):
     return shortened
 
 
-def graph_songs_percentile(rank, graph_title, song_length=20, x=30, y=15):
+@profiled(rows=rows_of_first_arg)
+def graph_songs_percentile(
+    rank, graph_title, song_length=20, x=30, y=15, path=None, show=True
+):
+    """
+    Plots songs on a timeline of their average percentile
+
+    Args: rank, a dictionary with song title keys and avg percentile
+    values. graph_title, a string. song_length, an int, the longest name
+    to display before shortening it. x and y, the figure size in inches.
+    path, a string, an image file (png, svg, ...) to save the figure to
+    instead of showing it. show, a bool, False to return the figure
+    without showing it.
+
+    Return: the figure if show is False and path is None, otherwise None
+    """
 
     # separate dictionary into x value and lables
     percentile = [*rank.values()]
@@ -93,14 +136,31 @@ def graph_songs_percentile(rank, graph_title, song_length=20, x=30, y=15):
 
     ax.margins(y=0.1)
 
-    return plt.show()
+    return finish_figure(fig, path, show)
 
 
+@profiled(rows=rows_of_first_arg)
 def make_boxplot_songs(
-    rank, graph_title, x_label="Songs", y_label="Percentiles", x=10, y=6
+    rank,
+    graph_title,
+    x_label="Songs",
+    y_label="Percentiles",
+    x=10,
+    y=6,
+    path=None,
+    show=True,
 ):
-    # rank is dictionary with just the songs to rank
-    "This is a whole mess, i need to edit it to take a dictionary as a parameter - Kelsey"
+    """
+    Plots a box of each song's percentiles, colored by album
+
+    Args: rank, a dictionary with song title keys and list of percentiles
+    values, with just the songs to plot. graph_title, x_label and y_label,
+    strings. x and y, the figure size in inches. path, a string, an image
+    file (png, svg, ...) to save the figure to instead of showing it.
+    show, a bool, False to return the figure without showing it.
+
+    Return: the figure if show is False and path is None, otherwise None
+    """
     names = [*rank.keys()]
     percentile = [*rank.values()]
 
@@ -136,7 +196,7 @@ def make_boxplot_songs(
             box_y.append(box.get_ydata()[j])
         box_coords = np.column_stack([box_x, box_y])
         # Alternate between Dark Khaki and Royal Blue
-        ax1.add_patch(Polygon(box_coords, facecolor=box_colors[i]))
+        ax1.add_patch(patches.Polygon(box_coords, facecolor=box_colors[i]))
         # Now draw the median lines back over what we just filled in
         med = boxplt["medians"][i]
         median_x = []
@@ -184,46 +244,100 @@ def make_boxplot_songs(
             color=box_colors[k],
         )
 
-    plt.show()
+    return finish_figure(fig, path, show)
+
 
+ALBUM_COLORS = [
+    "darkred",
+    "silver",
+    "yellowgreen",
+    "slategrey",
+    "teal",
+    "darkolivegreen",
+    "paleturquoise",
+    "mediumblue",
+    "dimgrey",
+]
+OTHER_COLOR = "gold"
 
+
+@profiled(rows=rows_of_first_arg)
 def create_box_colors(data):
-    colors = []
-    (
-        lh,
-        btc,
-        p2,
-        bmamc,
-        rfsncib,
-        lush,
-        sita,
-        punisher,
-        boygenius,
-    ) = data_collector.get_all_albums()
-    for i in data:
-        if i in lh:
-            colors.append("darkred")
-        elif i in btc:
-            colors.append("silver")
-        elif i in p2:
-            colors.append("yellowgreen")
-        elif i in bmamc:
-            colors.append("slategrey")
-        elif i in rfsncib:
-            colors.append("teal")
-        elif i in lush:
-            colors.append("darkolivegreen")
-        elif i in sita:
-            colors.append("paleturquoise")
-        elif i in punisher:
-            colors.append("mediumblue")
-        elif i in boygenius:
-            colors.append("dimgrey")
-        else:
-            colors.append("gold")
+    """
+    Picks the color of each song's album
+
+    Looks every song up in the album index from
+    data_collector.get_album_index, which is only built once per process.
+
+    Args: data, a list of song titles
+
+    Return: colors, a list of color names, one for each song, taken from
+    ALBUM_COLORS in the order of get_all_albums, or OTHER_COLOR for songs
+    not on any of those albums
+    """
+    album_index = data_collector.get_album_index()
+    colors = [
+        ALBUM_COLORS[album_index[i]] if i in album_index else OTHER_COLOR for i in data
+    ]
     return colors
 
 
+CHARTS = {
+    "graph_songs_percentile": graph_songs_percentile,
+    "make_boxplot_songs": make_boxplot_songs,
+}
+
+
+def _init_render_worker(album_index):
+    """
+    Sets up a process for render_batch
+
+    Args: album_index, the dictionary from data_collector.get_album_index,
+    so the worker colors songs without calling the spotify API
+    """
+    plt.switch_backend("Agg")
+    data_collector.ALBUM_INDEX = album_index
+
+
+def _render_job(job):
+    """
+    Renders one chart for render_batch
+
+    Args: job, a dictionary described in render_batch
+
+    Return: the path the chart was saved to
+    """
+    chart = CHARTS[job["chart"]]
+    chart(*job["args"], path=job["path"], **job.get("kwargs", {}))
+    return job["path"]
+
+
+@profiled(rows=rows_of_first_arg)
+def render_batch(jobs, processes=None):
+    """
+    Renders many charts to image files in parallel processes
+
+    The album index is built once here and handed to every worker, and
+    the workers draw with the non-interactive Agg backend, so this works
+    on machines without a display.
+
+    Args: jobs, a list of dictionaries, each with the keys "chart", the
+    name of a function in CHARTS, "args", a list of its positional
+    arguments, "path", the image file to save to, and optionally
+    "kwargs", a dictionary of its other keyword arguments. processes, an
+    int, the number of worker processes, or None for one per CPU.
+
+    Return: a list of the saved paths, in the same order as jobs
+    """
+    album_index = data_collector.get_album_index()
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_render_worker,
+        initargs=(album_index,),
+    ) as pool:
+        return list(pool.map(_render_job, jobs))
+
+
 # LEGEND EXAMPLE CODE
 # fig.text(0.80, 0.08, f'{N} Random Numbers',
 #          backgroundcolor=box_colors[0], color='black', weight='roman',
@@ -0,0 +1,521 @@
+"""
+Pooled asyncio backend for the spotify API.
+
+A drop-in alternative to the blocking spotipy client used by
+data_collector. Requests go over a small pool of keep-alive HTTP/1.1
+connections, optionally pipelining several requests on each, and every
+coroutine shares one client credentials token that is refreshed once when
+it expires. Only the standard library is used.
+
+AsyncBackend runs the client on a background event loop, so the blocking
+functions in data_collector can use it through data_collector.use_backend.
+"""
+
+import asyncio
+import base64
+import json
+import ssl
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+API_URL = "https://api.spotify.com/v1"
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+
+class ApiError(Exception):
+    """
+    An error response from the spotify API.
+
+    Has the same http_status and headers attributes as spotipy's
+    SpotifyException, so rate_limit.retry_after works with both.
+
+    Attributes:
+        http_status: an int, the HTTP status code.
+        headers: a dictionary of the response headers.
+    """
+
+    def __init__(self, http_status, message, headers=None):
+        super().__init__(f"http status {http_status}: {message}")
+        self.http_status = http_status
+        self.headers = headers or {}
+
+
+class Response:
+    """
+    A parsed HTTP response.
+
+    Attributes:
+        status: an int, the HTTP status code.
+        headers: a dictionary of headers, with title-case names.
+        body: bytes, the response body.
+        keep_alive: a bool, False if the server closes the connection.
+    """
+
+    def __init__(self, status, headers, body, keep_alive):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self):
+        """
+        Decodes the body as JSON.
+
+        Returns: the decoded value, or None for an empty body.
+        """
+        return json.loads(self.body) if self.body else None
+
+
+async def read_response(reader):
+    """
+    Reads one HTTP/1.1 response from a stream.
+
+    Args:
+        reader: an asyncio.StreamReader.
+
+    Returns: a Response.
+
+    Raises: asyncio.IncompleteReadError if the connection closes first.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    version, status = status_line.decode("latin-1").split()[:2]
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().title()] = value.strip()
+
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            chunks.append(chunk[:-2])
+        body = b"".join(chunks)
+    elif "Content-Length" in headers:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    else:
+        body = await reader.read()
+        headers["Connection"] = "close"
+
+    connection = headers.get("Connection", "").lower()
+    keep_alive = connection != "close" and (
+        version != "HTTP/1.0" or connection == "keep-alive"
+    )
+    return Response(int(status), headers, body, keep_alive)
+
+
+class _Connection:
+    """
+    One keep-alive connection, which may have several requests in flight.
+
+    Requests are written as soon as they are sent, and a reader task
+    hands the responses to them in the same order.
+    """
+
+    def __init__(self, reader, writer):
+        self.writer = writer
+        self.pending = deque()
+        self.closed = False
+        self._task = asyncio.get_running_loop().create_task(self._read(reader))
+
+    def send(self, request):
+        """
+        Writes a request.
+
+        Args:
+            request: bytes, the whole HTTP request.
+
+        Returns: a future of its Response.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(request)
+        return future
+
+    async def _read(self, reader):
+        """
+        Resolves the pending requests with the responses as they arrive.
+        """
+        try:
+            while True:
+                response = await read_response(reader)
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+                if not response.keep_alive:
+                    break
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        finally:
+            self.closed = True
+            self.writer.close()
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionResetError("connection closed"))
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        self.closed = True
+        self.writer.close()
+        self._task.cancel()
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections to any number of origins.
+
+    Each origin gets at most size connections. A request goes to the open
+    connection with the fewest requests in flight, as long as that is
+    under depth, otherwise a new connection is opened, otherwise it waits.
+    With depth above 1, requests are pipelined.
+
+    Attributes:
+        size: an int, the most connections per origin.
+        depth: an int, the most requests in flight on one connection.
+        opened: an int, the number of connections opened so far.
+    """
+
+    def __init__(self, size=8, depth=1):
+        self.size = size
+        self.depth = depth
+        self.opened = 0
+        self._connections = {}
+        self._opening = {}
+        self._available = asyncio.Condition()
+
+    async def _acquire(self, scheme, host, port):
+        """
+        Finds or opens a connection with room for another request.
+
+        A new connection's slot is reserved under the lock, and it is
+        opened outside of it, so several connections open at once.
+
+        Returns: a _Connection.
+        """
+        key = (scheme, host, port)
+        async with self._available:
+            while True:
+                connections = [
+                    c for c in self._connections.get(key, []) if not c.closed
+                ]
+                self._connections[key] = connections
+                if connections:
+                    best = min(connections, key=lambda c: len(c.pending))
+                    if len(best.pending) < self.depth:
+                        return best
+                if len(connections) + self._opening.get(key, 0) < self.size:
+                    self._opening[key] = self._opening.get(key, 0) + 1
+                    break
+                await self._available.wait()
+
+        connection = None
+        try:
+            context = ssl.create_default_context() if scheme == "https" else None
+            reader, writer = await asyncio.open_connection(host, port, ssl=context)
+            connection = _Connection(reader, writer)
+        finally:
+            async with self._available:
+                self._opening[key] -= 1
+                if connection is not None:
+                    self.opened += 1
+                    self._connections.setdefault(key, []).append(connection)
+                self._available.notify_all()
+        return connection
+
+    async def request(self, method, url, headers=None, body=b""):
+        """
+        Sends a request, retrying once if a reused connection was closed.
+
+        Args:
+            method: a string, like "GET".
+            url: a string, the absolute url.
+            headers: a dictionary of extra headers.
+            body: bytes, the request body.
+
+        Returns: a Response.
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        lines += [f"Content-Length: {len(body)}"] if body else []
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        for attempt in range(2):
+            connection = await self._acquire(parts.scheme, parts.hostname, port)
+            try:
+                return await connection.send(request)
+            except ConnectionResetError:
+                if attempt:
+                    raise
+            finally:
+                async with self._available:
+                    self._available.notify_all()
+        raise AssertionError("unreachable")
+
+    def close(self):
+        """
+        Closes every connection.
+        """
+        for connections in self._connections.values():
+            for connection in connections:
+                connection.close()
+        self._connections = {}
+
+
+class AsyncSpotify:
+    """
+    An asyncio spotify client for the calls data_collector needs.
+
+    Attributes:
+        api_url: a string, the base url of the web API.
+        token_url: a string, the url to get client credentials tokens from.
+        pool: the ConnectionPool every request goes through.
+        refreshes: an int, the number of tokens fetched so far.
+    """
+
+    def __init__(
+        self,
+        client_id,
+        client_secret,
+        api_url=API_URL,
+        token_url=TOKEN_URL,
+        pool_size=8,
+        pipeline_depth=1,
+        retries=3,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.token_url = token_url
+        self.pool = ConnectionPool(pool_size, pipeline_depth)
+        self.retries = retries
+        self.refreshes = 0
+        credentials = f"{client_id}:{client_secret}".encode("UTF-8")
+        self._basic = base64.b64encode(credentials).decode("ascii")
+        self._token = None
+        self._expires = 0
+        self._token_lock = asyncio.Lock()
+
+    async def token(self):
+        """
+        Gets the current access token, refreshing it if it is about to expire.
+
+        Concurrent callers wait for the same refresh instead of each
+        starting one.
+
+        Returns: a string, the access token.
+        """
+        async with self._token_lock:
+            if self._token is None or time.monotonic() >= self._expires - 60:
+                response = await self.pool.request(
+                    "POST",
+                    self.token_url,
+                    {
+                        "Authorization": f"Basic {self._basic}",
+                        "Content-Type": "application/x-www-form-urlencoded",
+                    },
+                    b"grant_type=client_credentials",
+                )
+                if response.status != 200:
+                    raise ApiError(response.status, response.body, response.headers)
+                data = response.json()
+                self._token = data["access_token"]
+                self._expires = time.monotonic() + data.get("expires_in", 3600)
+                self.refreshes += 1
+            return self._token
+
+    async def get(self, url):
+        """
+        Gets a JSON response from the API.
+
+        Expired tokens are refreshed and the request retried, and 429 and
+        server errors are retried after their Retry-After time or a short
+        backoff, up to retries times.
+
+        Args:
+            url: a string, an absolute url or a path under api_url.
+
+        Returns: the decoded JSON response.
+
+        Raises: ApiError if the request still fails.
+        """
+        if not url.startswith(("http://", "https://")):
+            url = f"{self.api_url}/{url.lstrip('/')}"
+        for attempt in range(self.retries + 1):
+            token = await self.token()
+            response = await self.pool.request(
+                "GET",
+                url,
+                {"Authorization": f"Bearer {token}", "Accept": "application/json"},
+            )
+            if response.status == 200:
+                return response.json()
+            error = ApiError(response.status, response.body, response.headers)
+            if attempt == self.retries:
+                raise error
+            if response.status == 401:
+                async with self._token_lock:
+                    if self._token == token:
+                        self._token = None
+            elif response.status == 429 or response.status >= 500:
+                delay = float(response.headers.get("Retry-After", 0) or 0)
+                await asyncio.sleep(max(delay, 0.1 * 2**attempt))
+            else:
+                raise error
+        raise AssertionError("unreachable")
+
+    async def items(self, path, params, limit):
+        """
+        Gets every item of a paged endpoint.
+
+        The first page says how many items there are, and the rest of the
+        pages are then requested at once.
+
+        Args:
+            path: a string, the endpoint under api_url.
+            params: a dictionary of query parameters.
+            limit: an int, the page size.
+
+        Returns: a list of every item, in order.
+        """
+
+        def page_url(offset):
+            query = urlencode({**params, "offset": offset, "limit": limit})
+            return f"{self.api_url}/{path}?{query}"
+
+        first = await self.get(page_url(0))
+        if not first.get("next"):
+            return first["items"]
+        total = first.get("total")
+        if total is None:
+            items, page = list(first["items"]), first
+            while page.get("next"):
+                page = await self.get(page["next"])
+                items += page["items"]
+            return items
+        pages = await asyncio.gather(
+            *(self.get(page_url(offset)) for offset in range(limit, total, limit))
+        )
+        return first["items"] + [item for page in pages for item in page["items"]]
+
+    async def playlist_tracks(self, uri):
+        """
+        Gets the song names in a playlist.
+
+        Args:
+            uri: a string, the spotify id of the playlist.
+
+        Returns: a list of strings, the song names in order, skipping local
+        or removed tracks.
+        """
+        items = await self.items(
+            f"playlists/{uri}/tracks", {"fields": "items(track(name)),next,total"}, 100
+        )
+        return [item["track"]["name"] for item in items if item["track"] is not None]
+
+    async def album_tracks(self, uri):
+        """
+        Gets the song names in an album.
+
+        Args:
+            uri: a string, the spotify id of the album.
+
+        Returns: a list of strings, the song names in order.
+        """
+        items = await self.items(f"albums/{uri}/tracks", {}, 50)
+        return [item["name"] for item in items]
+
+    def close(self):
+        """
+        Closes every pooled connection.
+        """
+        self.pool.close()
+
+
+class AsyncBackend:
+    """
+    Runs an AsyncSpotify on a background event loop for blocking callers.
+
+    The loop, and so the connection pool and token, live as long as the
+    backend, so every call from data_collector reuses them.
+
+    Attributes:
+        client: the AsyncSpotify the calls go to.
+    """
+
+    def __init__(self, client_id, client_secret, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        async def make_client():
+            return AsyncSpotify(client_id, client_secret, **options)
+
+        self.client = self.run(make_client())
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine on the background loop and waits for it.
+
+        Args:
+            coroutine: a coroutine object.
+
+        Returns: the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def playlist_tracks(self, uri):
+        """
+        Gets the song names in a playlist, see AsyncSpotify.playlist_tracks.
+        """
+        return self.run(self.client.playlist_tracks(uri))
+
+    def album_tracks(self, uri):
+        """
+        Gets the song names in an album, see AsyncSpotify.album_tracks.
+        """
+        return self.run(self.client.album_tracks(uri))
+
+    def playlist_tracks_many(self, uris):
+        """
+        Gets the song names in many playlists at once.
+
+        Args:
+            uris: a list of strings, spotify playlist ids.
+
+        Returns: a list with, for each playlist, a list of its song names or
+        the exception raised while fetching it.
+        """
+
+        async def fetch_all():
+            return await asyncio.gather(
+                *(self.client.playlist_tracks(uri) for uri in uris),
+                return_exceptions=True,
+            )
+
+        return self.run(fetch_all())
+
+    def close(self):
+        """
+        Closes the connections and stops the background loop.
+        """
+
+        async def close_client():
+            self.client.close()
+
+        self.run(close_client())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
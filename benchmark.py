@@ -0,0 +1,254 @@
+"""
+Benchmarks of the data_helpers pipeline on synthetic playlists.
+
+Run with `python benchmark.py --output results.json` to time the hot paths
+from 10 up to 100k playlists and the import time of the core modules, and
+add `--compare old.json` to flag any timing that got slower than a previous
+run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import data_helpers
+from synthetic import synthetic_playlists
+
+SIZES = [10, 100, 1000, 10000, 100000]
+IMPORT_MODULES = ["data_helpers", "data_collector", "annotations"]
+HEAVY_MODULES = ["pandas", "scipy", "matplotlib", "spotipy", "requests"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+{then}
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def _best_time(function, repeats):
+    """
+    Times a function with no arguments.
+
+    Args:
+        function: the function to time.
+        repeats: an int, the number of times to run it.
+
+    Returns: a float, the fastest run in seconds.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sizes=None, repeats=3, cutoff=5, **generator_args):
+    """
+    Times the pipeline functions on synthetic corpora of several sizes.
+
+    Args:
+        sizes: a list of ints, the numbers of playlists to time, SIZES by
+        default.
+        repeats: an int, the number of runs to take the fastest of.
+        cutoff: an int, the cutoff passed to the ranking functions.
+        generator_args: keyword arguments for synthetic_playlists.
+
+    Returns: a dictionary with the environment under "meta", and a list of
+    {"function", "playlists", "seconds"} dictionaries under "results".
+    """
+    results = []
+    for size in sizes or SIZES:
+        playlists, reversed_indexes = synthetic_playlists(size, **generator_args)
+        data = pd.DataFrame(playlists)
+        all_ranking = data_helpers.get_all_ranking(data, cutoff)
+        cases = {
+            "get_all_ranking": lambda: data_helpers.get_all_ranking(data, cutoff),
+            "get_avg_ranking": lambda: data_helpers.get_avg_ranking(data, cutoff),
+            "find_most_controversial": lambda: data_helpers.find_most_controversial(
+                all_ranking, 10
+            ),
+            "find_anomalies": lambda: data_helpers.find_anomalies(playlists, 0, 1),
+            "find_anomalies_auto": lambda: data_helpers.find_anomalies(playlists),
+            "reverse_rows": lambda: data_helpers.reverse_rows(
+                list(playlists), reversed_indexes
+            ),
+        }
+        for name, function in cases.items():
+            seconds = _best_time(function, repeats)
+            results.append({"function": name, "playlists": size, "seconds": seconds})
+            print(f"{name:>24} {size:>7} playlists {seconds:10.4f}s", file=sys.stderr)
+
+    meta = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeats": repeats,
+        "cutoff": cutoff,
+        "generator": generator_args,
+    }
+    return {"meta": meta, "results": results}
+
+
+def measure_import(module, then=""):
+    """
+    Imports a module in a fresh interpreter and times it.
+
+    The interpreter runs in this file's directory, so the modules are found
+    wherever the benchmark or tests are started from.
+
+    Args:
+        module: a string, the name of the module to import.
+        then: a string, python code to run after the import, before
+        checking which modules were loaded.
+
+    Returns: a dictionary with the seconds the import took, and "heavy",
+    a list of the HEAVY_MODULES loaded by the import and then.
+    """
+    script = _IMPORT_SCRIPT.format(module=module, then=then, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_times(modules=None, repeats=3):
+    """
+    Times importing each module in a fresh interpreter.
+
+    Args:
+        modules: a list of module names, IMPORT_MODULES by default.
+        repeats: an int, the number of imports to take the fastest of.
+
+    Returns: a list of {"function", "playlists", "seconds", "heavy"}
+    dictionaries, with function "import <module>" and playlists 0, so
+    they can be compared like the other timings.
+    """
+    results = []
+    for module in modules or IMPORT_MODULES:
+        runs = [measure_import(module) for _ in range(repeats)]
+        seconds = min(measured["seconds"] for measured in runs)
+        heavy = runs[0]["heavy"]
+        results.append(
+            {
+                "function": f"import {module}",
+                "playlists": 0,
+                "seconds": seconds,
+                "heavy": heavy,
+            }
+        )
+        print(
+            f"{'import ' + module:>24} {seconds:10.4f}s loads {heavy or 'nothing heavy'}",
+            file=sys.stderr,
+        )
+    return results
+
+
+def compare(old, new, tolerance=0.2):
+    """
+    Finds timings that got slower between two benchmark runs.
+
+    Args:
+        old: a dictionary returned by run, the baseline.
+        new: a dictionary returned by run.
+        tolerance: a number, how much slower than the baseline a timing
+        can be, as a fraction, before it counts as a regression.
+
+    Returns: a list of {"function", "playlists", "old", "new", "ratio"}
+    dictionaries, one for each regression.
+    """
+    baseline = {
+        (result["function"], result["playlists"]): result["seconds"]
+        for result in old["results"]
+    }
+    regressions = []
+    for result in new["results"]:
+        key = (result["function"], result["playlists"])
+        if key not in baseline or baseline[key] <= 0:
+            continue
+        ratio = result["seconds"] / baseline[key]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                {
+                    "function": key[0],
+                    "playlists": key[1],
+                    "old": baseline[key],
+                    "new": result["seconds"],
+                    "ratio": ratio,
+                }
+            )
+    return regressions
+
+
+def main(argv=None):
+    """
+    Runs the benchmarks from the command line.
+
+    Args:
+        argv: a list of command line arguments, sys.argv by default.
+
+    Returns: an int exit code, 1 if --compare found a regression.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--catalog-size", type=int, default=300)
+    parser.add_argument("--mean-length", type=float, default=50)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--reversed-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="a previous JSON result to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--skip-imports", action="store_true", help="don't time the module imports"
+    )
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.sizes,
+        args.repeats,
+        catalog_size=args.catalog_size,
+        mean_length=args.mean_length,
+        zipf=args.zipf,
+        reversed_fraction=args.reversed_fraction,
+        seed=args.seed,
+    )
+    if not args.skip_imports:
+        report["results"].extend(import_times(repeats=args.repeats))
+    if args.output:
+        with open(args.output, "w", encoding="UTF-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="UTF-8") as file:
+            regressions = compare(json.load(file), report, args.tolerance)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['function']} at {regression['playlists']} "
+                f"playlists: {regression['old']:.4f}s -> {regression['new']:.4f}s",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
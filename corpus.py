@@ -0,0 +1,340 @@
+"""
+A compact core data model for ranked playlists.
+
+Song titles are interned once in an InternTable that any number of
+corpora can share, and a Corpus keeps every playlist as a slice of one flat
+array of small integer song ids. Playlists are views into that array, and
+reversing or dropping playlists makes a new Corpus sharing the same
+arrays, so it costs nothing per song.
+"""
+
+import sys
+from array import array
+
+import numpy as np
+from lazy import is_instance, lazy_import
+from rank_matrix import factorize, rank_matrix_from_entries
+
+pd = lazy_import("pandas")
+
+
+def _is_missing(song):
+    """
+    Checks whether a playlist cell is padding.
+
+    Args:
+        song: a playlist cell.
+
+    Returns: a bool, True for None, NaN and "".
+    """
+    return song is None or song == "" or (isinstance(song, float) and song != song)
+
+
+class InternTable:
+    """
+    A shared table of song titles and their integer ids.
+
+    Attributes:
+        titles: a list of strings, the title of each id, in the order they
+            were first interned.
+    """
+
+    __slots__ = ("titles", "_ids")
+
+    def __init__(self, titles=()):
+        self.titles = []
+        self._ids = {}
+        for title in titles:
+            self.intern(title)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def intern(self, title):
+        """
+        Gets the id of a title, adding it if it is new.
+
+        Args:
+            title: a string, a song title.
+
+        Returns: an int, the title's id.
+        """
+        song_id = self._ids.get(title)
+        if song_id is None:
+            song_id = self._ids[title] = len(self.titles)
+            self.titles.append(sys.intern(title))
+        return song_id
+
+    def intern_many(self, titles):
+        """
+        Gets the ids of many titles, adding the new ones.
+
+        Each distinct title is only looked up once.
+
+        Args:
+            titles: a 1d object array of strings.
+
+        Returns: an int64 array of ids.
+        """
+        codes, uniques = factorize(titles)
+        lookup = np.fromiter(
+            (self.intern(title) for title in uniques),
+            dtype=np.int64,
+            count=len(uniques),
+        )
+        return lookup[codes]
+
+    def memory_usage(self):
+        """
+        Estimates the bytes used by the table.
+
+        Returns: an int, the size of the titles list, the id dictionary and
+        every title string.
+        """
+        strings = sum(sys.getsizeof(title) for title in self.titles)
+        return sys.getsizeof(self.titles) + sys.getsizeof(self._ids) + strings
+
+
+class Playlist:
+    """
+    One ranked playlist, a view into the song ids of a Corpus.
+
+    Attributes:
+        table: the InternTable the song ids belong to.
+        song_ids: an unsigned int array view of the song ids, in ranked
+            order.
+    """
+
+    __slots__ = ("table", "song_ids")
+
+    def __init__(self, table, song_ids):
+        self.table = table
+        self.song_ids = song_ids
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    def __iter__(self):
+        titles = self.table.titles
+        return (titles[song_id] for song_id in self.song_ids.tolist())
+
+    def __getitem__(self, position):
+        return self.table.titles[self.song_ids[position]]
+
+    def __eq__(self, other):
+        if isinstance(other, Playlist):
+            return self.titles() == other.titles()
+        return self.titles() == list(other)
+
+    def __repr__(self):
+        return f"Playlist({self.titles()!r})"
+
+    def titles(self):
+        """
+        Gets the song titles.
+
+        Returns: a list of strings, in ranked order.
+        """
+        return list(self)
+
+    def reversed(self):
+        """
+        Gets the playlist in the opposite order, without copying.
+
+        Returns: a Playlist viewing the same song ids backwards.
+        """
+        return Playlist(self.table, self.song_ids[::-1])
+
+    def to_array(self):
+        """
+        Copies the song ids into a compact array.array.
+
+        Returns: an array('H') of song ids, or array('I') if the table has
+        more than 65536 titles.
+        """
+        return array(self.song_ids.dtype.char, self.song_ids.tobytes())
+
+
+class Corpus:
+    """
+    Ranked playlists as views into one flat array of interned song ids.
+
+    Playlist i of the corpus is the slice offsets[order[i]]:offsets[order[i]
+    + 1] of the song ids, read backwards if flipped[i] is True. reverse and
+    drop only make new order and flipped arrays, and share the song ids,
+    offsets and intern table.
+
+    Attributes:
+        table: the InternTable the song ids belong to.
+    """
+
+    __slots__ = ("table", "_song_ids", "_offsets", "_order", "_flipped")
+
+    def __init__(self, table, song_ids, offsets, order=None, flipped=None):
+        self.table = table
+        self._song_ids = song_ids
+        self._offsets = offsets
+        num_playlists = len(offsets) - 1
+        self._order = np.arange(num_playlists) if order is None else order
+        self._flipped = np.zeros(len(self._order), bool) if flipped is None else flipped
+
+    @classmethod
+    def from_playlists(cls, data, table=None):
+        """
+        Interns playlists into a corpus.
+
+        Args:
+            data: a 2d list of songs with each inner list being a playlist,
+            or a dataframe with one playlist per row. None, NaN and "" cells
+            are padding and are left out.
+            table: an InternTable to share, or None for a new one.
+
+        Returns: a Corpus of the playlists, in order.
+        """
+        table = InternTable() if table is None else table
+        if is_instance(data, "pandas", "DataFrame"):
+            data = data.to_numpy(dtype=object).tolist()
+        playlists = [[song for song in row if not _is_missing(song)] for row in data]
+        lengths = [len(playlist) for playlist in playlists]
+        flat = np.empty(sum(lengths), dtype=object)
+        flat[:] = [song for playlist in playlists for song in playlist]
+        ids = table.intern_many(flat) if len(flat) else np.empty(0, np.int64)
+        dtype = np.uint16 if len(table) <= 1 << 16 else np.uint32
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        return cls(table, ids.astype(dtype), offsets)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        row = self._order[i]
+        song_ids = self._song_ids[self._offsets[row] : self._offsets[row + 1]]
+        return Playlist(self.table, song_ids[::-1] if self._flipped[i] else song_ids)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def reverse(self, indexes):
+        """
+        Reverses some playlists, without copying any songs.
+
+        Args:
+            indexes: a list of ints, the positions of the playlists to
+            reverse.
+
+        Returns: a new Corpus sharing this one's song ids.
+        """
+        flipped = self._flipped.copy()
+        flipped[np.asarray(indexes, dtype=np.int64)] ^= True
+        return Corpus(self.table, self._song_ids, self._offsets, self._order, flipped)
+
+    def drop(self, indexes):
+        """
+        Leaves some playlists out, without copying any songs.
+
+        Args:
+            indexes: a list of ints, the positions of the playlists to drop.
+
+        Returns: a new Corpus sharing this one's song ids.
+        """
+        kept = np.ones(len(self), bool)
+        kept[np.asarray(indexes, dtype=np.int64)] = False
+        return Corpus(
+            self.table,
+            self._song_ids,
+            self._offsets,
+            self._order[kept],
+            self._flipped[kept],
+        )
+
+    def to_playlists(self):
+        """
+        Turns the corpus into lists of song titles.
+
+        Returns: a 2d list of song titles, with each inner list being a
+        playlist.
+        """
+        return [playlist.titles() for playlist in self]
+
+    def entries(self):
+        """
+        Finds the song id of every entry of every playlist, in ranked order.
+
+        Returns: an int array with the playlist of every entry, and an int
+        array with its song id.
+        """
+        lengths = np.diff(self._offsets)[self._order]
+        starts = np.repeat(self._offsets[self._order], lengths)
+        playlist_id = np.repeat(np.arange(len(self)), lengths)
+        first = np.concatenate(([0], np.cumsum(lengths)))[:-1]
+        position = np.arange(len(playlist_id)) - first[playlist_id]
+        flipped = self._flipped[playlist_id]
+        position[flipped] = lengths[playlist_id[flipped]] - 1 - position[flipped]
+        return playlist_id, self._song_ids[starts + position]
+
+    def to_rank_matrix(self):
+        """
+        Builds the RankMatrix of the corpus for the ranking functions.
+
+        Song ids are renumbered in the order the songs are first seen, so
+        the result matches build_rank_matrix on the same playlists.
+
+        Returns: a RankMatrix.
+        """
+        playlist_id, song_id = self.entries()
+        codes, uniques = factorize(song_id)
+        titles = [self.table.titles[i] for i in uniques]
+        return rank_matrix_from_entries(titles, playlist_id, codes, len(self))
+
+    def memory_usage(self):
+        """
+        Counts the bytes used by the corpus.
+
+        Returns: a dictionary of bytes used by the song_ids, offsets and
+        views (order and flips) arrays, the intern table, and their total.
+        The intern table may be shared with other corpora.
+        """
+        usage = {
+            "song_ids": self._song_ids.nbytes,
+            "offsets": self._offsets.nbytes,
+            "views": self._order.nbytes + self._flipped.nbytes,
+            "intern_table": self.table.memory_usage(),
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+
+def list_memory_usage(playlists):
+    """
+    Counts the bytes used by playlists stored as lists of strings.
+
+    Args:
+        playlists: a 2d list of song titles.
+
+    Returns: an int, the size of the lists and of each distinct string.
+    """
+    strings = {id(song): sys.getsizeof(song) for row in playlists for song in row}
+    lists = sum(sys.getsizeof(row) for row in playlists) + sys.getsizeof(playlists)
+    return lists + sum(strings.values())
+
+
+def memory_report(playlists):
+    """
+    Compares the memory used by the three ways of holding playlists.
+
+    Args:
+        playlists: a 2d list of song titles.
+
+    Returns: a string table of bytes used as lists, as a padded dataframe
+    and as a Corpus.
+    """
+    corpus = Corpus.from_playlists(playlists)
+    sizes = {
+        "lists": list_memory_usage(playlists),
+        "dataframe": int(pd.DataFrame(playlists).memory_usage(deep=True).sum()),
+        "corpus": corpus.memory_usage()["total"],
+    }
+    lines = [f"{'storage':<12} {'MB':>10} {'x corpus':>9}"]
+    for name, size in sizes.items():
+        lines.append(f"{name:<12} {size / 1e6:>10.3f} {size / sizes['corpus']:>9.1f}")
+    return "\n".join(lines)
@@ -1,12 +1,27 @@
 """
 Spotify api functions to get necessary data.
 """
-from spotipy.oauth2 import SpotifyClientCredentials
-import spotipy
+import json
+import os
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import rate_limit
+from lazy import lazy_import
+from profiling import profiled, rows_of_result
+
+spotipy = lazy_import("spotipy")
+oauth2 = lazy_import("spotipy.oauth2")
 
 SPOTIFY = None
+CACHE = None
+OFFLINE = False
+ALBUM_INDEX = None
+TITLE_INDEX = None
+BACKEND = None
 
 
+@profiled
 def login():
     """
     Connects to the spotify API with stored credentials.
@@ -16,13 +31,171 @@ def login():
         cid = file.readline().strip()
         secret = file.readline().strip()
 
-    client_credentials_manager = SpotifyClientCredentials(
+    client_credentials_manager = oauth2.SpotifyClientCredentials(
         client_id=cid, client_secret=secret
     )
     global SPOTIFY
     SPOTIFY = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
 
 
+@profiled
+def login_async(**options):
+    """
+    Connects to the spotify API through a pooled async backend.
+
+    Reads the same secrets.txt as login, and uses the backend for every
+    later get_tracks, get_albums and get_all_playlists call.
+
+    Args:
+        options: keyword arguments for async_spotify.AsyncSpotify, like
+        pool_size, pipeline_depth, api_url and token_url.
+    """
+    # pylint: disable=import-outside-toplevel
+    from async_spotify import AsyncBackend
+
+    with open("secrets.txt", "r", encoding="UTF-8") as file:
+        cid = file.readline().strip()
+        secret = file.readline().strip()
+
+    use_backend(AsyncBackend(cid, secret, **options))
+
+
+@profiled
+def use_backend(backend):
+    """
+    Fetches through an async backend instead of the spotipy client.
+
+    Args:
+        backend: an async_spotify.AsyncBackend, or None to go back to the
+        spotipy client set up by login.
+    """
+    global BACKEND
+    BACKEND = backend
+
+
+@profiled
+def use_cache(cache, offline=False):
+    """
+    Serves get_tracks and get_albums from a response cache.
+
+    Args:
+        cache: an object with get(key, allow_stale) and set(key, value)
+        methods, like a response_cache.ResponseCache, or None to stop
+        caching.
+        offline: a bool, True to only serve from the cache, stale entries
+        included, and never call the spotify API.
+    """
+    global CACHE, OFFLINE
+    CACHE = cache
+    OFFLINE = offline
+
+
+@profiled
+def use_title_index(index):
+    """
+    Maps the song names from get_tracks and get_albums to canonical titles.
+
+    Cached responses keep the names spotify returned, so the index can be
+    changed or removed without fetching again.
+
+    Args:
+        index: a title_index.TitleIndex, or None to keep names as they are.
+    """
+    global TITLE_INDEX
+    TITLE_INDEX = index
+
+
+def _canonical(songs):
+    """
+    Maps song names with TITLE_INDEX, if one is in use.
+
+    Args:
+        songs: a list of strings representing song names.
+
+    Returns: a list of strings, the canonical names.
+    """
+    if TITLE_INDEX is None:
+        return songs
+    return TITLE_INDEX.mapping(songs)
+
+
+@profiled
+def get_uri(url):
+    """
+    Gets the spotify id at the end of a playlist or album url.
+
+    args:
+        url: a string representing the spotify url
+    returns: a string representing the id, without any query string.
+    """
+    return url.split("/")[-1].split("?")[0]
+
+
+def _cached(key, fetch):
+    """
+    Looks up a response in CACHE, fetching and storing it on a miss.
+
+    args:
+        key: a string to cache the response under.
+        fetch: a function with no arguments that calls the spotify API.
+    returns: the cached or fetched response.
+    """
+    if CACHE is not None:
+        value = CACHE.get(key, allow_stale=OFFLINE)
+        if value is not None:
+            return value
+    if OFFLINE:
+        raise LookupError(f"{key} is not cached and offline mode is on")
+
+    value = fetch()
+    if CACHE is not None:
+        CACHE.set(key, value)
+    return value
+
+
+def _iter_pages(page, prefetch=False):
+    """
+    Yields the items of a paged spotify response, following its next links.
+
+    args:
+        page: a dictionary, the first page of a spotify API response.
+        prefetch: a bool, True to fetch the next page in a background
+        thread while the items of the current one are being consumed.
+    yields: each item on each page, in order.
+    """
+    if not prefetch:
+        while page is not None:
+            yield from page["items"]
+            page = SPOTIFY.next(page) if page["next"] else None
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        while page is not None:
+            upcoming = pool.submit(SPOTIFY.next, page) if page["next"] else None
+            yield from page["items"]
+            page = upcoming.result() if upcoming is not None else None
+
+
+def iter_tracks(url, prefetch=False):
+    """
+    Lazily yields the song names in a playlist, one page at a time.
+
+    Unlike a single playlist_tracks call, this follows the next links, so
+    playlists with more than 100 songs aren't cut short. Local or removed
+    tracks with no track data are skipped.
+
+    args:
+        url: a string representing the spotify playlist url
+        prefetch: a bool, True to fetch the next page in the background.
+    yields: strings representing the song names, in order.
+    """
+    page = SPOTIFY.playlist_tracks(get_uri(url), fields="items(track(name)),next")
+    for item in _iter_pages(page, prefetch):
+        if item["track"] is not None:
+            yield item["track"]["name"]
+
+
+@profiled(rows=rows_of_result)
 def get_tracks(url):
     """
     Gets the song names in a playlist.
@@ -32,30 +205,140 @@ def get_tracks(url):
     returns: a list of strings representing the song names, in order.
     """
 
-    playlist_uri = url.split("/")[-1].split("?")[0]
+    playlist_uri = get_uri(url)
 
-    return [
-        track["track"]["name"]
-        for track in SPOTIFY.playlist_tracks(playlist_uri)["items"]
-    ]
+    if BACKEND is not None:
+        return _canonical(
+            _cached(
+                f"playlist:{playlist_uri}",
+                lambda: BACKEND.playlist_tracks(playlist_uri),
+            )
+        )
+    return _canonical(
+        _cached(f"playlist:{playlist_uri}", lambda: list(iter_tracks(url)))
+    )
 
 
-def get_all_playlists(path):
+@profiled(rows=rows_of_result)
+def get_all_playlists(path, workers=1, bucket=None, strict=False):
     """
     Gets the songs for all the playlist urls in a text file.
 
     Args:
         path: a string representing the path to the text file.
+        workers: an int, the number of playlists to fetch at once. With
+        more than one, rate limited calls are retried with backoff, and a
+        playlist that can't be fetched is left empty with a warning
+        instead of stopping the rest.
+        bucket: a rate_limit.TokenBucket shared by the calls when workers
+        is more than one, or None for no limit.
+        strict: a bool, True to raise a RuntimeError naming every playlist
+        that couldn't be fetched, after fetching the rest, instead of
+        leaving them empty.
+
+    With an async backend from use_backend, every playlist that isn't
+    cached is fetched at once over the backend's connection pool, and
+    workers and bucket are not used.
 
     Returns: a 2d list of strings representing song names, with each inner
     list being a playlist
     """
     with open(path, "r", encoding="UTF-8") as file:
-        playlists = [get_tracks(url.strip()) for url in file]
+        urls = [url.strip() for url in file]
+
+    if BACKEND is not None:
+        return _get_all_playlists_async(urls, strict)
+
+    if workers <= 1:
+        return [get_tracks(url) for url in urls]
+
+    playlists, failures = rate_limit.fetch_all(urls, get_tracks, workers, bucket)
+    _report_failures(urls, failures, strict)
+    for i in failures:
+        playlists[i] = []
 
     return playlists
 
 
+def _report_failures(urls, failures, strict):
+    """
+    Warns about every playlist that couldn't be fetched, or raises.
+
+    Args:
+        urls: a list of strings representing spotify playlist urls.
+        failures: a dictionary of the index of each failed url and its
+        error.
+        strict: a bool, True to raise a RuntimeError instead of warning.
+    """
+    if strict and failures:
+        raise RuntimeError(
+            f"could not fetch {len(failures)} playlists: "
+            + ", ".join(f"{urls[i]} ({error})" for i, error in failures.items())
+        )
+    for i, error in failures.items():
+        warnings.warn(f"could not fetch playlist {urls[i]}: {error}")
+
+
+def _get_all_playlists_async(urls, strict=False):
+    """
+    Gets the songs for many playlist urls through BACKEND.
+
+    Cached playlists are served from the cache, and the rest are fetched
+    concurrently. A playlist that can't be fetched is left empty with a
+    warning.
+
+    Args:
+        urls: a list of strings representing spotify playlist urls.
+        strict: a bool, True to raise a RuntimeError if any playlist
+        couldn't be fetched, like get_all_playlists.
+
+    Returns: a 2d list of strings representing song names, with each inner
+    list being a playlist
+    """
+    playlists = [None] * len(urls)
+    missing = []
+    failures = {}
+    for i, url in enumerate(urls):
+        key = f"playlist:{get_uri(url)}"
+        if CACHE is not None:
+            playlists[i] = CACHE.get(key, allow_stale=OFFLINE)
+        if playlists[i] is None and OFFLINE:
+            failures[i] = f"{key} is not cached"
+        elif playlists[i] is None:
+            missing.append(i)
+
+    fetched = BACKEND.playlist_tracks_many([get_uri(urls[i]) for i in missing])
+    for i, songs in zip(missing, fetched):
+        # gather returns cancellations too, which aren't Exceptions
+        if isinstance(songs, BaseException):
+            failures[i] = songs
+            continue
+        if CACHE is not None:
+            CACHE.set(f"playlist:{get_uri(urls[i])}", songs)
+        playlists[i] = songs
+
+    _report_failures(urls, failures, strict)
+    for i in failures:
+        playlists[i] = []
+    return [_canonical(songs) for songs in playlists]
+
+
+def iter_album_tracks(url, prefetch=False):
+    """
+    Lazily yields the song names in an album, one page at a time.
+
+    Args:
+        url: a string representing the url of the album on spotify.
+        prefetch: a bool, True to fetch the next page in the background.
+
+    Yields: strings representing song names, in order.
+    """
+    page = SPOTIFY.album_tracks(get_uri(url))
+    for track in _iter_pages(page, prefetch):
+        yield track["name"]
+
+
+@profiled(rows=rows_of_result)
 def get_albums(url):
     """
     Gets the songs in a given album on spotify.
@@ -66,10 +349,18 @@ def get_albums(url):
     Returns: a list of strings representing song names.
     """
 
-    data = SPOTIFY.album_tracks(url)
-    return [track["name"] for track in data["items"]]
+    album_uri = get_uri(url)
 
+    if BACKEND is not None:
+        return _canonical(
+            _cached(f"album:{album_uri}", lambda: BACKEND.album_tracks(album_uri))
+        )
+    return _canonical(
+        _cached(f"album:{album_uri}", lambda: list(iter_album_tracks(url)))
+    )
 
+
+@profiled(rows=rows_of_result)
 def get_all_albums():
     """
     Gets all the songs in the most popular albums.
@@ -115,3 +406,61 @@ def get_all_albums():
         punisher,
         boygenius,
     ]
+
+
+@profiled(rows=rows_of_result)
+def get_album_index(path=None):
+    """
+    Gets a dictionary of which of the popular albums each song is on.
+
+    The index is built from get_all_albums the first time it is needed,
+    and kept for the rest of the process. If path is given and the file
+    exists, the index is read from it unless one is already in memory. If
+    the file doesn't exist, the index is written there, whether it was just
+    built or was already in memory.
+
+    Args:
+        path: a string, the path of a JSON file to persist the index in, or
+        None to only keep it in memory.
+
+    Returns: a dictionary with song title keys and int values, the index of
+    the album in get_all_albums. A song on several albums gets the first.
+    """
+    global ALBUM_INDEX
+    saved = path is not None and os.path.exists(path)
+    if ALBUM_INDEX is None and saved:
+        with open(path, "r", encoding="UTF-8") as file:
+            ALBUM_INDEX = json.load(file)
+    elif ALBUM_INDEX is None:
+        index = {}
+        for i, album in enumerate(get_all_albums()):
+            for song in album:
+                index.setdefault(song, i)
+        ALBUM_INDEX = index
+
+    if path is not None and not saved:
+        write_json(path, ALBUM_INDEX)
+    return ALBUM_INDEX
+
+
+def write_json(path, value):
+    """
+    Writes a JSON file atomically.
+
+    The value is written to a temporary file in the same directory, which
+    then replaces path, so processes writing the same file at once never
+    leave it half written for a reader.
+
+    Args:
+        path: a string, the file to write.
+        value: a JSON-serializable value.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w", encoding="UTF-8") as file:
+            json.dump(value, file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
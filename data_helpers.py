@@ -2,11 +2,22 @@
 Collection of functions to process playlist data.
 """
 
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from scipy import stats
-import pandas as pd
+from lazy import lazy_import
+from rank_matrix import build_rank_matrix, spread_from_dict, stats_from_dict
+from consensus import consensus_scores
+from corpus import Corpus
+from partial_aggregate import aggregate_csv
+from profiling import profiled, rows_of_first_arg
 
+pd = lazy_import("pandas")
+sparse = lazy_import("scipy.sparse")
+linalg = lazy_import("scipy.sparse.linalg")
 
+
+@profiled
 def find_percentile(song, playlist, dictionary):
     """
     Finds the percentile rank of a song in a single playlist
@@ -44,6 +55,7 @@ def find_percentile(song, playlist, dictionary):
     return dictionary
 
 
+@profiled(rows=rows_of_first_arg)
 def find_avg_percent(dictionary):
     """
     Finds the average percentile of a song
@@ -58,47 +70,44 @@ def find_avg_percent(dictionary):
     hold the averages as the values, instead of lists of each
     percentile
     """
-    for i in dictionary:
-        total = sum(dictionary[i])
-        length = len(dictionary[i])
-        average = total / length
-        dictionary[i] = average
+    averages = stats_from_dict(dictionary)["mean"]
+    for song, average in zip(averages.index, averages.tolist()):
+        dictionary[song] = average
 
     return dictionary
 
 
-def get_all_ranking(data, cutoff=5):
+@profiled(rows=rows_of_first_arg)
+def get_all_ranking(data, cutoff=5, title_index=None):
     """
     Gets the ranking in percentiles of every song in every playlist
 
-    Takes a data frame and converts rows(playlists) into lists,
-    then iterates through each list to find the percentile ranking
-    of each song on that list, then removes songs that appear in
-    less playlists than the cutoff number, cutoff
+    Interns every playlist into a RankMatrix, which finds the percentile
+    ranking of each song on each playlist in one vectorized pass, then
+    leaves out songs that appear in less playlists than the cutoff
+    number, cutoff
 
     Args: data, a dataframe, each row representing a playlist with
-    songs in ranked order. cutoff: an int, representing the value to be
-    passed to the remove_songs function, aka the cut off number of
-    times a song appears in playlists in order to not be removed
-    from the dictionary for not having enough data points.
+    songs in ranked order. cutoff: an int, representing the cut off
+    number of times a song appears in playlists in order to not be
+    removed from the dictionary for not having enough data points.
+    title_index: a title_index.TitleIndex to merge live and alternate
+    versions of a song under its canonical title, or None to keep every
+    version as its own song.
 
     Returns: percent_dict, a dictionary containing song titles as keys
     and lists of percentiles as the values.
 
     """
-    percent_dict = {}
-    for row in data:
-        playlist = data.loc[row, :].values.flatten().tolist()
-        for i in playlist:
-            percent_dict = find_percentile(i, playlist, percent_dict)
-
-        if row == (len(data) - 1):
-            break
-    percent_dict = remove_songs(percent_dict, cutoff)
+    matrix = build_rank_matrix(data)
+    if title_index is not None:
+        matrix = matrix.canonicalize(title_index.canonical)
+    percent_dict = matrix.to_dict(cutoff)
 
     return percent_dict
 
 
+@profiled(rows=rows_of_first_arg)
 def remove_songs(dictionary, cutoff=5):
     """
     Removes songs from a dictionary that appear less then num times
@@ -119,111 +128,346 @@ def remove_songs(dictionary, cutoff=5):
     return removed_dict
 
 
-def get_avg_ranking(data, cutoff):
+@profiled(rows=rows_of_first_arg)
+def get_avg_ranking(data, cutoff, title_index=None):
     """
     Gets the average rank percentile of each song across each playlist
 
-    Uses get_all_ranking function to create a dictionaty with song title
-    keys and list of percentile values. Then uses remove_songs to
-    remove songs that appear less than the cutoff number. Then uses
-    avg_percentage to create dictionary with song title keys and avg
-    percentile values.
+    Interns the playlists into a RankMatrix, then finds the count and
+    mean percentile of every song in one grouped pass, masking out songs
+    that appear less than the cutoff number.
 
     Args: data, a dataframe of songs, where each row represents a playlist
     in order. cutoff, an int representing the cut off number of
     times a song appears in playlists in order to not be removed
-    from the dictionary
+    from the dictionary. title_index, a title_index.TitleIndex to merge
+    versions of a song, or None to keep them apart.
 
     Returns: avg_percent, a dictionary of song title keys and avg
     percentile values
     """
 
-    percent_dict = get_all_ranking(data, cutoff)
-    percent_dict = remove_songs(percent_dict, cutoff)
-    avg_percent = find_avg_percent(percent_dict)
+    matrix = build_rank_matrix(data)
+    if title_index is not None:
+        matrix = matrix.canonicalize(title_index.canonical)
+    avg_percent = matrix.mean_percentiles(cutoff)
     return avg_percent
 
 
-def find_most_controversial(dictionary, num):
+@profiled
+def stream_song_stats(path, cutoff=5, chunksize=1000):
+    """
+    Gets the percentile statistics of each song from a csv, chunk by chunk
+
+    Reads the playlists chunksize rows at a time into running per-song
+    sums, so memory stays the same however many playlists the file holds,
+    and gives the same averages, standard deviations and cutoff as
+    get_avg_ranking and find_std_of_songs on the whole file.
+
+    Args: path, a string, a playlist csv like mitski_data.csv, with an
+    index column and one playlist per row. cutoff, an int representing
+    the cut off number of times a song appears in playlists in order to
+    not be removed. chunksize, an int, the number of playlists to read
+    at once.
+
+    Returns: a dataframe indexed by song title with the columns count,
+    mean, var, std, min and max.
+    """
+    return aggregate_csv(path, chunksize).finalize(cutoff)
+
+
+@profiled
+def stream_avg_ranking(path, cutoff=5, chunksize=1000):
+    """
+    Gets the average rank percentile of each song in a csv, chunk by chunk
+
+    Args: path, a string, a playlist csv like mitski_data.csv. cutoff, an
+    int representing the cut off number of times a song appears in
+    playlists in order to not be removed. chunksize, an int, the number
+    of playlists to read at once.
+
+    Returns: a dictionary of song title keys and avg percentile values,
+    the same as get_avg_ranking on the loaded file.
+    """
+    averages = stream_song_stats(path, cutoff, chunksize)["mean"]
+    return dict(zip(averages.index, averages.tolist()))
+
+
+@profiled
+def stream_std_of_songs(path, cutoff=5, chunksize=1000):
+    """
+    Gets the standard deviation of each song's percentiles in a csv, chunk
+    by chunk
+
+    Args: path, a string, a playlist csv like mitski_data.csv. cutoff, an
+    int representing the cut off number of times a song appears in
+    playlists in order to not be removed. chunksize, an int, the number
+    of playlists to read at once.
+
+    Returns: a dictionary of song title keys and standard deviation values,
+    the same as find_std_of_songs on get_all_ranking of the loaded file.
+    """
+    spreads = stream_song_stats(path, cutoff, chunksize)["std"]
+    return dict(zip(spreads.index, spreads.tolist()))
+
+
+@profiled(rows=rows_of_first_arg)
+def get_consensus_ranking(data, cutoff, method="bradley_terry", title_index=None):
+    """
+    Gets a consensus sadness score of each song from pairwise preferences
+
+    Instead of averaging percentiles, counts how often each song is
+    ranked sadder than each other song across the playlists, in a sparse
+    matrix, and fits a Bradley-Terry model or a Borda count to it. Songs
+    on short playlists are then only compared to the songs they were
+    ranked against.
+
+    Args: data, a dataframe of songs, where each row represents a playlist
+    in order. cutoff, an int representing the cut off number of
+    times a song appears in playlists in order to not be removed
+    from the dictionary. method, "bradley_terry" or "borda".
+    title_index, a title_index.TitleIndex to merge versions of a song, or
+    None to keep them apart.
+
+    Returns: a dictionary of song title keys and score values between 0
+    and 1, with lower scores being sadder like get_avg_ranking, so it can
+    be plotted with graph_songs_percentile.
+    """
+    matrix = build_rank_matrix(data)
+    if title_index is not None:
+        matrix = matrix.canonicalize(title_index.canonical)
+    kept, scores = consensus_scores(matrix, method, cutoff)
+    return {matrix.titles[i]: score for i, score in zip(kept, scores.tolist())}
+
+
+def _bootstrap_chunk(sums, counts, num_resamples, seed):
+    """
+    Averages song percentiles over a chunk of bootstrap resamples.
+
+    Each resample draws playlists with replacement, given as a row of
+    playlist weights, and every resample of the chunk is found at once with
+    two sparse matrix products.
+
+    Args:
+        sums: a sparse matrix of percentile sums per playlist and song, from
+        RankMatrix.to_sparse.
+        counts: a sparse matrix of entries per playlist and song.
+        num_resamples: an int, the number of resamples in the chunk.
+        seed: a numpy SeedSequence for the chunk's random generator.
+
+    Returns:
+        A float array with one row per resample and one column per song,
+        holding the song's average percentile, or NaN if no drawn playlist
+        had it.
+    """
+    rng = np.random.default_rng(seed)
+    num_playlists = sums.shape[0]
+    weights = rng.multinomial(
+        num_playlists, np.full(num_playlists, 1 / num_playlists), size=num_resamples
+    ).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums.T @ weights.T).T / (counts.T @ weights.T).T
+
+
+def _positions(averages):
+    """
+    Finds the rank position of every song in every resample.
+
+    Args:
+        averages: a float array with one row per resample and one column per
+        song.
+
+    Returns:
+        A float array of the same shape, with 1 for the saddest (lowest
+        average percentile) song of each resample, and NaN for songs missing
+        from a resample.
+    """
+    order = np.argsort(averages, axis=1, kind="stable")
+    positions = np.empty(averages.shape)
+    np.put_along_axis(
+        positions, order, np.arange(1, averages.shape[1] + 1)[np.newaxis, :], axis=1
+    )
+    positions[np.isnan(averages)] = np.nan
+    return positions
+
+
+@profiled(rows=rows_of_first_arg)
+def bootstrap_avg_ranking(
+    data,
+    cutoff,
+    num_resamples=1000,
+    confidence=0.95,
+    processes=1,
+    seed=0,
+    chunk_size=250,
+):
+    """
+    Finds how stable each song's average rank percentile is
+
+    Resamples the playlists with replacement num_resamples times, and
+    recomputes every song's average percentile and rank position in each
+    resample. Resamples are split into chunks of chunk_size, each with its
+    own seed spawned from seed, so the results are the same no matter how
+    many processes share the chunks.
+
+    Args: data, a dataframe of songs, where each row represents a playlist
+    in order. cutoff, an int, the same cut off as get_avg_ranking.
+    num_resamples, an int, the number of bootstrap resamples. confidence, a
+    float, the width of the confidence intervals. processes, an int, the
+    number of processes to spread the chunks over, or None for one per
+    CPU. seed, an int seed for the random generator. chunk_size, an int,
+    the number of resamples computed together.
+
+    Returns: a dataframe indexed by song title, for the songs
+    get_avg_ranking keeps, with the columns mean (the average percentile
+    from get_avg_ranking), low and high (its confidence interval),
+    position (the song's place when sorted saddest first), position_low
+    and position_high (its confidence interval), and position_std. Raises
+    ValueError if num_resamples or chunk_size isn't positive.
+    """
+    if num_resamples < 1:
+        raise ValueError(f"num_resamples must be positive, got {num_resamples}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    matrix = build_rank_matrix(data)
+    kept = np.flatnonzero(matrix.counts() >= cutoff)
+    sums, counts = matrix.to_sparse()
+    sums, counts = sums[:, kept], counts[:, kept]
+
+    sizes = [chunk_size] * (num_resamples // chunk_size)
+    if num_resamples % chunk_size:
+        sizes.append(num_resamples % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = ([sums] * len(sizes), [counts] * len(sizes), sizes, seeds)
+    if processes == 1:
+        chunks = list(map(_bootstrap_chunk, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunks = list(pool.map(_bootstrap_chunk, *arguments))
+    averages = np.vstack(chunks)
+    positions = _positions(averages)
+
+    point = matrix.song_stats(cutoff)["mean"].to_numpy()
+    tail = (1 - confidence) / 2 * 100
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(averages, [tail, 100 - tail], axis=0)
+        position_low, position_high = np.nanpercentile(
+            positions, [tail, 100 - tail], axis=0
+        )
+        position_std = np.nanstd(positions, axis=0)
+
+    return pd.DataFrame(
+        {
+            "mean": point,
+            "low": low,
+            "high": high,
+            "position": _positions(point[np.newaxis, :])[0],
+            "position_low": position_low,
+            "position_high": position_high,
+            "position_std": position_std,
+        },
+        index=pd.Index([matrix.titles[i] for i in kept], dtype=object),
+    )
+
+
+@profiled(rows=rows_of_first_arg)
+def find_top_songs(dictionary, num, by="std", largest=True):
+    """
+    Finds the num songs with the largest or smallest spread of percentiles
+
+    Partitions an array of each song's spread with np.partition, so only
+    the songs that can make the top num are sorted. Ties are broken by the
+    order of the songs in dictionary.
+
+    Args: dictionary, a dictionary with song title keys and list of
+    percentiles values. num, an int representing the number of songs to
+    return. If num is larger than the number of songs, every song is
+    returned. by, a string naming the measure of spread, "std", "iqr" or
+    "mad". largest, a bool, True to find the most spread out songs and
+    False to find the least.
+
+    Return: top, a dictionary of song title keys and list of percentiles
+    values, with only the num chosen songs, in ranked order.
+    """
+    titles = list(dictionary)
+    num = min(num, len(titles))
+    if num <= 0:
+        return {}
+
+    spread = spread_from_dict(dictionary, by)
+    key = -spread if largest else spread
+    key[np.isnan(key)] = np.inf
+    kth = np.partition(key, num - 1)[num - 1]
+    candidates = np.flatnonzero(key <= kth)
+    ranked = candidates[np.lexsort((candidates, key[candidates]))][:num]
+
+    top = {titles[i]: dictionary[titles[i]] for i in ranked}
+    return top
+
+
+@profiled(rows=rows_of_first_arg)
+def find_most_controversial(dictionary, num, by="std"):
     """
     Finds the songs with the largest standard deviations
 
-    Uses function find_stds_of_songs to get standard deviation of
-    each song based on the dictionary values, which are lists of
-    rank percentiles from each playlist the song appeared on
+    Uses function find_top_songs to pick the songs whose list of rank
+    percentiles from each playlist the song appeared on is the most
+    spread out
 
     Args: dictionary, a dictionary with song title keys and list of
     percentiles values. num, an int representing the number of most
     controversial songs to return. if num = 5, this function will
-    return the top 5 most controversial songs.
+    return the top 5 most controversial songs. by, a string naming the
+    measure of spread, "std" (the default), "iqr" or "mad".
 
     Return: maxes, a dictionary of song title keys and
     list of percentiles values, with only the num most controversial
-    songs in the dictionary.
+    songs in the dictionary, most controversial first.
 
     Note: Most controversial is defined as having the highest
     standard deviation
 
     """
-    maxes = {}
-    new_dict = {}
-    stds_dict = find_std_of_songs(dictionary)
-
-    for _ in range(0, num):
-        maxes[max(stds_dict, key=stds_dict.get)] = stds_dict[
-            max(stds_dict, key=stds_dict.get)
-        ]
+    maxes = find_top_songs(dictionary, num, by, largest=True)
 
-        del stds_dict[max(stds_dict, key=stds_dict.get)]
+    return maxes
 
-    for song in maxes:
-        new_dict[song] = dictionary[song]
 
-    return new_dict
-
-
-def find_least_controversial(dictionary, num):
+@profiled(rows=rows_of_first_arg)
+def find_least_controversial(dictionary, num, by="std"):
     """
-    Finds the songs with the largest standard deviations
+    Finds the songs with the smallest standard deviations
 
-    Uses function find_stds_of_songs to get standard deviation of
-    each song based on the dictionary values, which are lists of
-    rank percentiles from each playlist the song appeared on
+    Uses function find_top_songs to pick the songs whose list of rank
+    percentiles from each playlist the song appeared on is the least
+    spread out
 
     Args: dictionary, a dictionary with song title keys and list of
     percentiles values. num, an int representing the number of least
     controversial songs to return. if num = 5, this function will
-    return the top 5 least controversial songs.
+    return the top 5 least controversial songs. by, a string naming the
+    measure of spread, "std" (the default), "iqr" or "mad".
 
     Return: mins, a dictionary of song title keys and
     list of percentiles values, with only the num least controversial
-    songs in the dictionary.
+    songs in the dictionary, least controversial first.
 
     Note: least controversial is defined as having the lowest
     standard deviation
     """
-    mins = {}
-    new_dict = {}
-    stds_dict = find_std_of_songs(dictionary)
-
-    for _ in range(0, num):
-        mins[min(stds_dict, key=stds_dict.get)] = stds_dict[
-            min(stds_dict, key=stds_dict.get)
-        ]
-
-        del stds_dict[min(stds_dict, key=stds_dict.get)]
-    for song in mins:
-        new_dict[song] = dictionary[song]
+    mins = find_top_songs(dictionary, num, by, largest=False)
 
-    return new_dict
+    return mins
 
 
+@profiled(rows=rows_of_first_arg)
 def find_std_of_songs(dictionary):
     """
     Finds the standard deviation rank percentiles for each song
 
-    uses numpy std function to calculate the standard deviations
-    of a list of percentiles, taken from dictionary
+    uses stats_from_dict to calculate the standard deviations of every
+    list of percentiles, taken from dictionary, in one grouped pass
 
     Args: dictionary, a dictionary of song title keys and list of
     percentiles values
@@ -231,13 +475,12 @@ def find_std_of_songs(dictionary):
     Return: stds, a dictionary with song title keys and standard
     deviation values
     """
-    stds = {}
-    for i in dictionary:
-        stds[i] = np.std(dictionary[i])
+    stds = stats_from_dict(dictionary)["std"]
 
-    return stds
+    return dict(zip(stds.index, stds.tolist()))
 
 
+@profiled(rows=rows_of_first_arg)
 def make_dict_one_album(album, all_songs):
     """
     Creates a dictionary with only songs from a given album
@@ -252,6 +495,7 @@ def make_dict_one_album(album, all_songs):
 
     """
     album_dict = {}
+    album = set(album)
     for i in all_songs:
         if i in album:
             album_dict[i] = all_songs[i]
@@ -266,75 +510,306 @@ def make_dict_one_album(album, all_songs):
 #     return
 
 
-def find_anomalies(playlists, forward_i, backward_i, threshold=0.5):
+def _masked_ranks(values, mask):
     """
-    Finds playlists that are reversed ordered or appear to be unusually ordered.
+    Ranks the masked values of every row of a matrix.
 
     Args:
-        playlists: a 2d list of songs, with each inner list being a playlist.
+        values: a 2d float array, with no repeated values in a row.
+        mask: a 2d bool array of the same shape, the values to rank.
+
+    Returns:
+        A 2d int array holding the 1-based rank of each masked value among
+        the masked values of its row, and 0 everywhere else.
+    """
+    order = np.argsort(np.where(mask, values, np.inf), axis=1)
+    ranks = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(
+        ranks, order, np.arange(1, values.shape[1] + 1)[np.newaxis, :], axis=1
+    )
+    return np.where(mask, ranks, 0)
+
+
+def _spearman_rows(ranks, other_ranks, counts):
+    """
+    Finds the spearman correlation of every row of two rank matrices.
+
+    Args:
+        ranks: a 2d int array from _masked_ranks.
+        other_ranks: a 2d int array from _masked_ranks with the same mask.
+        counts: an int array, the number of ranked values in each row.
+
+    Returns:
+        A float array with the correlation of each row, NaN for rows with
+        less than two ranked values.
+    """
+    squared = ((ranks - other_ranks) ** 2).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rho = 1 - 6 * squared / (counts * (counts**2 - 1))
+    rho[counts < 2] = np.nan
+    return rho
+
+
+@profiled(rows=rows_of_first_arg)
+def find_orientation_scores(playlists, forward_i, backward_i, block_size=4096):
+    """
+    Finds the spearman correlation of every playlist with both model playlists.
+
+    Every playlist is ranked into a padded rank matrix over the songs on
+    both model playlists, and each row is compared on the songs it shares
+    with both models. Rows are handled in blocks of block_size, all rows
+    of a block at once, so memory stays bounded for large corpora.
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist,
+        or a dataframe with one playlist per row.
         forward_i: number representing index of a playlist to be used as a model normal order
         playlist.
         backward_i: number representing index of a playlist to be used as a model reverse order
         playlist.
+        block_size: an int, the number of playlists to correlate at once.
 
     Returns:
-        A list of numbers representing the indexes of the playlists that are in ambigious order,
-        and a list of numbers representing the indexes of the playlists that are reversed.
+        A float array of each playlist's correlation with the forward model
+        playlist, and a float array of each playlist's correlation with the
+        backward model playlist. Playlists sharing less than two songs with
+        the models get NaN.
     """
+    matrix = build_rank_matrix(playlists)
+    forward_row = matrix.to_dense(forward_i, forward_i + 1)[0]
+    backward_row = matrix.to_dense(backward_i, backward_i + 1)[0]
+    columns = np.flatnonzero(~np.isnan(forward_row) & ~np.isnan(backward_row))
+
+    rho = np.empty(matrix.num_playlists)
+    rho_back = np.empty(matrix.num_playlists)
+    for start in range(0, matrix.num_playlists, block_size):
+        stop = min(start + block_size, matrix.num_playlists)
+        positions = matrix.to_dense(start, stop, columns)
+        common = ~np.isnan(positions)
+        counts = common.sum(axis=1)
+
+        current = _masked_ranks(positions, common)
+        forward = _masked_ranks(
+            np.broadcast_to(forward_row[columns], positions.shape), common
+        )
+        backward = _masked_ranks(
+            np.broadcast_to(backward_row[columns], positions.shape), common
+        )
+        rho[start:stop] = _spearman_rows(forward, current, counts)
+        rho_back[start:stop] = _spearman_rows(backward, current, counts)
 
-    data = pd.DataFrame(playlists)
+    return rho, rho_back
 
-    forward_series = pd.Series(
-        range(len(data.loc[forward_i])),
-        index=data.loc[forward_i].values.flatten().tolist(),
-    )
-    forward_rank = pd.DataFrame(forward_series.rank(), columns=["for_rank"])
 
-    backward_series = pd.Series(
-        range(len(data.loc[backward_i])),
-        index=data.loc[backward_i].values.flatten().tolist(),
-    )
-    backward_rank = pd.DataFrame(backward_series.rank(), columns=["back_rank"])
+def _leave_one_out(matrix, centered, sign, weight):
+    """
+    Finds the consensus position of every song entry without its playlist.
 
-    ambiguous_indexes = []
-    reversed_indexes = []
+    Args:
+        matrix: a RankMatrix.
+        centered: a float array, the centered percentile of every entry.
+        sign: a float array, 1 or -1 for every playlist, -1 to flip it.
+        weight: a float array, how much every playlist counts.
 
-    rows = data.iterrows()
-    for row in rows:
-        playlist_series = pd.Series(range(len(row[1])), index=row[1])
-        playlist_rank = pd.DataFrame(playlist_series.rank(), columns=["curr_rank"])
+    Returns:
+        A bool array of the entries whose song is on other weighted
+        playlists, and a float array of the weighted mean centered
+        percentile of the song on those other playlists, for each of them.
+    """
+    playlist_id = matrix.playlist_id
+    entry_weight = weight[playlist_id]
+    entry_vote = sign[playlist_id] * entry_weight * centered
+    total_vote = np.bincount(matrix.song_id, entry_vote, matrix.num_songs)
+    total_weight = np.bincount(matrix.song_id, entry_weight, matrix.num_songs)
+    others = total_weight[matrix.song_id] - entry_weight
+    shared = others > 1e-12
+    consensus = (total_vote[matrix.song_id] - entry_vote)[shared] / others[shared]
+    return shared, consensus
+
+
+def _principal_orientation(matrix, centered):
+    """
+    Makes a first guess of the orientation and weight of every playlist.
 
-        merged = forward_rank.join(playlist_rank).join(backward_rank)
-        merged = merged.dropna()
-        rho, _ = stats.spearmanr(
-            list(merged[merged.index.notnull()]["for_rank"]),
-            list(merged[merged.index.notnull()]["curr_rank"]),
-        )
-        rho_back, _ = stats.spearmanr(
-            list(merged[merged.index.notnull()]["back_rank"]),
-            list(merged[merged.index.notnull()]["curr_rank"]),
-        )
+    The top singular vector of the sparse playlist by song matrix of
+    centered percentiles splits the playlists along the direction they
+    disagree on most, which is forward against reversed.
+
+    Args:
+        matrix: a RankMatrix.
+        centered: a float array, the centered percentile of every entry.
+
+    Returns:
+        A float array of weights between 0 and 1, and a float array of 1
+        or -1 for every playlist.
+    """
+    shape = (matrix.num_playlists, matrix.num_songs)
+    # with no playlist of two or more songs every centered percentile is
+    # zero, and svds can't start from an all zero matrix
+    if min(shape) < 2 or not centered.any():
+        return np.ones(shape[0]), np.ones(shape[0])
+    scores = sparse.csr_matrix((centered, (matrix.playlist_id, matrix.song_id)), shape)
+    vector = linalg.svds(scores, k=1, random_state=0)[0][:, 0]
+    if np.count_nonzero(vector < 0) > np.count_nonzero(vector > 0):
+        vector = -vector
+    return np.abs(vector) / np.abs(vector).max(), np.where(vector < 0, -1.0, 1.0)
+
+
+@profiled(rows=rows_of_first_arg)
+def find_consensus_orientation(playlists, max_iter=100, tol=1e-6):
+    """
+    Finds the spearman correlation of every playlist with a consensus order.
+
+    No model playlists are needed. Every song gets a consensus position,
+    the weighted mean of its centered percentile across the playlists,
+    with reversed playlists flipped. Each playlist is correlated with the
+    consensus of the other playlists on the songs it shares with them, and
+    the flips and weights are updated from those correlations: a playlist
+    counts as much as it agrees or disagrees with everyone else, so
+    ambiguous playlists drop out. This repeats until the correlations
+    settle, using pearson correlations, which need no sorting, and the
+    final spearman correlations are found once at the end. Every step is
+    a grouped pass over the flat song entries, so all playlists are scored
+    at once.
+
+    "Forward" is whichever direction most of the playlists agree on.
 
-        if abs(rho) + abs(rho_back) < threshold:
-            ambiguous_indexes.append(row[0])
-        elif rho_back > 0 > rho:
-            reversed_indexes.append(row[0])
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist,
+        or a dataframe with one playlist per row.
+        max_iter: an int, the most reweighting steps to run.
+        tol: a float, the largest change in any correlation at which to
+        stop.
+
+    Returns:
+        A float array of each playlist's correlation with the consensus, and
+        a float array of its correlation with the reversed consensus, which
+        is the negative of the first, to pass to classify_orientation.
+        Playlists sharing less than two songs with the others get NaN.
+    """
+    matrix = build_rank_matrix(playlists)
+    num_playlists = matrix.num_playlists
+    playlist_id = matrix.playlist_id
+    position = np.arange(len(matrix.song_id)) - matrix.offsets[playlist_id]
+    centered = (position + 0.5) / np.repeat(matrix.length, matrix.length) - 0.5
+
+    weight, sign = _principal_orientation(matrix, centered)
+    rho = np.zeros(num_playlists)
+    for _ in range(max_iter):
+        shared, consensus = _leave_one_out(matrix, centered, sign, weight)
+        sub_playlist = playlist_id[shared]
+        own = centered[shared]
+
+        def total(values):
+            return np.bincount(sub_playlist, values, minlength=num_playlists)
+
+        counts = total(None)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            own_mean = total(own) / counts
+            consensus_mean = total(consensus) / counts
+            covariance = total(own * consensus) / counts - own_mean * consensus_mean
+            own_var = total(own * own) / counts - own_mean**2
+            consensus_var = total(consensus * consensus) / counts - consensus_mean**2
+            updated = covariance / np.sqrt(own_var * consensus_var)
+        updated = np.clip(np.nan_to_num(updated), -1, 1)
+        change = np.max(np.abs(updated - rho), initial=0)
+        rho = updated
+        sign = np.where(rho < 0, -1.0, 1.0)
+        weight = np.abs(rho)
+        if change < tol:
+            break
 
-    return ambiguous_indexes, reversed_indexes
+    shared, consensus = _leave_one_out(matrix, centered, sign, weight)
+    sub_playlist = playlist_id[shared]
+    counts = np.bincount(sub_playlist, minlength=num_playlists)
+    sub_start = np.concatenate(([0], np.cumsum(counts)))[sub_playlist]
+    own = np.arange(len(sub_playlist)) - sub_start
+    order = np.lexsort((matrix.song_id[shared], consensus, sub_playlist))
+    agreed = np.empty(len(order), dtype=np.int64)
+    agreed[order] = own
+    squared = np.bincount(sub_playlist, (own - agreed) ** 2.0, minlength=num_playlists)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rho = 1 - 6 * squared / (counts * (counts**2.0 - 1))
+    rho[counts < 2] = np.nan
+    if np.count_nonzero(rho < 0) > np.count_nonzero(rho > 0):
+        rho = -rho
+    return rho, -rho
+
+
+@profiled(rows=rows_of_first_arg)
+def classify_orientation(rho, rho_back, threshold=0.5):
+    """
+    Sorts playlists into ambiguous and reversed from their correlations.
+
+    Args:
+        rho: a float array of correlations with the forward model playlist.
+        rho_back: a float array of correlations with the backward model
+        playlist.
+        threshold: a number, playlists whose absolute correlations add up to
+        less than it are ambiguous.
+
+    Returns:
+        A list of numbers representing the indexes of the playlists that are in ambigious order,
+        and a list of numbers representing the indexes of the playlists that are reversed.
+    """
+    ambiguous = np.abs(rho) + np.abs(rho_back) < threshold
+    reverse = ~ambiguous & (rho_back > 0) & (rho < 0)
+    return np.flatnonzero(ambiguous).tolist(), np.flatnonzero(reverse).tolist()
 
 
+@profiled(rows=rows_of_first_arg)
+def find_anomalies(playlists, forward_i=None, backward_i=None, threshold=0.5):
+    """
+    Finds playlists that are reversed ordered or appear to be unusually ordered.
+
+    Uses find_orientation_scores to correlate every playlist with the model
+    playlists in one batch, or, without models, find_consensus_orientation
+    to correlate every playlist with the consensus of all the others. To
+    try several thresholds, call either once and pass its correlations to
+    classify_orientation for each threshold.
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        forward_i: number representing index of a playlist to be used as a model normal order
+        playlist, or None to find the order from all the playlists.
+        backward_i: number representing index of a playlist to be used as a model reverse order
+        playlist, or None to find the order from all the playlists.
+        threshold: a number, playlists whose absolute correlations with the
+        two models add up to less than it are ambiguous.
+
+    Returns:
+        A list of numbers representing the indexes of the playlists that are in ambigious order,
+        and a list of numbers representing the indexes of the playlists that are reversed.
+    """
+
+    if forward_i is None or backward_i is None:
+        rho, rho_back = find_consensus_orientation(playlists)
+    else:
+        rho, rho_back = find_orientation_scores(playlists, forward_i, backward_i)
+    return classify_orientation(rho, rho_back, threshold)
+
+
+@profiled(rows=rows_of_first_arg)
 def reverse_rows(playlists, indexes):
     """
     Reverses the order of the playlists at the given indices.
 
     Args:
-        playlists: a 2d list of songs, with each inner list being a playlist.
+        playlists: a 2d list of songs, with each inner list being a playlist,
+        or a corpus.Corpus.
         indexes: a list of numbers representing the indexes of playlists to be reversed.
 
     Returns:
-        the modified playlist list
+        the modified playlist list, without None or NaN padding in the
+        reversed playlists, or for a Corpus, a new Corpus viewing the same
+        songs with those playlists reversed.
     """
-    data = pd.DataFrame(playlists)
+    if isinstance(playlists, Corpus):
+        return playlists.reverse(indexes)
     for i in indexes:
-        playlists[i] = list(reversed(data.loc[i].dropna()))
+        playlists[i] = [
+            song
+            for song in reversed(playlists[i])
+            if song is not None and not (isinstance(song, float) and np.isnan(song))
+        ]
     return playlists
@@ -0,0 +1,87 @@
+"""
+Deferred imports of heavy dependencies.
+
+pandas, scipy, matplotlib and spotipy take hundreds of milliseconds to
+import, which short-lived workers and command line calls pay before doing
+any work. A module made with lazy_import stands in for the real one and
+only imports it the first time one of its attributes is used, so a module
+can keep writing pd.DataFrame or plt.subplots as usual without importing
+anything until that line runs.
+"""
+
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    A stand in for a module that imports it on first attribute access.
+
+    Attributes:
+        name: a string, the full name of the module, like "scipy.sparse".
+    """
+
+    __slots__ = ("name", "_module")
+
+    def __init__(self, name):
+        self.name = name
+        self._module = None
+
+    def load(self):
+        """
+        Imports the module if it hasn't been yet.
+
+        Returns: the real module.
+        """
+        if self._module is None:
+            self._module = importlib.import_module(self.name)
+        return self._module
+
+    @property
+    def loaded(self):
+        """
+        Whether the module has been imported through this stand in.
+        """
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.name!r} ({state})>"
+
+
+def is_instance(value, module, name):
+    """
+    Checks whether a value is an instance of a class, without importing
+    the module the class is in.
+
+    A value can't be an instance of a class whose module was never
+    imported, so this is False without importing anything in that case.
+
+    Args:
+        value: the value to check.
+        module: a string, the full name of the module, like "pandas".
+        name: a string, the name of the class in the module.
+
+    Returns: a bool, isinstance(value, module.name).
+    """
+    return module in sys.modules and isinstance(
+        value, getattr(sys.modules[module], name)
+    )
+
+
+def lazy_import(name):
+    """
+    Makes a module that is imported the first time it is used.
+
+    Args:
+        name: a string, the full name of the module to import.
+
+    Returns: a LazyModule for the module.
+    """
+    return LazyModule(name)
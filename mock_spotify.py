@@ -0,0 +1,368 @@
+"""
+A local mock of the spotify web API that replays recorded playlists.
+
+Serves the token, playlist tracks and album tracks endpoints that
+data_collector uses, paged like the real API, over keep-alive HTTP/1.1, so
+the backends can be tested and benchmarked offline without credentials.
+
+Fixtures are a JSON file of the form
+    {"playlists": {"<id>": ["song", ...]}, "albums": {"<id>": ["song", ...]}}
+and fixtures_from_csv records one from a urls file and its saved csv.
+
+Example:
+    python -m mock_spotify fixtures.json --benchmark
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+
+def load_fixtures(path):
+    """
+    Reads a fixtures file.
+
+    Args:
+        path: a string, the JSON file to read.
+
+    Returns: a dictionary with playlists and albums dictionaries of spotify
+    ids and lists of song names.
+    """
+    with open(path, "r", encoding="UTF-8") as file:
+        fixtures = json.load(file)
+    return {
+        "playlists": fixtures.get("playlists", {}),
+        "albums": fixtures.get("albums", {}),
+    }
+
+
+def fixtures_from_csv(urls_path, csv_path):
+    """
+    Records fixtures from a urls file and the csv of its playlists.
+
+    Args:
+        urls_path: a string, a text file of playlist urls, like mitski.txt.
+        csv_path: a string, the csv of the same playlists in the same order,
+        like mitski_data.csv.
+
+    Returns: a fixtures dictionary with one playlist per url.
+    """
+    with open(urls_path, "r", encoding="UTF-8") as file:
+        uris = [url.strip().split("/")[-1].split("?")[0] for url in file]
+    rows = pd.read_csv(csv_path, index_col=0).to_numpy(dtype=object).tolist()
+    return {
+        "playlists": {
+            uri: [song for song in row if isinstance(song, str) and song]
+            for uri, row in zip(uris, rows)
+        },
+        "albums": {},
+    }
+
+
+class MockSpotify(ThreadingHTTPServer):
+    """
+    A threaded HTTP server replaying fixtures as the spotify API.
+
+    Attributes:
+        fixtures: a fixtures dictionary.
+        token_lifetime: an int, the expires_in of issued tokens, in seconds.
+        rate_limit_every: an int, answer every nth API request with a 429,
+        or 0 to never.
+        tokens: a set of the access tokens that are still valid.
+        issued: an int, the number of tokens issued.
+        requests: an int, the number of requests served.
+        connections: an int, the number of connections accepted.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures, port=0, token_lifetime=3600, rate_limit_every=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.fixtures = fixtures
+        self.token_lifetime = token_lifetime
+        self.rate_limit_every = rate_limit_every
+        self.tokens = set()
+        self.issued = 0
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        The base url of the server.
+        """
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def api_url(self):
+        """
+        The url to use as the API base url.
+        """
+        return f"{self.url}/v1"
+
+    @property
+    def token_url(self):
+        """
+        The url to use as the token url.
+        """
+        return f"{self.url}/api/token"
+
+    def issue_token(self):
+        """
+        Makes a new valid access token.
+
+        Returns: a string, the token.
+        """
+        with self._lock:
+            self.issued += 1
+            token = f"mock-{self.issued}"
+            self.tokens.add(token)
+        return token
+
+    def count_request(self):
+        """
+        Counts a request.
+
+        Returns: an int, the number of requests so far, this one included.
+        """
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def get_request(self):
+        with self._lock:
+            self.connections += 1
+        return super().get_request()
+
+    def start(self):
+        """
+        Serves in a background thread.
+
+        Returns: the server itself.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops a server started with start.
+        """
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Answers one connection's requests for a MockSpotify.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _send_json(self, status, value, headers=None):
+        body = json.dumps(value).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, header in (headers or {}).items():
+            self.send_header(name, header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(
+            status, {"error": {"status": status, "message": message}}, headers
+        )
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Issues client credentials tokens.
+        """
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count_request()
+        if urlsplit(self.path).path != "/api/token":
+            self._send_error(404, "Not found")
+            return
+        self._send_json(
+            200,
+            {
+                "access_token": self.server.issue_token(),
+                "token_type": "Bearer",
+                "expires_in": self.server.token_lifetime,
+            },
+        )
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Serves pages of playlist and album tracks.
+        """
+        count = self.server.count_request()
+        auth = self.headers.get("Authorization", "")
+        if auth.removeprefix("Bearer ") not in self.server.tokens:
+            self._send_error(401, "The access token expired")
+            return
+        every = self.server.rate_limit_every
+        if every and count % every == 0:
+            self._send_error(429, "API rate limit exceeded", {"Retry-After": "0"})
+            return
+
+        parts = urlsplit(self.path)
+        path = parts.path.strip("/").split("/")
+        if len(path) != 4 or path[0] != "v1" or path[3] not in ("tracks", "items"):
+            self._send_error(404, "Not found")
+            return
+        kind, uri = path[1], path[2]
+        songs = self.server.fixtures.get(kind, {}).get(uri)
+        if kind not in ("playlists", "albums") or songs is None:
+            self._send_error(404, "Not found")
+            return
+
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        offset = int(query.get("offset", 0))
+        limit = min(int(query.get("limit", 100 if kind == "playlists" else 20)), 100)
+        page = songs[offset : offset + limit]
+        if kind == "playlists":
+            items = [{"track": {"name": name}} for name in page]
+        else:
+            items = [{"name": name} for name in page]
+        following = None
+        if offset + limit < len(songs):
+            query.update(offset=offset + limit, limit=limit)
+            endpoint = "/".join(path[1:])
+            following = f"{self.server.api_url}/{endpoint}?{urlencode(query)}"
+        self._send_json(
+            200,
+            {
+                "items": items,
+                "total": len(songs),
+                "offset": offset,
+                "limit": limit,
+                "next": following,
+            },
+        )
+
+
+def benchmark(fixtures, pool_sizes=(1, 4, 16), pipeline_depths=(1, 4), repeats=3):
+    """
+    Times fetching every fixture playlist from a mock server.
+
+    Compares the blocking spotipy client, one playlist at a time, with
+    the async backend at each pool size and pipeline depth.
+
+    Args:
+        fixtures: a fixtures dictionary.
+        pool_sizes: a list of ints, connection pool sizes to time.
+        pipeline_depths: a list of ints, pipeline depths to time.
+        repeats: an int, the number of runs to take the fastest of.
+
+    Returns: a list of {"backend", "seconds", "requests", "connections"}
+    dictionaries.
+    """
+    # pylint: disable=import-outside-toplevel
+    import spotipy
+    from async_spotify import AsyncBackend
+
+    uris = list(fixtures["playlists"])
+    results = []
+
+    def record(name, server, fetch):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fetch()
+            times.append(time.perf_counter() - start)
+        results.append(
+            {
+                "backend": name,
+                "seconds": min(times),
+                "requests": server.requests,
+                "connections": server.connections,
+            }
+        )
+
+    server = MockSpotify(fixtures).start()
+    client = spotipy.Spotify(auth=server.issue_token())
+    client.prefix = f"{server.api_url}/"
+
+    def fetch_spotipy():
+        for uri in uris:
+            page = client.playlist_tracks(uri)
+            while page["next"]:
+                page = client.next(page)
+
+    record("spotipy", server, fetch_spotipy)
+    server.stop()
+
+    for size in pool_sizes:
+        for depth in pipeline_depths:
+            server = MockSpotify(fixtures).start()
+            backend = AsyncBackend(
+                "id",
+                "secret",
+                api_url=server.api_url,
+                token_url=server.token_url,
+                pool_size=size,
+                pipeline_depth=depth,
+            )
+            record(
+                f"async pool={size} depth={depth}",
+                server,
+                lambda: backend.playlist_tracks_many(uris),
+            )
+            backend.close()
+            server.stop()
+    return results
+
+
+def main(argv=None):
+    """
+    Serves fixtures, or benchmarks the backends against them.
+
+    Args:
+        argv: a list of command line arguments, sys.argv by default.
+
+    Returns: an int exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("fixtures", help="a fixtures JSON file")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument(
+        "--benchmark", action="store_true", help="time the backends and exit"
+    )
+    args = parser.parse_args(argv)
+    fixtures = load_fixtures(args.fixtures)
+
+    if args.benchmark:
+        for result in benchmark(fixtures):
+            print(
+                f"{result['backend']:>24} {result['seconds']:8.4f}s "
+                f"{result['requests']:>6} requests "
+                f"{result['connections']:>4} connections"
+            )
+        return 0
+
+    server = MockSpotify(fixtures, args.port, rate_limit_every=args.rate_limit_every)
+    print(f"api url {server.api_url}, token url {server.token_url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Mergeable per-song partial aggregates for sharded ranking.
+
+Each shard of playlists is ranked on its own, in any process or on any
+machine, into a small PartialAggregate of per-song count, sum, sum of
+squares, min and max. Partials merge associatively, so shards can be
+combined in any grouping and order into the same final averages, stds and
+cutoff filtering as ranking the whole corpus at once.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import numpy as np
+from lazy import lazy_import
+from playlist_store import load_rank_matrix
+from rank_matrix import build_rank_matrix
+
+pd = lazy_import("pandas")
+
+
+class PartialAggregate:
+    """
+    Per-song sums of the percentiles from one shard of playlists.
+
+    Attributes:
+        titles: a list of strings, the song title for each position in the
+            arrays.
+        count: an int array, the number of entries of each song.
+        total: a float array, the sum of each song's percentiles.
+        total_sq: a float array, the sum of each song's squared percentiles.
+        lowest: a float array, each song's smallest percentile.
+        highest: a float array, each song's largest percentile.
+        num_playlists: an int, the number of playlists aggregated.
+    """
+
+    def __init__(self, titles, count, total, total_sq, lowest, highest, num_playlists):
+        self.titles = list(titles)
+        self.count = np.asarray(count, dtype=np.int64)
+        self.total = np.asarray(total, dtype=float)
+        self.total_sq = np.asarray(total_sq, dtype=float)
+        self.lowest = np.asarray(lowest, dtype=float)
+        self.highest = np.asarray(highest, dtype=float)
+        self.num_playlists = int(num_playlists)
+
+    @classmethod
+    def empty(cls):
+        """
+        Makes the aggregate of no playlists, the identity of merge.
+
+        Return: an empty PartialAggregate.
+        """
+        return cls([], [], [], [], [], [], 0)
+
+    @classmethod
+    def from_playlists(cls, data):
+        """
+        Aggregates one shard of playlists.
+
+        Args: data, a dataframe with one playlist per row, a 2d list of
+        songs with each inner list being a playlist, or a RankMatrix.
+
+        Return: a PartialAggregate of the shard.
+        """
+        matrix = build_rank_matrix(data)
+        song_id, percentile = matrix.song_id, matrix.percentile
+        size = matrix.num_songs
+        lowest = np.full(size, np.inf)
+        highest = np.full(size, -np.inf)
+        np.minimum.at(lowest, song_id, percentile)
+        np.maximum.at(highest, song_id, percentile)
+        return cls(
+            matrix.titles,
+            np.bincount(song_id, minlength=size),
+            np.bincount(song_id, weights=percentile, minlength=size),
+            np.bincount(song_id, weights=percentile * percentile, minlength=size),
+            lowest,
+            highest,
+            matrix.num_playlists,
+        )
+
+    def merge(self, other):
+        """
+        Combines two partial aggregates.
+
+        Songs are matched by title, and songs only in other are added after
+        the songs of self. This builds new arrays over both catalogs, so it
+        is for combining separate partial results; aggregate_csv adds up
+        the chunks of one file in place instead.
+
+        Args: other, a PartialAggregate.
+
+        Return: a new PartialAggregate of the playlists of both.
+        """
+        ids = {title: i for i, title in enumerate(self.titles)}
+        titles = list(self.titles)
+        for title in other.titles:
+            if title not in ids:
+                ids[title] = len(titles)
+                titles.append(title)
+        where = np.array([ids[title] for title in other.titles], dtype=np.int64)
+
+        def combine(mine, theirs, fill, ufunc):
+            merged = np.full(len(titles), fill, dtype=mine.dtype)
+            merged[: len(mine)] = mine
+            ufunc.at(merged, where, theirs)
+            return merged
+
+        return PartialAggregate(
+            titles,
+            combine(self.count, other.count, 0, np.add),
+            combine(self.total, other.total, 0.0, np.add),
+            combine(self.total_sq, other.total_sq, 0.0, np.add),
+            combine(self.lowest, other.lowest, np.inf, np.minimum),
+            combine(self.highest, other.highest, -np.inf, np.maximum),
+            self.num_playlists + other.num_playlists,
+        )
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def finalize(self, cutoff=1):
+        """
+        Turns the sums into per-song statistics.
+
+        Args: cutoff, an int, songs that appear in fewer playlists than
+        cutoff are masked out.
+
+        Return: a dataframe indexed by song title with the columns count,
+        mean, var, std, min and max, like RankMatrix.song_stats.
+        """
+        count = np.maximum(self.count, 1)
+        mean = self.total / count
+        var = np.maximum(self.total_sq / count - mean * mean, 0)
+        stats = pd.DataFrame(
+            {
+                "count": self.count,
+                "mean": mean,
+                "var": var,
+                "std": np.sqrt(var),
+                "min": self.lowest,
+                "max": self.highest,
+            },
+            index=pd.Index(self.titles, dtype=object),
+        )
+        return stats[stats["count"] >= max(cutoff, 1)]
+
+    def save(self, path):
+        """
+        Writes the partial aggregate to a .npz file.
+
+        Args: path, a string, the file to write.
+        """
+        np.savez(
+            path,
+            titles=np.array(self.titles, dtype=str),
+            count=self.count,
+            total=self.total,
+            total_sq=self.total_sq,
+            lowest=self.lowest,
+            highest=self.highest,
+            num_playlists=self.num_playlists,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a partial aggregate written by save.
+
+        Args: path, a string, the file to read.
+
+        Return: a PartialAggregate.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["titles"].tolist(),
+                data["count"],
+                data["total"],
+                data["total_sq"],
+                data["lowest"],
+                data["highest"],
+                data["num_playlists"],
+            )
+
+
+def aggregate_csv(path, chunksize=1000):
+    """
+    Aggregates a playlist csv without loading all of it.
+
+    The file is read chunksize playlists at a time. Each chunk is
+    aggregated on its own and added into running arrays, which grow by
+    doubling, through one running dictionary of title ids, so each chunk
+    only costs work for its own songs, and peak memory depends on
+    chunksize and the number of distinct songs, not on the number of
+    playlists in the file.
+
+    Args: path, a string, a wide playlist csv like mitski_data.csv, with
+    an index column and one playlist per row. chunksize, an int, the
+    number of playlists to read at once.
+
+    Return: a PartialAggregate of every playlist in the file.
+    """
+    ids, titles, num_playlists = {}, [], 0
+    fills = (0, 0.0, 0.0, np.inf, -np.inf)
+    arrays = [np.full(0, fill, dtype=type(fill)) for fill in fills]
+    chunks = pd.read_csv(path, index_col=0, dtype=str, chunksize=chunksize)
+    for chunk in chunks:
+        part = PartialAggregate.from_playlists(chunk)
+        for title in part.titles:
+            if title not in ids:
+                ids[title] = len(titles)
+                titles.append(title)
+        if len(titles) > len(arrays[0]):
+            size = max(len(titles), 2 * len(arrays[0]))
+            for i, fill in enumerate(fills):
+                grown = np.full(size, fill, dtype=arrays[i].dtype)
+                grown[: len(arrays[i])] = arrays[i]
+                arrays[i] = grown
+        where = np.array([ids[title] for title in part.titles], dtype=np.int64)
+        count, total, total_sq, lowest, highest = arrays
+        count[where] += part.count
+        total[where] += part.total
+        total_sq[where] += part.total_sq
+        lowest[where] = np.minimum(lowest[where], part.lowest)
+        highest[where] = np.maximum(highest[where], part.highest)
+        num_playlists += part.num_playlists
+    return PartialAggregate(
+        titles, *(array[: len(titles)] for array in arrays), num_playlists
+    )
+
+
+def aggregate_file(path):
+    """
+    Aggregates the playlists in one shard file.
+
+    Args: path, a string, a .npz file from playlist_store.save_playlists or
+    a wide playlist csv like mitski_data.csv.
+
+    Return: a PartialAggregate of the file's playlists.
+    """
+    if path.endswith(".npz"):
+        return PartialAggregate.from_playlists(load_rank_matrix(path))
+    return aggregate_csv(path)
+
+
+def aggregate_files(paths, processes=None):
+    """
+    Aggregates shard files in parallel processes and merges the results.
+
+    Args: paths, a list of shard file paths for aggregate_file. processes,
+    an int, the number of processes, or None for one per CPU.
+
+    Return: a PartialAggregate of every playlist in every file.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        partials = pool.map(aggregate_file, paths)
+        return reduce(PartialAggregate.merge, partials, PartialAggregate.empty())
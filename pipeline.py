@@ -0,0 +1,307 @@
+"""
+Headless command line pipeline for the sadness rankings.
+
+Runs the same steps as main.ipynb for any number of artists: fetch the
+playlists, fix their orientation with find_anomalies and reverse_rows,
+rank the songs and save the charts. Every stage is checkpointed in the
+output directory, so a re-run resumes from the first stage whose inputs
+changed. Artists are processed in parallel.
+
+Example:
+    python -m pipeline mitski.txt:0:2 phoebe.txt:6:2:0.2 --cache spotify_cache.sqlite
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import annotations
+import data_collector
+import data_helpers
+from corpus import Corpus
+from playlist_store import load_playlists, save_playlists
+from response_cache import ResponseCache
+
+# plots are only saved to files. matplotlib reads the backend from here when
+# annotations first uses pyplot, so it isn't imported just to set it
+os.environ["MPLBACKEND"] = "Agg"
+
+
+def parse_artist(spec):
+    """
+    Parses an artist argument of the form URLS_FILE[:FORWARD:BACKWARD[:THRESHOLD]].
+
+    Args:
+        spec: a string, the path of a text file of playlist urls, optionally
+        followed by the indexes of the model forward and backward playlists
+        for find_anomalies, and its threshold. "auto" in place of the two
+        indexes finds the orientation from the consensus of all the
+        playlists instead.
+
+    Returns: a dictionary with the keys path, name, auto, forward, backward
+    and threshold. forward and backward are None when not given, which
+    skips the orientation fix unless auto is True.
+    """
+    parts = spec.split(":")
+    auto = len(parts) in (2, 3) and parts[1] == "auto"
+    if auto:
+        parts = [parts[0], None, None] + parts[2:]
+    if len(parts) not in (1, 3, 4):
+        raise argparse.ArgumentTypeError(
+            f"{spec!r} should look like URLS_FILE[:FORWARD:BACKWARD[:THRESHOLD]]"
+            " or URLS_FILE:auto[:THRESHOLD]"
+        )
+    return {
+        "path": parts[0],
+        "name": os.path.splitext(os.path.basename(parts[0]))[0],
+        "auto": auto,
+        "forward": int(parts[1]) if len(parts) > 1 and not auto else None,
+        "backward": int(parts[2]) if len(parts) > 1 and not auto else None,
+        "threshold": float(parts[3]) if len(parts) > 3 else 0.5,
+    }
+
+
+def _fingerprint(*parts):
+    """
+    Hashes the inputs of a stage.
+
+    Args:
+        parts: strings or JSON-serializable values describing the inputs.
+
+    Returns: a hex string that changes whenever any part changes.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True).encode("UTF-8"))
+    return digest.hexdigest()
+
+
+def checkpoint(directory, name, fingerprint, outputs, run, force=False):
+    """
+    Runs a stage unless a checkpoint with the same fingerprint exists.
+
+    Args:
+        directory: a string, the directory the stage writes to.
+        name: a string, the name of the stage.
+        fingerprint: a string, the hash of everything the stage depends on.
+        outputs: a list of file names the stage writes in directory.
+        run: a function with no arguments that runs the stage.
+        force: a bool, True to run the stage even if it is up to date.
+
+    Returns: a bool, True if the stage ran, False if it was skipped.
+    """
+    manifest_path = os.path.join(directory, f"{name}.checkpoint.json")
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="UTF-8") as file:
+            manifest = json.load(file)
+        if manifest["fingerprint"] == fingerprint and all(
+            os.path.exists(os.path.join(directory, output)) for output in outputs
+        ):
+            return False
+
+    run()
+    data_collector.write_json(
+        manifest_path, {"fingerprint": fingerprint, "outputs": outputs}
+    )
+    return True
+
+
+def _setup_collector(options):
+    """
+    Configures data_collector in a worker process.
+
+    Args:
+        options: a dictionary of the command line options.
+    """
+    if options.get("cache"):
+        data_collector.use_cache(ResponseCache(options["cache"]), options["offline"])
+    elif options.get("offline"):
+        data_collector.use_cache(None, True)
+
+
+def _ensure_login(options):
+    """
+    Logs in to the spotify API unless already logged in or offline.
+
+    Args:
+        options: a dictionary of the command line options.
+    """
+    if data_collector.SPOTIFY is None and not options.get("offline"):
+        data_collector.login()
+
+
+def run_artist(artist, options):
+    """
+    Runs every stage for one artist, skipping the stages that are up to date.
+
+    Args:
+        artist: a dictionary from parse_artist.
+        options: a dictionary of the command line options: out, cache,
+        offline, workers, cutoff, top, plots and force.
+
+    Returns: a list of the names of the stages that ran.
+    """
+    _setup_collector(options)
+    directory = os.path.join(options["out"], artist["name"])
+    os.makedirs(directory, exist_ok=True)
+    force = options.get("force", False)
+    ran = []
+
+    def path(name):
+        return os.path.join(directory, name)
+
+    with open(artist["path"], "r", encoding="UTF-8") as file:
+        urls = file.read()
+    fingerprint = _fingerprint("fetch", urls)
+
+    def fetch():
+        _ensure_login(options)
+        # a playlist that failed would otherwise be saved empty and never
+        # fetched again, since the checkpoint only covers the urls file
+        playlists = data_collector.get_all_playlists(
+            artist["path"], options.get("workers", 1), strict=True
+        )
+        save_playlists(path("playlists.npz"), playlists)
+
+    if checkpoint(directory, "fetch", fingerprint, ["playlists.npz"], fetch, force):
+        ran.append("fetch")
+
+    fingerprint = _fingerprint(
+        fingerprint,
+        "orient",
+        artist.get("auto", False),
+        artist["forward"],
+        artist["backward"],
+        artist["threshold"],
+    )
+
+    def orient():
+        playlists = Corpus.from_playlists(load_playlists(path("playlists.npz")))
+        ambiguous_indexes, reversed_indexes = [], []
+        if artist.get("auto") or artist["forward"] is not None:
+            ambiguous_indexes, reversed_indexes = data_helpers.find_anomalies(
+                playlists, artist["forward"], artist["backward"], artist["threshold"]
+            )
+            playlists = data_helpers.reverse_rows(playlists, reversed_indexes)
+            playlists = playlists.drop(ambiguous_indexes)
+        save_playlists(path("oriented.npz"), playlists)
+        with open(path("orientation.json"), "w", encoding="UTF-8") as file:
+            json.dump(
+                {"ambiguous": ambiguous_indexes, "reversed": reversed_indexes}, file
+            )
+
+    outputs = ["oriented.npz", "orientation.json"]
+    if checkpoint(
+        directory, "orient", fingerprint, outputs, orient, force or bool(ran)
+    ):
+        ran.append("orient")
+
+    fingerprint = _fingerprint(fingerprint, "rank", options["cutoff"])
+
+    def rank():
+        playlists = load_playlists(path("oriented.npz"))
+        ranking = {
+            "average": data_helpers.get_avg_ranking(playlists, options["cutoff"]),
+            "all": data_helpers.get_all_ranking(playlists, options["cutoff"]),
+        }
+        with open(path("ranking.json"), "w", encoding="UTF-8") as file:
+            json.dump(ranking, file)
+
+    if checkpoint(
+        directory, "rank", fingerprint, ["ranking.json"], rank, force or bool(ran)
+    ):
+        ran.append("rank")
+
+    if not options.get("plots", True):
+        return ran
+
+    fingerprint = _fingerprint(fingerprint, "plot", options["top"])
+
+    def plot():
+        _ensure_login(options)
+        data_collector.get_album_index(os.path.join(options["out"], "album_index.json"))
+        with open(path("ranking.json"), "r", encoding="UTF-8") as file:
+            ranking = json.load(file)
+        annotations.graph_songs_percentile(
+            ranking["average"],
+            f"Average 'Sadness Ranking' of {artist['name']} Songs",
+            path=path("average.png"),
+        )
+        annotations.make_boxplot_songs(
+            data_helpers.find_most_controversial(ranking["all"], options["top"]),
+            f"{artist['name']}'s Most Controversial Songs",
+            path=path("most_controversial.png"),
+        )
+        annotations.make_boxplot_songs(
+            data_helpers.find_least_controversial(ranking["all"], options["top"]),
+            f"{artist['name']}'s Least Controversial Songs",
+            path=path("least_controversial.png"),
+        )
+
+    outputs = ["average.png", "most_controversial.png", "least_controversial.png"]
+    if checkpoint(directory, "plot", fingerprint, outputs, plot, force or bool(ran)):
+        ran.append("plot")
+
+    return ran
+
+
+def main(argv=None):
+    """
+    Runs the pipeline from the command line.
+
+    Args:
+        argv: a list of command line arguments, sys.argv by default.
+
+    Returns: an int exit code.
+    """
+    parser = argparse.ArgumentParser(
+        description="Fetch, clean, rank and plot ranked-by-sadness playlists."
+    )
+    parser.add_argument(
+        "artists",
+        nargs="+",
+        type=parse_artist,
+        metavar="URLS_FILE[:FORWARD:BACKWARD[:THRESHOLD]]",
+        help="a text file of playlist urls, with optional find_anomalies models"
+        " or auto",
+    )
+    parser.add_argument("--out", default="output", help="the checkpoint directory")
+    parser.add_argument("--cache", help="a SQLite file to cache API responses in")
+    parser.add_argument(
+        "--offline", action="store_true", help="only use cached API responses"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="playlists per artist")
+    parser.add_argument("--jobs", type=int, default=None, help="artists at once")
+    parser.add_argument("--cutoff", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--no-plots", dest="plots", action="store_false")
+    parser.add_argument("--force", action="store_true", help="ignore checkpoints")
+    args = parser.parse_args(argv)
+
+    options = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("artists", "jobs")
+    }
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            artist["name"]: pool.submit(run_artist, artist, options)
+            for artist in args.artists
+        }
+        failed = False
+        for name, future in futures.items():
+            try:
+                ran = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                print(f"{name}: failed: {error}", file=sys.stderr)
+                failed = True
+            else:
+                print(f"{name}: ran {', '.join(ran) or 'nothing, up to date'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
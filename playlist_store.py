@@ -0,0 +1,80 @@
+"""
+Compact long-format storage of ranked playlists.
+
+Playlists are saved as a song table of titles plus one
+(playlist_id, position, song_id) row per song entry, in a compressed .npz
+file, so file size and load time scale with the number of entries rather
+than playlists times the longest playlist.
+"""
+
+import numpy as np
+from lazy import lazy_import
+from rank_matrix import RankMatrix, build_rank_matrix, rank_matrix_from_entries
+
+pd = lazy_import("pandas")
+
+
+def save_playlists(path, data):
+    """
+    Saves playlists in the long format.
+
+    Args:
+        path: a string, the .npz file to write.
+        data: a dataframe with one playlist per row, a 2d list of songs
+        with each inner list being a playlist, or a RankMatrix.
+    """
+    matrix = data if isinstance(data, RankMatrix) else build_rank_matrix(data)
+    playlist_id = matrix.playlist_id
+    np.savez_compressed(
+        path,
+        titles=np.array(matrix.titles, dtype=str),
+        playlist_id=playlist_id.astype(np.int32),
+        position=(np.arange(len(playlist_id)) - matrix.offsets[playlist_id]).astype(
+            np.int32
+        ),
+        song_id=matrix.song_id.astype(np.int32),
+        num_playlists=matrix.num_playlists,
+    )
+
+
+def load_rank_matrix(path):
+    """
+    Loads playlists saved by save_playlists straight into a RankMatrix.
+
+    Args:
+        path: a string, the .npz file to read.
+
+    Returns: a RankMatrix, ready for the ranking functions.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        order = np.lexsort((data["position"], data["playlist_id"]))
+        return rank_matrix_from_entries(
+            data["titles"].tolist(),
+            data["playlist_id"][order],
+            data["song_id"][order],
+            int(data["num_playlists"]),
+        )
+
+
+def load_playlists(path):
+    """
+    Loads playlists saved by save_playlists as lists of song titles.
+
+    Args:
+        path: a string, the .npz file to read.
+
+    Returns: a 2d list of song titles, with each inner list being a
+    playlist.
+    """
+    return load_rank_matrix(path).to_playlists()
+
+
+def convert_csv(csv_path, path):
+    """
+    Converts a wide playlist csv, like mitski_data.csv, to the long format.
+
+    Args:
+        csv_path: a string, the csv saved from a dataframe of playlists.
+        path: a string, the .npz file to write.
+    """
+    save_playlists(path, pd.read_csv(csv_path, index_col=0))
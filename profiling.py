@@ -0,0 +1,202 @@
+"""
+Opt-in timing and memory instrumentation for the analysis pipeline.
+
+Set the SADNESS_PROFILE environment variable before importing the pipeline
+modules to record the wall time, call count, rows processed and peak
+memory of every public function in data_helpers, data_collector and
+annotations. With SADNESS_PROFILE=1 a summary table is printed to stderr
+when the run ends, and with SADNESS_PROFILE=some/path.json the records are
+written there as JSON instead. When the variable isn't set, profiled
+returns functions unchanged, so there is no overhead at all.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+SETTING = os.environ.get("SADNESS_PROFILE", "")
+ENABLED = SETTING not in ("", "0")
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+_LOCAL = threading.local()
+
+
+def _record(name, seconds, rows, peak):
+    """
+    Adds one finished stage to the registry.
+
+    Args:
+        name: a string, the name of the stage.
+        seconds: a float, the wall time the stage took.
+        rows: an int number of rows processed, or None if not known.
+        peak: an int, the peak bytes allocated during the stage.
+    """
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.setdefault(
+            name, {"calls": 0, "seconds": 0.0, "rows": 0, "peak_memory": 0}
+        )
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["rows"] += rows or 0
+        entry["peak_memory"] = max(entry["peak_memory"], peak)
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Records the time and memory of a block of code as a named stage.
+
+    Stages can be nested; the peak memory of an inner stage also counts
+    towards the outer one. Does nothing unless profiling is enabled.
+
+    Args:
+        name: a string, the name to record the stage under.
+        rows: an int, the number of rows the stage processes, if known.
+
+    Yields: a dictionary; setting its "rows" key inside the block records
+    a row count found while running.
+    """
+    info = {"rows": rows}
+    if not ENABLED:
+        yield info
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+    tracemalloc.reset_peak()
+    frame = {"start": current, "peak": current}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        stack.pop()
+        frame["peak"] = max(frame["peak"], peak)
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], frame["peak"])
+        _record(name, seconds, info["rows"], frame["peak"] - frame["start"])
+
+
+def rows_of_first_arg(args, _kwargs, _result):
+    """
+    Counts rows as the length of a function's first argument.
+    """
+    return len(args[0]) if args else None
+
+
+def rows_of_result(_args, _kwargs, result):
+    """
+    Counts rows as the length of a function's return value.
+    """
+    return len(result)
+
+
+def profiled(function=None, *, rows=None):
+    """
+    Records every call of a function as a stage named after it.
+
+    Can be used as @profiled or @profiled(rows=rows_of_first_arg).
+
+    Args:
+        function: the function to instrument.
+        rows: a function taking the call's args, kwargs and result, and
+        returning the number of rows processed, or None to not count rows.
+
+    Returns: the instrumented function, or function itself unchanged when
+    profiling is disabled.
+    """
+    if function is None:
+        return functools.partial(profiled, rows=rows)
+    if not ENABLED:
+        return function
+
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with stage(name) as info:
+            result = function(*args, **kwargs)
+            if rows is not None:
+                try:
+                    info["rows"] = rows(args, kwargs, result)
+                except TypeError:
+                    info["rows"] = None
+            return result
+
+    return wrapper
+
+
+def records():
+    """
+    Gets a copy of everything recorded so far.
+
+    Returns: a dictionary of stage name keys and dictionaries of calls,
+    seconds, rows and peak_memory (bytes) values.
+    """
+    with _REGISTRY_LOCK:
+        return {name: dict(entry) for name, entry in _REGISTRY.items()}
+
+
+def reset():
+    """
+    Forgets everything recorded so far.
+    """
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
+
+
+def summary():
+    """
+    Formats the records as a table, slowest stage first.
+
+    Returns: a string with one line per stage.
+    """
+    lines = [f"{'stage':<50} {'calls':>7} {'seconds':>10} {'rows':>10} {'peak MB':>9}"]
+    for name, entry in sorted(records().items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(
+            f"{name:<50} {entry['calls']:>7} {entry['seconds']:>10.4f} "
+            f"{entry['rows']:>10} {entry['peak_memory'] / 1e6:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def dump_json(path):
+    """
+    Writes the records to a JSON file.
+
+    Args:
+        path: a string, the file to write.
+    """
+    with open(path, "w", encoding="UTF-8") as file:
+        json.dump(records(), file, indent=2)
+
+
+def _report():
+    """
+    Prints or writes the records when the run ends.
+    """
+    if not _REGISTRY:
+        return
+    if SETTING.endswith(".json"):
+        dump_json(SETTING)
+    else:
+        print(summary(), file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(_report)
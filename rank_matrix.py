@@ -0,0 +1,507 @@
+"""
+Array-backed storage of ranked playlists.
+
+Song titles are interned to integer ids once, and every playlist is stored
+in one set of flat NumPy arrays (CSR style), so percentiles for the whole
+corpus can be found in a single vectorized pass instead of song by song.
+"""
+
+import sys
+from itertools import chain
+
+import numpy as np
+from lazy import is_instance, lazy_import
+
+pd = lazy_import("pandas")
+sparse = lazy_import("scipy.sparse")
+
+
+class RankMatrix:
+    """
+    Ranked playlists stored as flat arrays of interned song ids.
+
+    Playlist p is stored in the slice offsets[p]:offsets[p + 1] of the
+    song_id and rank arrays, in the order the spotify user ranked them.
+
+    Attributes:
+        titles: a list of strings, the song title for each song id, in the
+            order the songs were first seen.
+        offsets: an int array of length num_playlists + 1, the start of
+            each playlist in song_id and rank.
+        song_id: an int array, the interned id of every song entry.
+        rank: an int array, the 1-based position of every song entry in
+            its playlist. A song listed twice in one playlist gets the
+            rank of its first appearance both times.
+        length: an int array, the number of songs in each playlist.
+    """
+
+    def __init__(self, titles, offsets, song_id, rank):
+        self.titles = titles
+        self.offsets = offsets
+        self.song_id = song_id
+        self.rank = rank
+        self.length = np.diff(offsets)
+
+    @property
+    def num_playlists(self):
+        """
+        The number of playlists stored.
+        """
+        return len(self.length)
+
+    @property
+    def num_songs(self):
+        """
+        The number of distinct song titles stored.
+        """
+        return len(self.titles)
+
+    @property
+    def playlist_id(self):
+        """
+        An int array with the playlist index of every song entry.
+        """
+        return np.repeat(np.arange(self.num_playlists), self.length)
+
+    @property
+    def percentile(self):
+        """
+        A float array with the percentile rank of every song entry.
+
+        The percentile is the rank of the song divided by the number of
+        songs in its playlist, the same as find_percentile.
+        """
+        return self.rank / np.repeat(self.length, self.length)
+
+    def counts(self):
+        """
+        Counts the number of entries of every song.
+
+        Return: an int array of length num_songs.
+        """
+        return np.bincount(self.song_id, minlength=self.num_songs)
+
+    def to_dict(self, cutoff=1):
+        """
+        Builds the dictionary view used by the rest of data_helpers.
+
+        Args: cutoff, an int, songs that appear in fewer playlists than
+        cutoff are left out.
+
+        Return: a dictionary with song title keys and lists of percentile
+        values, in playlist order. Songs are in the order they were first
+        seen.
+        """
+        order = np.argsort(self.song_id, kind="stable")
+        counts = self.counts()
+        groups = np.split(self.percentile[order], np.cumsum(counts)[:-1])
+        return {
+            title: group.tolist()
+            for title, group, count in zip(self.titles, groups, counts)
+            if count >= cutoff
+        }
+
+    def to_playlists(self):
+        """
+        Turns the stored playlists back into lists of song titles.
+
+        Return: a 2d list of song titles, with each inner list being a
+        playlist, without any padding.
+        """
+        titles = np.array(self.titles, dtype=object)
+        return [
+            titles[ids].tolist() for ids in np.split(self.song_id, self.offsets[1:-1])
+        ]
+
+    def to_dense(self, start=0, stop=None, columns=None):
+        """
+        Pads playlists into one rank matrix.
+
+        Args: start and stop, ints, the range of playlists to include,
+        all of them by default. columns, an int array of the song ids to
+        include, in order, or None for every song.
+
+        Return: a float array with one row per playlist and one column per
+        song id, holding the rank of the song in the playlist, or NaN if
+        the song isn't on it.
+        """
+        stop = self.num_playlists if stop is None else stop
+        entries = slice(self.offsets[start], self.offsets[stop])
+        rows = np.repeat(np.arange(stop - start), self.length[start:stop])
+        song_id = self.song_id[entries]
+        rank = self.rank[entries]
+        width = self.num_songs
+        if columns is not None:
+            lookup = np.full(self.num_songs, -1)
+            lookup[columns] = np.arange(len(columns))
+            song_id = lookup[song_id]
+            kept = song_id >= 0
+            rows, song_id, rank = rows[kept], song_id[kept], rank[kept]
+            width = len(columns)
+
+        dense = np.full((stop - start, width), np.nan)
+        dense[rows, song_id] = rank
+        return dense
+
+    def to_sparse(self):
+        """
+        Sums the percentiles and entries of every song on every playlist.
+
+        Return: two scipy.sparse csr matrices with one row per playlist and
+        one column per song id, the first holding the sum of the song's
+        percentiles on the playlist and the second its number of entries.
+        """
+        shape = (self.num_playlists, self.num_songs)
+        playlist_id = self.playlist_id
+        sums = sparse.csr_matrix(
+            (self.percentile, (playlist_id, self.song_id)), shape=shape
+        )
+        counts = sparse.csr_matrix(
+            (np.ones(len(self.song_id)), (playlist_id, self.song_id)), shape=shape
+        )
+        return sums, counts
+
+    def mean_percentiles(self, cutoff=1):
+        """
+        Finds the average percentile of every song, without a dataframe.
+
+        Args: cutoff, an int, songs that appear in fewer playlists than
+        cutoff are left out.
+
+        Return: a dictionary of song title keys and average percentile
+        values, in the order the songs were first seen, equal to the mean
+        column of song_stats.
+        """
+        count = self.counts()
+        total = np.bincount(
+            self.song_id, weights=self.percentile, minlength=self.num_songs
+        )
+        kept = np.flatnonzero(count >= max(cutoff, 1))
+        means = (total[kept] / count[kept]).tolist()
+        return {self.titles[i]: mean for i, mean in zip(kept.tolist(), means)}
+
+    def song_stats(self, cutoff=1):
+        """
+        Finds the percentile statistics of every song in one pass.
+
+        Args: cutoff, an int, songs that appear in fewer playlists than
+        cutoff are masked out.
+
+        Return: a dataframe indexed by song title with the columns
+        described in group_stats.
+        """
+        stats = group_stats(self.song_id, self.percentile, self.num_songs)
+        stats.index = pd.Index(self.titles, dtype=object)
+        return stats[stats["count"] >= cutoff]
+
+    def canonicalize(self, canonical):
+        """
+        Merges songs that share a canonical title.
+
+        Each distinct title is looked up once, and the entries are remapped
+        to the merged song ids, so a song and its live or remastered
+        versions are ranked as one song. A playlist with two versions of a
+        song keeps only the first version, so the song counts once towards
+        the cutoff, and the songs after a dropped one move up a rank.
+        Repeats of the exact title that was kept are left alone, as they
+        are without a title index.
+
+        Args: canonical, a function from a song title to its canonical
+        title, like title_index.TitleIndex.canonical.
+
+        Return: a new RankMatrix with one song id per canonical title.
+        """
+        titles, ids = [], {}
+        lookup = np.empty(self.num_songs, dtype=np.int64)
+        for i, title in enumerate(self.titles):
+            name = canonical(title)
+            if name not in ids:
+                ids[name] = len(titles)
+                titles.append(name)
+            lookup[i] = ids[name]
+        song_id = lookup[self.song_id]
+        playlist_id = self.playlist_id
+        _, first, group = np.unique(
+            playlist_id * len(titles) + song_id, return_index=True, return_inverse=True
+        )
+        kept = np.flatnonzero(self.song_id == self.song_id[first][group])
+        return rank_matrix_from_entries(
+            titles, playlist_id[kept], song_id[kept], self.num_playlists
+        )
+
+
+def group_stats(song_id, values, num_songs):
+    """
+    Finds the count, mean, variance, std, min and max of every song.
+
+    Every statistic is found with np.bincount or a ufunc reduceat over the
+    interned song ids, so there is no python loop over songs. The variance
+    and std are population statistics, the same as np.std.
+
+    Args: song_id, an int array with the song id of every value. values, a
+    float array of the same length. num_songs, an int, the number of song
+    ids.
+
+    Return: a dataframe with one row per song id and the columns count,
+    mean, var, std, min and max. Songs without values have a count of 0
+    and NaN for the rest.
+    """
+    count = np.bincount(song_id, minlength=num_songs)
+    total = np.bincount(song_id, weights=values, minlength=num_songs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        deviation = values - mean[song_id]
+        var = (
+            np.bincount(song_id, weights=deviation * deviation, minlength=num_songs)
+            / count
+        )
+
+    lowest = np.full(num_songs, np.nan)
+    highest = np.full(num_songs, np.nan)
+    present = count > 0
+    if present.any():
+        order = np.argsort(song_id, kind="stable")
+        starts = (np.cumsum(count) - count)[present]
+        lowest[present] = np.minimum.reduceat(values[order], starts)
+        highest[present] = np.maximum.reduceat(values[order], starts)
+
+    return pd.DataFrame(
+        {
+            "count": count,
+            "mean": mean,
+            "var": var,
+            "std": np.sqrt(var),
+            "min": lowest,
+            "max": highest,
+        }
+    )
+
+
+def group_quantile(song_id, values, num_songs, quantile):
+    """
+    Finds a quantile of the values of every song.
+
+    The values are sorted once by song id and value, and each quantile is
+    linearly interpolated between the two closest values of its song, the
+    same as np.quantile.
+
+    Args: song_id, an int array with the song id of every value. values, a
+    float array of the same length. num_songs, an int, the number of song
+    ids. quantile, a float between 0 and 1.
+
+    Return: a float array of length num_songs, NaN for songs without
+    values.
+    """
+    count = np.bincount(song_id, minlength=num_songs)
+    ordered = values[np.lexsort((values, song_id))]
+    result = np.full(num_songs, np.nan)
+    present = count > 0
+    starts = (np.cumsum(count) - count)[present]
+    position = quantile * (count[present] - 1)
+    below = np.floor(position).astype(np.int64)
+    above = np.ceil(position).astype(np.int64)
+    low = ordered[starts + below]
+    high = ordered[starts + above]
+    result[present] = low + (high - low) * (position - below)
+    return result
+
+
+def group_spread(song_id, values, num_songs, by="std"):
+    """
+    Finds how spread out the values of every song are.
+
+    Args: song_id, an int array with the song id of every value. values, a
+    float array of the same length. num_songs, an int, the number of song
+    ids. by, a string naming the measure of spread: "std" for the standard
+    deviation, "iqr" for the interquartile range or "mad" for the median
+    absolute deviation.
+
+    Return: a float array of length num_songs, NaN for songs without
+    values.
+    """
+    if by == "std":
+        return group_stats(song_id, values, num_songs)["std"].to_numpy()
+    if by == "iqr":
+        return group_quantile(song_id, values, num_songs, 0.75) - group_quantile(
+            song_id, values, num_songs, 0.25
+        )
+    if by == "mad":
+        median = group_quantile(song_id, values, num_songs, 0.5)
+        deviation = np.abs(values - median[song_id])
+        return group_quantile(song_id, deviation, num_songs, 0.5)
+    raise ValueError(f"unknown spread {by!r}, expected 'std', 'iqr' or 'mad'")
+
+
+def _dict_arrays(dictionary):
+    """
+    Flattens a dictionary of lists of percentiles into song ids and values.
+
+    Args: dictionary, a dictionary of song title keys and list of
+    percentiles values.
+
+    Return: a tuple of an int array of song ids, numbered in dictionary
+    order, and a float array of the percentiles.
+    """
+    lengths = np.fromiter(
+        (len(percentiles) for percentiles in dictionary.values()),
+        dtype=np.int64,
+        count=len(dictionary),
+    )
+    if dictionary and all(isinstance(v, np.ndarray) for v in dictionary.values()):
+        # array values, like the views of a rank_store.RankStore, are
+        # copied whole instead of one percentile at a time
+        values = np.concatenate(list(dictionary.values())).astype(float, copy=False)
+    else:
+        values = np.fromiter(
+            chain.from_iterable(dictionary.values()), dtype=float, count=lengths.sum()
+        )
+    return np.repeat(np.arange(len(dictionary)), lengths), values
+
+
+def spread_from_dict(dictionary, by="std"):
+    """
+    Finds group_spread for a dictionary of songs and lists of percentiles.
+
+    Args: dictionary, a dictionary of song title keys and list of
+    percentiles values. by, a string naming the measure of spread, as in
+    group_spread.
+
+    Return: a float array with the spread of each song, in dictionary
+    order.
+    """
+    song_id, values = _dict_arrays(dictionary)
+    return group_spread(song_id, values, len(dictionary), by)
+
+
+def stats_from_dict(dictionary):
+    """
+    Finds group_stats for a dictionary of songs and lists of percentiles.
+
+    Args: dictionary, a dictionary of song title keys and list of
+    percentiles values, like the one returned by get_all_ranking.
+
+    Return: a dataframe indexed by song title, with the columns described
+    in group_stats.
+    """
+    song_id, values = _dict_arrays(dictionary)
+    stats = group_stats(song_id, values, len(dictionary))
+    stats.index = pd.Index(list(dictionary), dtype=object)
+    return stats
+
+
+def _flatten(data):
+    """
+    Flattens playlists into one array of entries and their row offsets.
+
+    Args: data, a dataframe with one playlist per row, or a 2d list of
+    songs with each inner list being a playlist.
+
+    Return: a tuple of an object array of every cell, padding included,
+    and an int array of row offsets into it.
+    """
+    if is_instance(data, "pandas", "DataFrame"):
+        values = data.to_numpy(dtype=object)
+        num_rows, width = values.shape
+        return values.ravel(), np.arange(num_rows + 1) * width
+
+    lengths = [len(playlist) for playlist in data]
+    flat = np.fromiter(chain.from_iterable(data), dtype=object, count=sum(lengths))
+    return flat, np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+
+def rank_matrix_from_entries(titles, playlist_id, song_id, num_playlists):
+    """
+    Builds a RankMatrix from one row per song entry.
+
+    Args: titles, a list of strings, the song title for each song id.
+    playlist_id, an int array with the playlist of every entry, sorted,
+    and with the entries of each playlist in ranked order. song_id, an int
+    array with the song id of every entry. num_playlists, an int, the
+    number of playlists, including any empty ones.
+
+    Return: a RankMatrix holding the entries.
+    """
+    playlist_id = np.asarray(playlist_id, dtype=np.int64)
+    song_id = np.asarray(song_id, dtype=np.int64)
+    length = np.bincount(playlist_id, minlength=num_playlists)
+    offsets = np.concatenate(([0], np.cumsum(length)))
+    rank = np.arange(len(song_id)) - offsets[playlist_id] + 1
+
+    # playlist.index() ranks repeated songs by their first appearance
+    key = playlist_id * len(titles) + song_id
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    rank = rank[first][inverse.ravel()]
+
+    return RankMatrix(list(titles), offsets, song_id, rank)
+
+
+def factorize(flat):
+    """
+    Numbers the distinct values of an array in the order they are first
+    seen, like pd.factorize.
+
+    Uses pd.factorize when pandas is already imported. Otherwise int
+    arrays are numbered with np.unique, and anything else with a
+    dictionary, which is slower but doesn't import pandas just for this.
+
+    Args: flat, an int array of ids, or an object array of song titles
+    with None or NaN for padding.
+
+    Return: a tuple of an int array with the id of every cell, -1 for
+    padding, and a list of the value of each id.
+    """
+    if "pandas" in sys.modules:
+        codes, uniques = pd.factorize(flat)
+        return codes, list(uniques)
+
+    if flat.dtype.kind in "iu":
+        uniques, first, inverse = np.unique(
+            flat, return_index=True, return_inverse=True
+        )
+        order = np.argsort(first, kind="stable")
+        renumber = np.empty(len(order), dtype=np.int64)
+        renumber[order] = np.arange(len(order))
+        return renumber[inverse.ravel()], uniques[order].tolist()
+
+    ids = {}
+    codes = np.fromiter(
+        (ids.setdefault(song, len(ids)) for song in flat.tolist()),
+        dtype=np.int64,
+        count=len(flat),
+    )
+    # every NaN is its own key, so padding is dropped after numbering
+    present = [song is not None and song == song for song in ids]
+    renumber = np.full(len(ids), -1, dtype=np.int64)
+    renumber[present] = np.arange(sum(present))
+    titles = [song for song, keep in zip(ids, present) if keep]
+    return renumber[codes], titles
+
+
+def build_rank_matrix(data):
+    """
+    Interns every playlist into a RankMatrix.
+
+    Empty cells (None, NaN or "") are padding, and don't count towards
+    the length of a playlist.
+
+    Args: data, a dataframe with one playlist per row, or a 2d list of
+    songs with each inner list being a playlist. A RankMatrix, like one
+    from playlist_store.load_rank_matrix, is returned as it is, and a
+    corpus.Corpus is converted with its to_rank_matrix.
+
+    Return: a RankMatrix holding every playlist in data.
+    """
+    if isinstance(data, RankMatrix):
+        return data
+    if hasattr(data, "to_rank_matrix"):
+        return data.to_rank_matrix()
+
+    flat, raw_offsets = _flatten(data)
+    if len(flat):
+        flat[flat == ""] = None
+    codes, uniques = factorize(flat)
+
+    num_playlists = len(raw_offsets) - 1
+    row = np.repeat(np.arange(num_playlists), np.diff(raw_offsets))
+    valid = codes >= 0
+    return rank_matrix_from_entries(uniques, row[valid], codes[valid], num_playlists)
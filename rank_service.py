@@ -0,0 +1,404 @@
+"""
+A local HTTP/JSON query service over a rank store.
+
+A rank store (see rank_store.py) is the persistent inverted index: every
+song's playlists, ranks and percentiles are one slice of the mapped file.
+RankQueries loads the per-song statistics and controversy orderings from it
+once, and answers each query from memory, caching the encoded responses, so
+repeated dashboard queries don't re-run get_all_ranking. RankService serves
+the queries over keep-alive HTTP/1.1 with ETags:
+
+    GET /songs                          every song title, in first-seen order
+    GET /songs/<title>?offset=0&limit=100
+                                        a song's stats and a page of its
+                                        entries, with the title quoted, "/"
+                                        included
+    GET /albums/<name>                  an album from the albums file, like
+                                        make_dict_one_album
+    GET /album?song=<title>&song=...    the same for any list of songs
+    GET /controversial?k=10&by=std&order=most
+                                        the top k songs by spread
+
+The album queries take values=mean (the default) or values=percentiles.
+
+Example:
+    python -m rank_service mitski.rank --csv mitski_data.csv --port 8001
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import numpy as np
+from data_helpers import make_dict_one_album
+from lazy import lazy_import
+from rank_matrix import spread_from_dict
+from rank_store import RankStore, save_rank_store
+
+pd = lazy_import("pandas")
+
+
+class QueryError(Exception):
+    """
+    A query that can't be answered.
+
+    Attributes:
+        status: an int, the HTTP status to answer with.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def etag(body):
+    """
+    Makes a strong ETag for a response body.
+
+    Args:
+        body: bytes, the encoded response.
+
+    Returns: a string, the quoted tag.
+    """
+    return f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+class RankQueries:
+    """
+    Answers ranking queries about the songs of a rank store.
+
+    Attributes:
+        store: the RankStore queried.
+        cutoff: an int, songs in fewer playlists than cutoff are left out
+            of the album and controversy queries, as in get_all_ranking.
+        albums: a dictionary of album names and lists of song titles.
+        ranking: the store's get_all_ranking dictionary for cutoff.
+        averages: a dictionary of song titles and average percentiles for
+            cutoff, like get_avg_ranking.
+    """
+
+    def __init__(self, store, cutoff=5, albums=None, cache_size=4096):
+        self.store = store
+        self.cutoff = cutoff
+        self.albums = albums or {}
+        self.ranking = store.ranking(cutoff)
+        stats = store.song_stats()
+        self._stats = dict(
+            zip(stats.index, stats[["count", "mean", "std", "min", "max"]].to_numpy())
+        )
+        self.averages = {title: float(self._stats[title][1]) for title in self.ranking}
+        self._orders = {}
+        self._order("std", True)
+        self.respond = lru_cache(maxsize=cache_size)(self._respond)
+
+    def song(self, title, offset=0, limit=100):
+        """
+        Gets a song's stats and the playlists it is ranked in.
+
+        Args:
+            title: a string, the exact song title.
+            offset: an int, the first entry to include.
+            limit: an int, the most entries to include.
+
+        Returns: a dictionary with the title, count, mean, std, min and
+        max of its percentiles, and a list of {"playlist", "rank",
+        "percentile"} entries, in playlist order, from offset on.
+        """
+        if title not in self.store:
+            raise QueryError(404, f"unknown song {title!r}")
+        page = slice(max(offset, 0), max(offset, 0) + max(limit, 0))
+        playlists, ranks, percentiles = (
+            array[page] for array in self.store.entries(title)
+        )
+        count, mean, std, lowest, highest = self._stats[title].tolist()
+        return {
+            "title": title,
+            "count": int(count),
+            "mean": mean,
+            "std": std,
+            "min": lowest,
+            "max": highest,
+            "entries": [
+                {"playlist": playlist, "rank": rank, "percentile": percentile}
+                for playlist, rank, percentile in zip(
+                    playlists.tolist(), ranks.tolist(), percentiles.tolist()
+                )
+            ],
+        }
+
+    def album(self, songs, values="mean"):
+        """
+        Gets the songs of one album, like make_dict_one_album.
+
+        Args:
+            songs: a list of song titles.
+            values: a string, "mean" for average percentiles or
+            "percentiles" for every percentile.
+
+        Returns: a dictionary of the album's song titles that made the
+        cutoff and their values, in first-seen order.
+        """
+        if values == "mean":
+            return make_dict_one_album(songs, self.averages)
+        if values == "percentiles":
+            album = make_dict_one_album(songs, self.ranking)
+            return {title: array.tolist() for title, array in album.items()}
+        raise QueryError(400, f"unknown values {values!r}")
+
+    def _order(self, by, largest):
+        """
+        Sorts every song by spread, the way find_top_songs does, once.
+        """
+        key = (by, largest)
+        if key not in self._orders:
+            try:
+                spread = spread_from_dict(self.ranking, by)
+            except ValueError as error:
+                raise QueryError(400, str(error)) from error
+            sort_key = -spread if largest else spread.copy()
+            sort_key[np.isnan(sort_key)] = np.inf
+            order = np.lexsort((np.arange(len(sort_key)), sort_key))
+            titles = list(self.ranking)
+            self._orders[key] = [(titles[i], spread[i]) for i in order.tolist()]
+        return self._orders[key]
+
+    def controversial(self, k=10, by="std", order="most"):
+        """
+        Gets the k most or least controversial songs.
+
+        Args:
+            k: an int, the number of songs.
+            by: a string naming the measure of spread, "std", "iqr" or
+            "mad".
+            order: a string, "most" or "least".
+
+        Returns: a list of {"title", "spread", "mean"} dictionaries, the
+        same songs in the same order as find_most_controversial or
+        find_least_controversial on the store's ranking.
+        """
+        if order not in ("most", "least"):
+            raise QueryError(400, f"unknown order {order!r}")
+        return [
+            {"title": title, "spread": float(spread), "mean": self.averages[title]}
+            for title, spread in self._order(by, order == "most")[: max(k, 0)]
+        ]
+
+    def query(self, path):
+        """
+        Answers one request path.
+
+        Args:
+            path: a string, the path and query string of a GET request.
+
+        Returns: a JSON-serializable answer. Raises QueryError if the path
+        isn't a query.
+        """
+        parts = urlsplit(path)
+        route = [unquote(part) for part in parts.path.strip("/").split("/")]
+        params = parse_qs(parts.query)
+
+        def param(name, default):
+            value = params.get(name, [default])[0]
+            if isinstance(default, int):
+                try:
+                    return int(value)
+                except ValueError as error:
+                    raise QueryError(400, f"{name} must be an int") from error
+            return value
+
+        if route == ["songs"]:
+            return self.store.titles
+        if len(route) == 2 and route[0] == "songs":
+            return self.song(route[1], param("offset", 0), param("limit", 100))
+        if len(route) == 2 and route[0] == "albums":
+            if route[1] not in self.albums:
+                raise QueryError(404, f"unknown album {route[1]!r}")
+            return self.album(self.albums[route[1]], param("values", "mean"))
+        if route == ["album"]:
+            return self.album(params.get("song", []), param("values", "mean"))
+        if route == ["controversial"]:
+            return self.controversial(
+                param("k", 10), param("by", "std"), param("order", "most")
+            )
+        raise QueryError(404, f"unknown query {parts.path!r}")
+
+    def _respond(self, path):
+        """
+        Answers and encodes one request path. Cached by respond.
+
+        Args:
+            path: a string, the path and query string of a GET request.
+
+        Returns: a tuple of the int HTTP status, the JSON body as bytes and
+        its ETag.
+        """
+        try:
+            status, answer = 200, self.query(path)
+        except QueryError as error:
+            status, answer = error.status, {"error": str(error)}
+        body = json.dumps(answer).encode("UTF-8")
+        return status, body, etag(body)
+
+
+class RankService(ThreadingHTTPServer):
+    """
+    A threaded HTTP server answering RankQueries.
+
+    Attributes:
+        queries: the RankQueries answered.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, queries, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.queries = queries
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        The base url of the server.
+        """
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """
+        Serves in a background thread.
+
+        Returns: the server itself.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops a server started with start.
+        """
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Answers one connection's requests for a RankService.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, which Nagle's algorithm would
+    # hold back for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answers a query, or 304 if the client's copy is still current.
+        """
+        status, body, tag = self.server.queries.respond(self.path)
+        if status == 200 and tag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", tag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def measure_latency(service, paths, repeats=200):
+    """
+    Times queries to a running service over one keep-alive connection.
+
+    Args:
+        service: a started RankService.
+        paths: a list of request paths to cycle through.
+        repeats: an int, the number of requests to time.
+
+    Returns: a dictionary of the median and 99th percentile request
+    latencies, in milliseconds.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", service.server_address[1])
+    times = []
+    try:
+        for i in range(repeats):
+            start = time.perf_counter()
+            connection.request("GET", paths[i % len(paths)])
+            connection.getresponse().read()
+            times.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+    times = np.array(times) * 1000
+    return {"median": float(np.median(times)), "p99": float(np.quantile(times, 0.99))}
+
+
+def main(argv=None):
+    """
+    Serves a rank store, building it from a csv first if needed.
+
+    Args:
+        argv: a list of command line arguments, sys.argv by default.
+
+    Returns: an int exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("store", help="a rank store file")
+    parser.add_argument("--csv", help="a playlist csv to build the store from")
+    parser.add_argument("--albums", help="a JSON file of album names and songs")
+    parser.add_argument("--cutoff", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--benchmark", action="store_true", help="time some queries and exit"
+    )
+    args = parser.parse_args(argv)
+
+    if args.csv and not os.path.exists(args.store):
+        save_rank_store(args.store, pd.read_csv(args.csv, index_col=0))
+    albums = None
+    if args.albums:
+        with open(args.albums, "r", encoding="UTF-8") as file:
+            albums = json.load(file)
+    queries = RankQueries(RankStore(args.store), args.cutoff, albums)
+
+    if args.benchmark:
+        service = RankService(queries).start()
+        paths = ["/controversial?k=10"] + [
+            "/songs/" + quote(title, safe="") for title in queries.ranking
+        ]
+        for name in ("first", "cached"):
+            latency = measure_latency(service, paths, len(paths))
+            print(
+                f"{name:>6} median {latency['median']:.3f}ms "
+                f"p99 {latency['p99']:.3f}ms"
+            )
+        service.stop()
+        return 0
+
+    service = RankService(queries, args.port)
+    print(f"serving {args.store} at {service.url}", file=sys.stderr)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+A binary, memory-mapped store of ranked playlists.
+
+The file holds every song entry twice: grouped by playlist, like a
+RankMatrix, and grouped by song, an inverted layout where the playlists,
+ranks and percentiles of one song are contiguous. A RankStore opens it
+with one np.memmap and every array is a view into the mapping, so opening
+reads nothing but the header, and the percentiles of one song across every
+playlist are a slice of the file that the OS pages in on demand.
+
+Layout, all little-endian:
+    8 bytes       MAGIC
+    8 bytes       uint64, the length of the JSON header
+    header        JSON with the titles, counts and the offset, dtype and
+                  length of every section
+    sections      raw arrays, from the first ALIGNMENT byte boundary after
+                  the header, each starting on an ALIGNMENT byte boundary.
+                  Section offsets are relative to the first one.
+"""
+
+import json
+
+import numpy as np
+from lazy import lazy_import
+from rank_matrix import RankMatrix, build_rank_matrix, group_stats
+
+pd = lazy_import("pandas")
+
+MAGIC = b"SADRANK1"
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _pad(file):
+    """
+    Writes zeros up to the next ALIGNMENT byte boundary.
+
+    Args:
+        file: a binary file open for writing.
+    """
+    file.write(b"\0" * (-file.tell() % ALIGNMENT))
+
+
+def save_rank_store(path, data):
+    """
+    Writes playlists to a memory-mappable rank store.
+
+    Args:
+        path: a string, the file to write.
+        data: a dataframe with one playlist per row, a 2d list of songs
+        with each inner list being a playlist, a RankMatrix or a
+        corpus.Corpus.
+    """
+    matrix = build_rank_matrix(data)
+    order = np.argsort(matrix.song_id, kind="stable")
+    sections = {
+        "playlist_offsets": matrix.offsets.astype("<i8"),
+        "song_id": matrix.song_id.astype("<i4"),
+        "rank": matrix.rank.astype("<i4"),
+        "song_offsets": np.concatenate(([0], np.cumsum(matrix.counts()))).astype("<i8"),
+        "song_playlist": matrix.playlist_id[order].astype("<i4"),
+        "song_rank": matrix.rank[order].astype("<i4"),
+        "song_percentile": matrix.percentile[order].astype("<f8"),
+    }
+
+    layout, position = {}, 0
+    for name, array in sections.items():
+        position += -position % ALIGNMENT
+        layout[name] = [position, array.dtype.str, len(array)]
+        position += array.nbytes
+    header = json.dumps(
+        {
+            "version": VERSION,
+            "num_playlists": matrix.num_playlists,
+            "num_entries": len(matrix.song_id),
+            "titles": list(matrix.titles),
+            "sections": layout,
+        }
+    ).encode("UTF-8")
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array(len(header), dtype="<u8").tobytes())
+        file.write(header)
+        for array in sections.values():
+            _pad(file)
+            array.tofile(file)
+
+
+class RankStore:
+    """
+    A rank store file, memory-mapped read only.
+
+    Attributes:
+        path: a string, the file.
+        titles: a list of strings, the song title for each song id, in the
+            order the songs were first seen.
+        playlist_offsets: an int array of length num_playlists + 1, the
+            start of each playlist in song_id and rank.
+        song_id: an int array, the song id of every entry, by playlist.
+        rank: an int array, the 1-based rank of every entry, by playlist.
+        song_offsets: an int array of length num_songs + 1, the start of
+            each song in the song_ arrays.
+        song_playlist: an int array, the playlist of every entry, by song.
+        song_rank: an int array, the rank of every entry, by song.
+        song_percentile: a float array, the percentile of every entry, by
+            song.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._raw = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._raw[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a rank store")
+        prefix = len(MAGIC) + 8
+        length = int(self._raw[len(MAGIC) : prefix].view("<u8")[0])
+        header = json.loads(bytes(self._raw[prefix : prefix + length]))
+        start = prefix + length + -(prefix + length) % ALIGNMENT
+        if header["version"] != VERSION:
+            raise ValueError(f"unsupported rank store version {header['version']}")
+
+        self.titles = header["titles"]
+        self.num_entries = header["num_entries"]
+        self._sections = list(header["sections"])
+        for name, (offset, dtype, count) in header["sections"].items():
+            offset += start
+            nbytes = count * np.dtype(dtype).itemsize
+            setattr(self, name, self._raw[offset : offset + nbytes].view(dtype))
+        self._ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.num_playlists
+
+    def __contains__(self, title):
+        return title in self._index()
+
+    @property
+    def num_playlists(self):
+        """
+        The number of playlists stored.
+        """
+        return len(self.playlist_offsets) - 1
+
+    @property
+    def num_songs(self):
+        """
+        The number of distinct song titles stored.
+        """
+        return len(self.titles)
+
+    def close(self):
+        """
+        Lets go of the mapping. The file is unmapped once no array taken
+        from the store is left either.
+        """
+        self._raw = None
+        for name in self._sections:
+            setattr(self, name, None)
+
+    def _index(self):
+        """
+        Gets the dictionary of song titles and ids, made on first use.
+        """
+        if self._ids is None:
+            self._ids = {title: i for i, title in enumerate(self.titles)}
+        return self._ids
+
+    def song_index(self, title):
+        """
+        Finds the id of a song.
+
+        Args:
+            title: a string, the exact song title.
+
+        Returns: an int, the song id. Raises KeyError if it isn't stored.
+        """
+        return self._index()[title]
+
+    def _song_slice(self, title):
+        song = self.song_index(title)
+        return slice(int(self.song_offsets[song]), int(self.song_offsets[song + 1]))
+
+    def percentiles(self, title):
+        """
+        Gets the percentile of a song in every playlist it is in.
+
+        Args:
+            title: a string, the exact song title.
+
+        Returns: a float array view of the mapped file, in playlist order.
+        """
+        return self.song_percentile[self._song_slice(title)]
+
+    def entries(self, title):
+        """
+        Gets every entry of a song.
+
+        Args:
+            title: a string, the exact song title.
+
+        Returns: int arrays of the playlists and ranks, and a float array
+        of the percentiles, all views of the mapped file, in playlist
+        order.
+        """
+        songs = self._song_slice(title)
+        return (
+            self.song_playlist[songs],
+            self.song_rank[songs],
+            self.song_percentile[songs],
+        )
+
+    def counts(self):
+        """
+        Counts the number of entries of every song.
+
+        Returns: an int array of length num_songs.
+        """
+        return np.diff(self.song_offsets)
+
+    def playlist(self, i):
+        """
+        Gets one playlist.
+
+        Args:
+            i: an int, the index of the playlist.
+
+        Returns: a list of song titles, in ranked order.
+        """
+        start, stop = self.playlist_offsets[i], self.playlist_offsets[i + 1]
+        return [self.titles[song] for song in self.song_id[start:stop].tolist()]
+
+    def ranking(self, cutoff=1):
+        """
+        Builds the dictionary get_all_ranking returns, without copying.
+
+        Args:
+            cutoff: an int, songs that appear in fewer playlists than
+            cutoff are left out.
+
+        Returns: a dictionary with song title keys and percentile values,
+        in the order the songs were first seen. The values are views of the
+        mapped file instead of lists, and can be passed straight to
+        find_std_of_songs or annotations.make_boxplot_songs.
+        """
+        offsets = self.song_offsets.tolist()
+        return {
+            title: self.song_percentile[offsets[i] : offsets[i + 1]]
+            for i, title in enumerate(self.titles)
+            if offsets[i + 1] - offsets[i] >= cutoff
+        }
+
+    def song_stats(self, cutoff=1):
+        """
+        Finds the percentile statistics of every song from the inverted
+        layout.
+
+        Args:
+            cutoff: an int, songs that appear in fewer playlists than
+            cutoff are left out.
+
+        Returns: a dataframe indexed by song title with the columns count,
+        mean, var, std, min and max.
+        """
+        song_id = np.repeat(np.arange(self.num_songs), self.counts())
+        stats = group_stats(song_id, self.song_percentile, self.num_songs)
+        stats.index = pd.Index(self.titles, dtype=object)
+        return stats[stats["count"] >= cutoff]
+
+    def to_rank_matrix(self):
+        """
+        Views the store as a RankMatrix for the ranking functions.
+
+        Returns: a RankMatrix backed by the mapped file.
+        """
+        return RankMatrix(self.titles, self.playlist_offsets, self.song_id, self.rank)
@@ -0,0 +1,166 @@
+"""
+Running per-song ranking statistics that absorb playlists one at a time.
+"""
+
+import numpy as np
+import pandas as pd
+from rank_matrix import build_rank_matrix
+
+
+class RankingAggregator:
+    """
+    Keeps a running count, mean and M2 of every song's percentiles.
+
+    Adding or removing a playlist updates only the songs on it (Welford's
+    algorithm, merged per song with Chan's formula), so the averages and
+    standard deviations of a corpus never have to be recomputed from
+    scratch. Percentiles are found the same way as get_all_ranking.
+
+    Attributes:
+        titles: a list of strings, the song title for each song id, in the
+            order the songs were first seen.
+        num_playlists: an int, the number of playlists absorbed.
+    """
+
+    def __init__(self):
+        self.titles = []
+        self.num_playlists = 0
+        self._ids = {}
+        self._count = np.zeros(0, dtype=np.int64)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+    def _intern(self, titles):
+        """
+        Gets the song ids of titles, giving new titles the next free ids.
+
+        Args: titles, a list of strings.
+
+        Return: an int array of song ids.
+        """
+        for title in titles:
+            if title not in self._ids:
+                self._ids[title] = len(self.titles)
+                self.titles.append(title)
+        if len(self.titles) > len(self._count):
+            size = max(len(self.titles), 2 * len(self._count))
+            self._count = np.concatenate(
+                (self._count, np.zeros(size - len(self._count), dtype=np.int64))
+            )
+            self._mean = np.concatenate((self._mean, np.zeros(size - len(self._mean))))
+            self._m2 = np.concatenate((self._m2, np.zeros(size - len(self._m2))))
+        return np.array([self._ids[title] for title in titles], dtype=np.int64)
+
+    def _playlist_batch(self, playlist):
+        """
+        Groups the percentiles of one playlist by song.
+
+        Args: playlist, a list of song titles in ranked order.
+
+        Return: a tuple of int arrays of song ids and how many times each
+        is on the playlist, and a float array of each song's percentile.
+        """
+        matrix = build_rank_matrix([playlist])
+        local_ids, first, counts = np.unique(
+            matrix.song_id, return_index=True, return_counts=True
+        )
+        ids = self._intern([matrix.titles[i] for i in local_ids])
+        return ids, counts, matrix.percentile[first]
+
+    def add_playlist(self, playlist):
+        """
+        Absorbs one playlist into the running statistics.
+
+        Args: playlist, a list of song titles in ranked order. Empty
+        entries (None, NaN or "") are padding and are skipped.
+        """
+        ids, counts, percentiles = self._playlist_batch(playlist)
+        old_count = self._count[ids]
+        new_count = old_count + counts
+        delta = percentiles - self._mean[ids]
+        self._mean[ids] += delta * counts / new_count
+        self._m2[ids] += delta * delta * old_count * counts / new_count
+        self._count[ids] = new_count
+        self.num_playlists += 1
+
+    def remove_playlist(self, playlist):
+        """
+        Takes a previously added playlist back out of the statistics.
+
+        Args: playlist, a list of song titles, exactly as it was passed to
+        add_playlist.
+        """
+        ids, counts, percentiles = self._playlist_batch(playlist)
+        old_count = self._count[ids]
+        new_count = old_count - counts
+        emptied = new_count <= 0
+        # a single remaining value has no spread, don't leave rounding error
+        single = new_count <= 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            new_mean = (old_count * self._mean[ids] - counts * percentiles) / new_count
+            delta = percentiles - new_mean
+            new_m2 = self._m2[ids] - delta * delta * new_count * counts / old_count
+        self._mean[ids] = np.where(emptied, 0, new_mean)
+        self._m2[ids] = np.where(single, 0, np.maximum(new_m2, 0))
+        self._count[ids] = np.maximum(new_count, 0)
+        self.num_playlists -= 1
+
+    def snapshot(self, cutoff=1):
+        """
+        Gets the current statistics of every song.
+
+        Args: cutoff, an int, songs that appear in fewer playlists than
+        cutoff are masked out.
+
+        Return: a dataframe indexed by song title with the columns count,
+        mean, var and std, where the variance and std are population
+        statistics like find_std_of_songs.
+        """
+        num_songs = len(self.titles)
+        count = self._count[:num_songs]
+        var = self._m2[:num_songs] / np.maximum(count, 1)
+        stats = pd.DataFrame(
+            {
+                "count": count,
+                "mean": self._mean[:num_songs],
+                "var": var,
+                "std": np.sqrt(var),
+            },
+            index=pd.Index(self.titles, dtype=object),
+        )
+        return stats[stats["count"] >= max(cutoff, 1)]
+
+    def save(self, path):
+        """
+        Writes the running statistics to a .npz file.
+
+        Args: path, a string, the file to write.
+        """
+        num_songs = len(self.titles)
+        np.savez(
+            path,
+            titles=np.array(self.titles, dtype=str),
+            count=self._count[:num_songs],
+            mean=self._mean[:num_songs],
+            m2=self._m2[:num_songs],
+            num_playlists=self.num_playlists,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads running statistics written by save.
+
+        Args: path, a string, the file to read.
+
+        Return: a RankingAggregator with the saved statistics.
+        """
+        aggregator = cls()
+        with np.load(path, allow_pickle=False) as data:
+            aggregator.titles = data["titles"].tolist()
+            aggregator._ids = {title: i for i, title in enumerate(aggregator.titles)}
+            aggregator._count = data["count"].copy()
+            aggregator._mean = data["mean"].copy()
+            aggregator._m2 = data["m2"].copy()
+            aggregator.num_playlists = int(data["num_playlists"])
+        return aggregator
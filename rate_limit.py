@@ -0,0 +1,143 @@
+"""
+Rate limited, concurrent calls to the spotify API.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """
+    A token bucket shared by every thread calling the API.
+
+    Each call takes one token. Tokens refill at rate per second up to
+    capacity, and a 429 response pauses the whole bucket for its
+    Retry-After time so every thread backs off together.
+
+    Attributes:
+        rate: a number of calls allowed per second on average.
+        capacity: a number of calls allowed in a burst.
+    """
+
+    def __init__(self, rate=10, capacity=10, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            self._sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stops every thread from taking tokens for a number of seconds.
+
+        Args:
+            seconds: a number of seconds to pause for.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._tokens = 0
+
+
+def retry_after(error):
+    """
+    Gets the Retry-After time of a rate limit error.
+
+    Args:
+        error: an exception raised by an API call.
+
+    Returns: a number of seconds to wait, 0 if the response didn't say,
+    or None if error isn't a 429 rate limit response.
+    """
+    if getattr(error, "http_status", None) != 429:
+        return None
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except ValueError:
+        return 0
+
+
+def call_with_backoff(fetch, item, bucket=None, retries=3, base_delay=1):
+    """
+    Calls fetch on item, backing off and retrying on rate limit errors.
+
+    Args:
+        fetch: a function taking item that calls the API.
+        item: the argument to pass to fetch.
+        bucket: a TokenBucket to take a token from before each call, or None.
+        retries: an int, the number of times to retry a rate limited call.
+        base_delay: a number of seconds, the backoff before the first retry
+        when the response has no Retry-After. It doubles on each retry,
+        with random jitter.
+
+    Returns: the value returned by fetch.
+    """
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return fetch(item)
+        except Exception as error:  # pylint: disable=broad-except
+            wait = retry_after(error)
+            if wait is None or attempt == retries:
+                raise
+            wait = max(wait, base_delay * 2**attempt * random.uniform(0.5, 1.5))
+            if bucket is not None:
+                bucket.pause(wait)
+            else:
+                time.sleep(wait)
+    return None
+
+
+def fetch_all(items, fetch, workers=8, bucket=None, retries=3):
+    """
+    Calls fetch on every item from a pool of threads.
+
+    A failed item doesn't stop the others, its error is reported instead.
+
+    Args:
+        items: a list of arguments to pass to fetch.
+        fetch: a function taking one item that calls the API.
+        workers: an int, the most calls to have in flight at once.
+        bucket: a TokenBucket shared by every call, or None for no limit.
+        retries: an int, the number of times to retry a rate limited call.
+
+    Returns: a list of the results of fetch, in the same order as items,
+    with None for failed items, and a dictionary of the index of each
+    failed item and the exception it raised.
+    """
+    results = [None] * len(items)
+    failures = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(call_with_backoff, fetch, item, bucket, retries)
+            for item in items
+        ]
+        for i, future in enumerate(futures):
+            try:
+                results[i] = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                failures[i] = error
+    return results, failures
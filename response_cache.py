@@ -0,0 +1,113 @@
+"""
+Persistent cache for spotify api responses.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    A SQLite-backed cache of JSON values keyed by spotify uri.
+
+    Entries older than ttl seconds are stale, and are only served when
+    asked for with allow_stale. When the stored values grow past max_bytes,
+    the least recently used entries are evicted. The cache can be shared
+    between threads.
+
+    Attributes:
+        path: a string, the path of the SQLite database file.
+        ttl: a number of seconds entries stay fresh, or None to never expire.
+        max_bytes: an int, the most bytes of values to keep, or None for no
+            limit.
+    """
+
+    def __init__(self, path="spotify_cache.sqlite", ttl=None, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "stored REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def get(self, key, allow_stale=False):
+        """
+        Looks up a cached value.
+
+        Args:
+            key: a string, the key the value was stored under.
+            allow_stale: a bool, True to return the value even if it is
+            older than ttl.
+
+        Returns: the cached value, or None if there is no usable entry.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, stored FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, stored = row
+            now = time.time()
+            if not allow_stale and self.ttl is not None and now - stored > self.ttl:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(value)
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting old entries if the cache is over max_bytes.
+
+        Args:
+            key: a string to store the value under.
+            value: any value that can be written as JSON.
+        """
+        encoded = json.dumps(value)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now),
+            )
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until under max_bytes.
+        """
+        total = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        """
+        Deletes every entry.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        """
+        Closes the database file.
+        """
+        self._connection.close()
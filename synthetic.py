@@ -0,0 +1,61 @@
+"""
+Synthetic fan-made sadness rankings, for benchmarks and tests.
+"""
+
+import numpy as np
+
+
+def synthetic_playlists(
+    num_playlists,
+    catalog_size=300,
+    mean_length=50,
+    zipf=1.1,
+    reversed_fraction=0.1,
+    noise=0.15,
+    seed=0,
+):
+    """
+    Generates fan-made style sadness rankings of one made up catalog.
+
+    Every song has a true sadness position. Each playlist picks its songs
+    by Zipfian popularity, orders them by their true position plus
+    gaussian noise, and is then reversed with probability
+    reversed_fraction. Playlist 0 is always a full forward ranking and
+    playlist 1 a full reversed ranking, to use as find_anomalies models.
+
+    Args:
+        num_playlists: an int, the number of playlists, at least 2.
+        catalog_size: an int, the number of songs to pick from.
+        mean_length: a number, the mean playlist length (poisson, clipped
+        to between 2 and catalog_size).
+        zipf: a number, the exponent of the song popularity distribution.
+        reversed_fraction: a number between 0 and 1, the share of
+        playlists that are reversed.
+        noise: a number, the standard deviation of the ordering noise, as a
+        fraction of catalog_size.
+        seed: an int, the seed of the random generator.
+
+    Returns: a 2d list of song titles with each inner list being a
+    playlist, and a list of the indexes of the reversed playlists.
+    """
+    rng = np.random.default_rng(seed)
+    titles = np.array([f"song {i}" for i in range(catalog_size)], dtype=object)
+    popularity = 1 / np.arange(1, catalog_size + 1) ** zipf
+    popularity = popularity[rng.permutation(catalog_size)]
+    popularity /= popularity.sum()
+    lengths = np.clip(rng.poisson(mean_length, num_playlists), 2, catalog_size)
+    lengths[:2] = catalog_size
+    flipped = rng.random(num_playlists) < reversed_fraction
+    flipped[:2] = [False, True]
+
+    playlists = []
+    for length, flip in zip(lengths, flipped):
+        songs = rng.choice(catalog_size, size=length, replace=False, p=popularity)
+        order = songs + rng.normal(0, noise * catalog_size, length)
+        songs = songs[np.argsort(order)]
+        if flip:
+            songs = songs[::-1]
+        playlists.append(titles[songs].tolist())
+    playlists[0] = titles.tolist()
+    playlists[1] = titles[::-1].tolist()
+    return playlists, np.flatnonzero(flipped).tolist()
@@ -0,0 +1,84 @@
+"""
+Test cases for saving and batch rendering charts
+"""
+
+import os
+import matplotlib
+import pytest
+import annotations
+import data_collector
+
+matplotlib.use("Agg")
+
+RANK = {"song1": 0.2, "song2": 0.5, "song3": 0.9}
+PERCENTILES = {"song1": [0.1, 0.3], "song2": [0.5, 0.6, 0.4], "song3": [0.9]}
+
+CHART_CASES = [
+    # test the percentile timeline
+    (annotations.graph_songs_percentile, RANK),
+    # test the boxplot of percentiles
+    (annotations.make_boxplot_songs, PERCENTILES),
+]
+
+
+@pytest.fixture(autouse=True, name="album_index")
+def fixture_album_index(monkeypatch):
+    """
+    Gives the charts an album index without calling the spotify API.
+    """
+    index = {"song1": 0, "song2": 1}
+    monkeypatch.setattr(data_collector, "ALBUM_INDEX", index)
+    return index
+
+
+@pytest.mark.parametrize("chart,rank", CHART_CASES)
+def test_chart_saved_to_path(tmp_path, chart, rank):
+    """
+    Checking that a chart with a path is saved there and not returned
+
+    Args:
+        chart: the chart function.
+        rank: its data.
+    """
+
+    path = tmp_path / "chart.png"
+    assert chart(rank, "title", path=str(path)) is None
+    assert path.stat().st_size > 0
+
+
+@pytest.mark.parametrize("chart,rank", CHART_CASES)
+def test_chart_returned(chart, rank):
+    """
+    Checking that show=False returns the figure instead of showing it
+
+    Args:
+        chart: the chart function.
+        rank: its data.
+    """
+
+    fig = chart(rank, "title", show=False)
+    assert isinstance(fig, matplotlib.figure.Figure)
+    assert fig.axes[0].get_title() == "title"
+    annotations.plt.close(fig)
+
+
+def test_render_batch(tmp_path):
+    """
+    Checking that a batch of charts is saved in parallel, in job order
+    """
+
+    jobs = [
+        {
+            "chart": "graph_songs_percentile",
+            "args": [RANK, "timeline"],
+            "path": str(tmp_path / "timeline.png"),
+        },
+        {
+            "chart": "make_boxplot_songs",
+            "args": [PERCENTILES, "boxes"],
+            "path": str(tmp_path / "boxes.svg"),
+            "kwargs": {"x_label": "Tracks"},
+        },
+    ]
+    assert annotations.render_batch(jobs, processes=2) == [job["path"] for job in jobs]
+    assert all(os.path.getsize(job["path"]) > 0 for job in jobs)
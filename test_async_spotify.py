@@ -0,0 +1,231 @@
+"""
+Test cases for the pooled async backend, against the mock spotify server
+"""
+
+import asyncio
+import pytest
+import data_collector
+from async_spotify import ApiError, AsyncBackend, read_response
+from mock_spotify import MockSpotify, fixtures_from_csv
+
+FIXTURES = {
+    "playlists": {
+        "short": ["song1", "song2", "song3"],
+        "long": [f"song{i}" for i in range(250)],
+        "empty": [],
+    },
+    "albums": {"album": [f"track{i}" for i in range(120)]},
+}
+
+BACKEND_CASES = [
+    # test one connection, one request at a time
+    (1, 1, 0),
+    # test pipelining several requests on one connection
+    (1, 4, 0),
+    # test a pool of connections through rate limit responses
+    (4, 2, 3),
+]
+
+READ_RESPONSE_CASES = [
+    # test a body with a content length
+    (b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}", 200, b"{}", True),
+    # test a chunked body
+    (
+        b"HTTP/1.1 404 Not Found\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n",
+        404,
+        b"abcde",
+        True,
+    ),
+    # test a body that lasts until the connection closes
+    (b"HTTP/1.0 200 OK\r\n\r\nbody", 200, b"body", False),
+]
+
+
+@pytest.fixture(name="server")
+def fixture_server(request):
+    """
+    Starts a mock spotify server for one test.
+
+    Args:
+        request: the pytest request, with optional (rate_limit_every,)
+        params.
+    """
+    every = getattr(request, "param", 0)
+    server = MockSpotify(FIXTURES, rate_limit_every=every).start()
+    yield server
+    server.stop()
+
+
+def _backend(server, pool_size=2, pipeline_depth=1):
+    """
+    Makes an async backend talking to a mock server.
+    """
+    return AsyncBackend(
+        "id",
+        "secret",
+        api_url=server.api_url,
+        token_url=server.token_url,
+        pool_size=pool_size,
+        pipeline_depth=pipeline_depth,
+    )
+
+
+@pytest.mark.parametrize("response,status,body,keep_alive", READ_RESPONSE_CASES)
+def test_read_response(response, status, body, keep_alive):
+    """
+    Checking that raw HTTP responses are parsed
+
+    Args:
+        response: the bytes the server sends.
+        status: the expected status code.
+        body: the expected body.
+        keep_alive: whether the connection should stay open.
+    """
+
+    async def parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(response)
+        reader.feed_eof()
+        return await read_response(reader)
+
+    parsed = asyncio.run(parse())
+    assert (parsed.status, parsed.body, parsed.keep_alive) == (
+        status,
+        body,
+        keep_alive,
+    )
+
+
+@pytest.mark.parametrize("pool_size,pipeline_depth,rate_limit_every", BACKEND_CASES)
+def test_backend_fetches_every_page(pool_size, pipeline_depth, rate_limit_every):
+    """
+    Checking that every page of every playlist and album is fetched over at
+    most pool_size connections with one token
+
+    Args:
+        pool_size: the most connections to open.
+        pipeline_depth: the most requests in flight on a connection.
+        rate_limit_every: answer every nth request with a 429.
+    """
+
+    server = MockSpotify(FIXTURES, rate_limit_every=rate_limit_every).start()
+    backend = _backend(server, pool_size, pipeline_depth)
+    try:
+        uris = list(FIXTURES["playlists"])
+        assert backend.playlist_tracks_many(uris) == list(
+            FIXTURES["playlists"].values()
+        )
+        assert backend.album_tracks("album") == FIXTURES["albums"]["album"]
+        assert server.connections <= pool_size
+        assert backend.client.refreshes == 1
+    finally:
+        backend.close()
+        server.stop()
+
+
+def test_connections_open_at_once(server, monkeypatch):
+    """
+    Checking that the pool opens several connections to an origin at once
+    """
+
+    opening, most = [0], [0]
+    open_connection = asyncio.open_connection
+
+    async def slow_open_connection(*args, **kwargs):
+        opening[0] += 1
+        most[0] = max(most[0], opening[0])
+        try:
+            await asyncio.sleep(0.05)
+            return await open_connection(*args, **kwargs)
+        finally:
+            opening[0] -= 1
+
+    monkeypatch.setattr(asyncio, "open_connection", slow_open_connection)
+    backend = _backend(server, pool_size=4)
+    try:
+        assert backend.playlist_tracks_many(["short"] * 8) == [
+            FIXTURES["playlists"]["short"]
+        ] * 8
+        assert most[0] > 1
+        assert server.connections <= 4
+    finally:
+        backend.close()
+
+
+def test_token_refreshed_once_when_revoked(server):
+    """
+    Checking that concurrent requests share one refresh after a 401
+    """
+
+    backend = _backend(server, pool_size=4)
+    try:
+        backend.playlist_tracks("short")
+        server.tokens.clear()
+        assert backend.playlist_tracks_many(["long", "short", "long"])[1] == [
+            "song1",
+            "song2",
+            "song3",
+        ]
+        assert backend.client.refreshes == 2
+    finally:
+        backend.close()
+
+
+def test_missing_playlist(server):
+    """
+    Checking that a missing playlist raises an ApiError with its status
+    """
+
+    backend = _backend(server)
+    try:
+        with pytest.raises(ApiError) as error:
+            backend.playlist_tracks("missing")
+        assert error.value.http_status == 404
+    finally:
+        backend.close()
+
+
+def test_data_collector_backend(server, monkeypatch, tmp_path):
+    """
+    Checking get_all_playlists and get_tracks through the backend, with a
+    failed playlist left empty
+    """
+
+    backend = _backend(server)
+    monkeypatch.setattr(data_collector, "BACKEND", backend)
+    monkeypatch.setattr(data_collector, "CACHE", None)
+    monkeypatch.setattr(data_collector, "OFFLINE", False)
+    monkeypatch.setattr(data_collector, "TITLE_INDEX", None)
+    urls = tmp_path / "urls.txt"
+    urls.write_text(
+        "https://open.spotify.com/playlist/short?si=x\n"
+        "https://open.spotify.com/playlist/missing?si=x\n"
+        "https://open.spotify.com/playlist/long\n"
+    )
+    try:
+        with pytest.warns(UserWarning, match="missing"):
+            playlists = data_collector.get_all_playlists(str(urls))
+        assert playlists == [
+            FIXTURES["playlists"]["short"],
+            [],
+            FIXTURES["playlists"]["long"],
+        ]
+        assert data_collector.get_tracks("https://open.spotify.com/playlist/short") == [
+            "song1",
+            "song2",
+            "song3",
+        ]
+    finally:
+        backend.close()
+
+
+def test_fixtures_from_csv():
+    """
+    Checking that fixtures are recorded from a urls file and its csv
+    """
+
+    fixtures = fixtures_from_csv("mitski.txt", "mitski_data.csv")
+    first = next(iter(fixtures["playlists"].values()))
+    assert first[:2] == ["Class of 2013 - Audiotree Live Version", "Class of 2013"]
+    assert all("" not in songs for songs in fixtures["playlists"].values())
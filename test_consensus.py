@@ -0,0 +1,122 @@
+"""
+Test cases for consensus rankings from pairwise preferences
+"""
+
+import numpy as np
+import pytest
+from consensus import bradley_terry, borda_scores, consensus_scores, preference_matrix
+from data_helpers import get_consensus_ranking
+from rank_matrix import build_rank_matrix
+
+PREFERENCE_CASES = [
+    # test one playlist
+    (
+        [["song1", "song2", "song3"]],
+        [[0, 1, 1], [0, 0, 1], [0, 0, 0]],
+    ),
+    # test opposite and partial playlists adding up
+    (
+        [["song1", "song2", "song3"], ["song3", "song1"], ["song2", "song1", ""]],
+        [[0, 1, 1], [1, 0, 1], [1, 0, 0]],
+    ),
+    # test that a repeated song isn't compared with itself
+    (
+        [["song1", "song2", "song1"]],
+        [[0, 1], [1, 0]],
+    ),
+]
+
+CONSENSUS_CASES = [
+    # test that a playlist shorter than the rest ranks its songs by who
+    # they beat, not by how long the playlist is
+    (
+        [
+            ["song1", "song2", "song3", "song4", "song5", "song6"],
+            ["song1", "song2", "song3", "song4", "song5", "song6"],
+            ["song5", "song6"],
+        ],
+        ["song1", "song2", "song3", "song4", "song5", "song6"],
+    ),
+    # test agreeing partial playlists without a full one
+    (
+        [["song1", "song2", "song3"], ["song2", "song3", "song4"], ["song1", "song4"]],
+        ["song1", "song2", "song3", "song4"],
+    ),
+]
+
+
+@pytest.mark.parametrize("playlists,expected", PREFERENCE_CASES)
+def test_preference_matrix(playlists, expected):
+    """
+    Test that preferences are counted for every pair on every playlist.
+
+    Args:
+        playlists: a 2d list of song titles.
+        expected: a 2d list, the expected dense preference counts.
+    """
+    wins = preference_matrix(build_rank_matrix(playlists), max_pairs=1)
+    dense = wins.toarray()
+    assert dense[: len(expected), : len(expected[0])].tolist() == expected
+    assert dense.sum() == np.sum(expected)
+
+
+def test_borda_scores():
+    """
+    Test that the borda score is the share of comparisons lost.
+    """
+    wins = preference_matrix(build_rank_matrix([["a", "b", "c"], ["b", "a"]]))
+    assert borda_scores(wins).tolist() == pytest.approx([1 / 3, 1 / 3, 1])
+
+
+def test_bradley_terry_fixed_point():
+    """
+    Test that the fitted strengths solve the regularized likelihood
+    equations: each song's wins equal its expected wins.
+    """
+    playlists = [
+        ["song1", "song2", "song3", "song4"],
+        ["song2", "song1", "song4"],
+        ["song3", "song4", "song1"],
+        ["song4", "song2"],
+    ]
+    wins = preference_matrix(build_rank_matrix(playlists))
+    strength = bradley_terry(wins, prior=0.5)
+    games = (wins + wins.T).toarray()
+    chance = strength[:, None] / (strength[:, None] + strength[None, :])
+    expected = (games * chance).sum(axis=1) + 2 * 0.5 * strength / (strength + 1)
+    won = np.asarray(wins.sum(axis=1)).ravel() + 0.5
+    assert expected == pytest.approx(won)
+
+
+@pytest.mark.parametrize("method", ["bradley_terry", "borda"])
+@pytest.mark.parametrize("playlists,order", CONSENSUS_CASES)
+def test_consensus_order(playlists, order, method):
+    """
+    Test that the consensus scores put songs in the agreed order.
+
+    Args:
+        playlists: a 2d list of song titles.
+        order: a list of song titles, saddest first.
+        method: a string, the fitting method.
+    """
+    ranking = get_consensus_ranking(playlists, 1, method)
+    assert sorted(ranking, key=ranking.get) == order
+    assert all(0 <= score <= 1 for score in ranking.values())
+
+
+def test_consensus_cutoff():
+    """
+    Test that songs under the cutoff are left out before fitting.
+    """
+    playlists = [["song1", "song2", "song3"], ["song2", "song1"]]
+    kept, scores = consensus_scores(build_rank_matrix(playlists), "borda", 2)
+    assert kept.tolist() == [0, 1]
+    assert scores.tolist() == [0.5, 0.5]
+
+
+def test_consensus_unknown_method():
+    """
+    Test that an unknown method raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        consensus_scores(build_rank_matrix([["song1"]]), "kemeny")
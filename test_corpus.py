@@ -0,0 +1,146 @@
+"""
+Test cases for the compact playlist data model
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from corpus import Corpus, InternTable, memory_report
+from data_helpers import get_all_ranking, reverse_rows
+from rank_matrix import build_rank_matrix
+
+PLAYLISTS = [
+    ["song1", "song2", "song3"],
+    ["song3", "song1"],
+    ["song2", "song4", "song1", "song3"],
+]
+
+VIEW_CASES = [
+    # test reversing playlists
+    (
+        lambda corpus: corpus.reverse([0, 2]),
+        [
+            ["song3", "song2", "song1"],
+            ["song3", "song1"],
+            ["song3", "song1", "song4", "song2"],
+        ],
+    ),
+    # test dropping playlists
+    (lambda corpus: corpus.drop([1]), [PLAYLISTS[0], PLAYLISTS[2]]),
+    # test that reversing twice undoes it, after a drop
+    (
+        lambda corpus: corpus.drop([0]).reverse([1]).reverse([1, 0]),
+        [["song1", "song3"], PLAYLISTS[2]],
+    ),
+]
+
+
+def test_from_playlists_interns_once():
+    """
+    Checking that titles are interned in first-seen order into small ids,
+    and padding is left out
+    """
+
+    corpus = Corpus.from_playlists(pd.DataFrame(PLAYLISTS))
+    assert corpus.table.titles == ["song1", "song2", "song3", "song4"]
+    assert corpus[2].song_ids.tolist() == [1, 3, 0, 2]
+    assert corpus[2].song_ids.dtype == np.uint16
+    assert corpus[2].to_array().typecode == "H"
+    assert corpus.to_playlists() == PLAYLISTS
+
+
+def test_shared_table():
+    """
+    Checking that two corpora share one intern table
+    """
+
+    table = InternTable(["song9"])
+    first = Corpus.from_playlists(PLAYLISTS[:1], table)
+    second = Corpus.from_playlists([["song4", "song9"]], table)
+    assert second[0].song_ids.tolist() == [4, 0]
+    assert first.table is second.table
+    assert table.intern("song2") == 2
+
+
+@pytest.mark.parametrize("view,playlists", VIEW_CASES)
+def test_views(view, playlists):
+    """
+    Checking that reverse and drop make views with the expected playlists
+
+    Args:
+        view: a function making a new corpus from one.
+        playlists: the expected playlists of the new corpus.
+    """
+
+    corpus = Corpus.from_playlists(PLAYLISTS)
+    viewed = view(corpus)
+    assert viewed.to_playlists() == playlists
+    assert all(np.shares_memory(p.song_ids, corpus._song_ids) for p in viewed if len(p))
+    assert corpus.to_playlists() == PLAYLISTS
+
+
+@pytest.mark.parametrize("view,playlists", VIEW_CASES)
+def test_rank_matrix_matches_lists(view, playlists):
+    """
+    Checking that a corpus ranks exactly like the same lists
+
+    Args:
+        view: a function making a new corpus from one.
+        playlists: the same playlists as lists.
+    """
+
+    corpus = view(Corpus.from_playlists(PLAYLISTS))
+    matrix, expected = build_rank_matrix(corpus), build_rank_matrix(playlists)
+    assert matrix.titles == expected.titles
+    assert matrix.song_id.tolist() == expected.song_id.tolist()
+    assert matrix.rank.tolist() == expected.rank.tolist()
+    assert get_all_ranking(corpus, 1) == get_all_ranking(playlists, 1)
+
+
+@pytest.mark.parametrize("view,playlists", VIEW_CASES)
+def test_rank_matrix_without_pandas(monkeypatch, view, playlists):
+    """
+    Checking that a corpus interns and ranks the same way when pandas
+    hasn't been imported
+
+    Args:
+        view: a function making a new corpus from one.
+        playlists: the same playlists as lists.
+    """
+
+    expected = build_rank_matrix(playlists)
+    monkeypatch.delitem(sys.modules, "pandas")
+    matrix = build_rank_matrix(view(Corpus.from_playlists(PLAYLISTS)))
+    assert matrix.titles == expected.titles
+    assert matrix.song_id.tolist() == expected.song_id.tolist()
+    assert matrix.rank.tolist() == expected.rank.tolist()
+
+
+def test_reverse_rows():
+    """
+    Checking that reverse_rows reverses a corpus as a view and lists
+    without a dataframe
+    """
+
+    corpus = reverse_rows(Corpus.from_playlists(PLAYLISTS), [1])
+    assert corpus[1] == ["song1", "song3"]
+    assert reverse_rows([["song1", None, "song2", float("nan")]], [0]) == [
+        ["song2", "song1"]
+    ]
+
+
+def test_memory_report():
+    """
+    Checking that the corpus is the smallest storage in the report
+    """
+
+    playlists = [[f"song{(i * 7 + j) % 300}" for j in range(50)] for i in range(200)]
+    usage = Corpus.from_playlists(playlists).memory_usage()
+    assert usage["song_ids"] == 200 * 50 * 2
+    assert usage["total"] == sum(v for k, v in usage.items() if k != "total")
+    ratios = [
+        float(line.split()[-1]) for line in memory_report(playlists).splitlines()[1:]
+    ]
+    assert ratios[-1] == 1
+    assert min(ratios[:-1]) > 1
@@ -0,0 +1,274 @@
+"""
+Test cases for the spotify api functions, against a fake client
+"""
+
+import asyncio
+import json
+import pytest
+import data_collector
+from response_cache import ResponseCache
+
+PLAYLIST_PAGES = [
+    ["song1", None, "song2"],
+    ["song3", "song4"],
+    [None, "song5"],
+]
+
+ALBUM_PAGES = [["track1", "track2"], ["track3"]]
+
+PAGING_CASES = [
+    # test following every page of a playlist, skipping missing tracks
+    (data_collector.iter_tracks, False, ["song1", "song2", "song3", "song4", "song5"]),
+    # test the same while prefetching the next page
+    (data_collector.iter_tracks, True, ["song1", "song2", "song3", "song4", "song5"]),
+    # test an album
+    (data_collector.iter_album_tracks, False, ["track1", "track2", "track3"]),
+    # test an album while prefetching
+    (data_collector.iter_album_tracks, True, ["track1", "track2", "track3"]),
+]
+
+
+class FakeSpotify:
+    """
+    Serves pages of fixed playlists and albums like spotipy.Spotify.
+
+    Attributes:
+        calls: a list of (method, uri, page number) tuples, in the order
+            they were made.
+    """
+
+    def __init__(self, playlists=None, albums=None):
+        self.playlists = playlists or {}
+        self.albums = albums or {}
+        self.calls = []
+
+    def _page(self, kind, uri, number):
+        pages = (self.playlists if kind == "playlist" else self.albums)[uri]
+        if kind == "playlist":
+            items = [
+                {"track": None if name is None else {"name": name}}
+                for name in pages[number]
+            ]
+        else:
+            items = [{"name": name} for name in pages[number]]
+        following = (kind, uri, number + 1) if number + 1 < len(pages) else None
+        return {"items": items, "next": following}
+
+    def playlist_tracks(self, uri, fields=None):  # pylint: disable=unused-argument
+        self.calls.append(("playlist_tracks", uri, 0))
+        return self._page("playlist", uri, 0)
+
+    def album_tracks(self, uri):
+        self.calls.append(("album_tracks", uri, 0))
+        return self._page("album", uri, 0)
+
+    def next(self, page):
+        kind, uri, number = page["next"]
+        self.calls.append(("next", uri, number))
+        return self._page(kind, uri, number)
+
+
+@pytest.fixture(name="spotify")
+def fixture_spotify(monkeypatch):
+    """
+    Replaces the spotify client, cache and backend for one test.
+    """
+    client = FakeSpotify({"list": PLAYLIST_PAGES}, {"album": ALBUM_PAGES})
+    monkeypatch.setattr(data_collector, "SPOTIFY", client)
+    monkeypatch.setattr(data_collector, "BACKEND", None)
+    monkeypatch.setattr(data_collector, "CACHE", None)
+    monkeypatch.setattr(data_collector, "OFFLINE", False)
+    monkeypatch.setattr(data_collector, "TITLE_INDEX", None)
+    return client
+
+
+@pytest.mark.parametrize("iterate,prefetch,songs", PAGING_CASES)
+def test_every_page_in_order(spotify, iterate, prefetch, songs):
+    """
+    Checking that every page is fetched once, in order
+
+    Args:
+        iterate: iter_tracks or iter_album_tracks.
+        prefetch: whether to fetch the next page in the background.
+        songs: the expected song names.
+    """
+
+    uri = "list" if iterate is data_collector.iter_tracks else "album"
+    url = f"https://open.spotify.com/x/{uri}?si=abc"
+    assert list(iterate(url, prefetch)) == songs
+    assert [call[1:] for call in spotify.calls] == [
+        (uri, number) for number in range(len(spotify.calls))
+    ]
+    pages = PLAYLIST_PAGES if uri == "list" else ALBUM_PAGES
+    assert len(spotify.calls) == len(pages)
+
+
+def test_get_tracks_and_albums(spotify):
+    """
+    Checking that get_tracks and get_albums collect every page
+    """
+
+    assert data_collector.get_tracks("https://open.spotify.com/playlist/list") == [
+        "song1",
+        "song2",
+        "song3",
+        "song4",
+        "song5",
+    ]
+    assert data_collector.get_albums("https://open.spotify.com/album/album") == [
+        "track1",
+        "track2",
+        "track3",
+    ]
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path):
+    """
+    Makes an empty response cache for one test.
+    """
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_served_from_cache(spotify, cache):
+    """
+    Checking that a cached playlist or album isn't fetched again
+    """
+
+    data_collector.use_cache(cache)
+    playlist = "https://open.spotify.com/playlist/list?si=abc"
+    album = "https://open.spotify.com/album/album"
+    first = data_collector.get_tracks(playlist), data_collector.get_albums(album)
+    calls = len(spotify.calls)
+    assert cache.get("playlist:list") == first[0]
+    assert cache.get("album:album") == first[1]
+
+    assert (
+        data_collector.get_tracks(playlist),
+        data_collector.get_albums(album),
+    ) == first
+    assert len(spotify.calls) == calls
+
+
+def test_offline(spotify, cache):
+    """
+    Checking that offline mode serves cached responses without calling the
+    API, and raises LookupError for anything not cached
+    """
+
+    cache.set("playlist:list", ["cached1", "cached2"])
+    data_collector.use_cache(cache, offline=True)
+    assert data_collector.get_tracks("https://open.spotify.com/playlist/list") == [
+        "cached1",
+        "cached2",
+    ]
+    with pytest.raises(LookupError, match="album:album"):
+        data_collector.get_albums("https://open.spotify.com/album/album")
+    assert not spotify.calls
+
+
+@pytest.fixture(name="albums")
+def fixture_albums(monkeypatch):
+    """
+    Starts without an album index, with get_all_albums counting its calls.
+
+    Returns: a list that gets one None per call of get_all_albums.
+    """
+    calls = []
+
+    def get_all_albums():
+        calls.append(None)
+        return [["song1", "song2"], ["song2", "song3"]]
+
+    monkeypatch.setattr(data_collector, "ALBUM_INDEX", None)
+    monkeypatch.setattr(data_collector, "get_all_albums", get_all_albums)
+    return calls
+
+
+def test_album_index_built_once(albums, tmp_path):
+    """
+    Checking that the index is built once, written to a path, and written
+    to a new path from memory
+    """
+
+    path = tmp_path / "album_index.json"
+    expected = {"song1": 0, "song2": 0, "song3": 1}
+    assert data_collector.get_album_index(str(path)) == expected
+    assert json.loads(path.read_text(encoding="UTF-8")) == expected
+
+    other = tmp_path / "other.json"
+    assert data_collector.get_album_index(str(other)) == expected
+    assert json.loads(other.read_text(encoding="UTF-8")) == expected
+    assert data_collector.get_album_index() == expected
+    assert len(albums) == 1
+
+
+def test_album_index_loaded(albums, tmp_path):
+    """
+    Checking that a saved index is loaded without fetching albums
+    """
+
+    path = tmp_path / "album_index.json"
+    path.write_text(json.dumps({"saved": 4}), encoding="UTF-8")
+    assert data_collector.get_album_index(str(path)) == {"saved": 4}
+    assert data_collector.get_album_index() == {"saved": 4}
+    assert not albums
+
+
+def test_album_index_written_atomically(albums, tmp_path, monkeypatch):
+    """
+    Checking that a failed write leaves neither a partial index nor a
+    temporary file behind
+    """
+
+    path = tmp_path / "album_index.json"
+
+    def failing_dump(value, file):  # pylint: disable=unused-argument
+        file.write('{"song1": ')
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(data_collector.json, "dump", failing_dump)
+        with pytest.raises(OSError, match="disk full"):
+            data_collector.get_album_index(str(path))
+    assert not list(tmp_path.iterdir())
+
+    data_collector.get_album_index(str(path))
+    assert [file.name for file in tmp_path.iterdir()] == ["album_index.json"]
+    assert json.loads(path.read_text(encoding="UTF-8"))["song3"] == 1
+    assert len(albums) == 1
+
+
+class FakeBackend:
+    """
+    Answers playlist_tracks_many with fixed results, like an AsyncBackend
+    whose gather returned some exceptions.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def playlist_tracks_many(self, uris):
+        return self.results[: len(uris)]
+
+
+def test_cancelled_playlist_left_empty(spotify, monkeypatch, tmp_path):
+    """
+    Checking that a cancelled fetch from the backend is a failed playlist,
+    not a list of songs
+    """
+
+    backend = FakeBackend([["song1", "song2"], asyncio.CancelledError()])
+    monkeypatch.setattr(data_collector, "BACKEND", backend)
+    urls = tmp_path / "urls.txt"
+    urls.write_text(
+        "https://open.spotify.com/playlist/list\n"
+        "https://open.spotify.com/playlist/cancelled\n"
+    )
+    with pytest.warns(UserWarning, match="cancelled"):
+        assert data_collector.get_all_playlists(str(urls)) == [["song1", "song2"], []]
+    with pytest.raises(RuntimeError, match="cancelled"):
+        data_collector.get_all_playlists(str(urls), strict=True)
+    assert not spotify.calls
@@ -1,16 +1,31 @@
 """
 Test cases for data helper functions
 """
+import os
 import pytest
+import numpy as np
 import pandas as pd
+from synthetic import synthetic_playlists
 from data_helpers import (
     find_percentile,
     find_avg_percent,
     get_all_ranking,
     remove_songs,
     get_avg_ranking,
+    find_most_controversial,
+    find_least_controversial,
+    find_anomalies,
+    find_orientation_scores,
+    find_consensus_orientation,
+    classify_orientation,
+    make_dict_one_album,
+    bootstrap_avg_ranking,
+    find_std_of_songs,
+    stream_avg_ranking,
+    stream_std_of_songs,
 )
 
+MITSKI_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mitski_data.csv")
 
 AVG_PERCENT_CASES = [
     # test with one song and one number
@@ -94,6 +109,68 @@ FIND_PERCENTILE_CASES = [
     ("song5", {"song1": [0.2]}, {"song1": [0.2], "song5": [1]}),
 ]
 
+CONTROVERSY_DICT = {
+    "song1": [0.1, 0.9],
+    "song2": [0.5, 0.5],
+    "song3": [0.2, 0.6],
+    "song4": [0.3, 0.7],
+    "song5": [0.4, 0.45],
+}
+
+MOST_CONTROVERSIAL_CASES = [
+    # test that songs come back in ranked order, ties in dictionary order
+    (CONTROVERSY_DICT, 3, "std", ["song1", "song3", "song4"]),
+    # test asking for more songs than there are
+    (CONTROVERSY_DICT, 10, "std", ["song1", "song3", "song4", "song5", "song2"]),
+    # test ranking by interquartile range
+    (CONTROVERSY_DICT, 1, "iqr", ["song1"]),
+]
+
+LEAST_CONTROVERSIAL_CASES = [
+    # test that songs come back in ranked order
+    (CONTROVERSY_DICT, 2, "std", ["song2", "song5"]),
+    # test ranking by median absolute deviation
+    (CONTROVERSY_DICT, 2, "mad", ["song2", "song5"]),
+    # test with no songs asked for
+    (CONTROVERSY_DICT, 0, "std", []),
+]
+
+ANOMALY_PLAYLISTS = [
+    ["song1", "song2", "song3", "song4", "song5"],
+    ["song2", "song1", "song3", "song5", "song4"],
+    ["song5", "song4", "song3", "song2", "song1"],
+    ["song4", "song5", "song3", "song1", "song2"],
+    ["song3", "song1", "song5", "song2", "song4"],
+    ["song1", "other"],
+]
+
+ANOMALY_CASES = [
+    # test a reversed playlist, an ambiguous one and one with too few songs
+    (ANOMALY_PLAYLISTS, 0, 2, 0.7, ([4], [2, 3])),
+    # test that a higher threshold marks more playlists ambiguous
+    (ANOMALY_PLAYLISTS, 0, 2, 1.8, ([1, 3, 4], [2])),
+]
+
+CONSENSUS_ANOMALY_CASES = [
+    # test the same playlists without choosing models
+    (ANOMALY_PLAYLISTS, 0.7, ([4], [2, 3])),
+    # test that the order of the playlists doesn't matter
+    (ANOMALY_PLAYLISTS[::-1], 0.7, ([1], [2, 3])),
+    # test playlists of one song, which have nothing to disagree on
+    ([["song1"], ["song2"], ["song3"]], 0.5, ([], [])),
+]
+
+ONE_ALBUM_CASES = [
+    # test that only songs on the album are kept, in dictionary order
+    (
+        ["song3", "song1", "song9"],
+        {"song1": 0.2, "song2": 0.4, "song3": 0.6},
+        {"song1": 0.2, "song3": 0.6},
+    ),
+    # test an album with none of the songs
+    (["song9"], {"song1": [0.2, 0.4]}, {}),
+]
+
 
 @pytest.mark.parametrize("song,input_dict,output_dict", FIND_PERCENTILE_CASES)
 def test_find_percentile(song, input_dict, output_dict):
@@ -170,3 +247,199 @@ def test_get_avg_ranking(data, output_dict):
     """
 
     assert get_avg_ranking(data, 1) == output_dict
+
+
+@pytest.mark.parametrize("dictionary,num,by,songs", MOST_CONTROVERSIAL_CASES)
+def test_find_most_controversial(dictionary, num, by, songs):
+    """
+    Checking that the most spread out songs are found in ranked order
+
+    Args:
+        dictionary: a dictionary of song titles and lists of percentiles.
+        num: the number of songs to find.
+        by: the measure of spread to rank by.
+        songs: the song titles expected, most controversial first.
+    """
+
+    most = find_most_controversial(dictionary, num, by)
+    assert list(most) == songs
+    assert all(most[song] == dictionary[song] for song in songs)
+
+
+@pytest.mark.parametrize("dictionary,num,by,songs", LEAST_CONTROVERSIAL_CASES)
+def test_find_least_controversial(dictionary, num, by, songs):
+    """
+    Checking that the least spread out songs are found in ranked order
+
+    Args:
+        dictionary: a dictionary of song titles and lists of percentiles.
+        num: the number of songs to find.
+        by: the measure of spread to rank by.
+        songs: the song titles expected, least controversial first.
+    """
+
+    assert list(find_least_controversial(dictionary, num, by)) == songs
+
+
+@pytest.mark.parametrize(
+    "playlists,forward_i,backward_i,threshold,output", ANOMALY_CASES
+)
+def test_find_anomalies(playlists, forward_i, backward_i, threshold, output):
+    """
+    Checking that reversed and ambiguous playlists are found
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        forward_i: the index of the model normal order playlist.
+        backward_i: the index of the model reverse order playlist.
+        threshold: the sum of correlations under which a playlist is ambiguous.
+        output: the expected ambiguous and reversed playlist indexes.
+    """
+
+    assert find_anomalies(playlists, forward_i, backward_i, threshold) == output
+
+
+@pytest.mark.parametrize(
+    "playlists,forward_i,backward_i,threshold,output", ANOMALY_CASES
+)
+def test_classify_orientation(playlists, forward_i, backward_i, threshold, output):
+    """
+    Checking that classifying saved correlations matches find_anomalies
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        forward_i: the index of the model normal order playlist.
+        backward_i: the index of the model reverse order playlist.
+        threshold: the sum of correlations under which a playlist is ambiguous.
+        output: the expected ambiguous and reversed playlist indexes.
+    """
+
+    rho, rho_back = find_orientation_scores(playlists, forward_i, backward_i)
+    assert rho[forward_i] == pytest.approx(1)
+    assert rho_back[backward_i] == pytest.approx(1)
+    assert classify_orientation(rho, rho_back, threshold) == output
+
+
+@pytest.mark.parametrize("playlists,threshold,output", CONSENSUS_ANOMALY_CASES)
+def test_find_anomalies_without_models(playlists, threshold, output):
+    """
+    Checking that reversed and ambiguous playlists are found from the
+    consensus of all playlists
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        threshold: the sum of correlations under which a playlist is ambiguous.
+        output: the expected ambiguous and reversed playlist indexes.
+    """
+
+    assert find_anomalies(playlists, threshold=threshold) == output
+
+
+def test_consensus_orientation_synthetic():
+    """
+    Checking that the consensus finds exactly the reversed playlists of a
+    larger synthetic corpus, and scores both directions symmetrically
+    """
+
+    playlists, reversed_indexes = synthetic_playlists(500, seed=3)
+    rho, rho_back = find_consensus_orientation(playlists)
+    assert np.flatnonzero(rho < 0).tolist() == reversed_indexes
+    assert rho_back.tolist() == (-rho).tolist()
+    assert find_anomalies(playlists) == ([], reversed_indexes)
+
+
+@pytest.mark.parametrize("album,all_songs,output_dict", ONE_ALBUM_CASES)
+def test_make_dict_one_album(album, all_songs, output_dict):
+    """
+    Checking that only songs from the album are kept
+
+    Args:
+        album: a list of song titles on an album.
+        all_songs: a dictionary of song titles and their percentile data.
+        output_dict: the expected dictionary with only songs from album.
+    """
+
+    album_dict = make_dict_one_album(album, all_songs)
+    assert album_dict == output_dict
+    assert list(album_dict) == list(output_dict)
+
+
+def test_bootstrap_avg_ranking():
+    """
+    Checking bootstrap intervals surround the average and are reproducible
+    """
+
+    data = pd.DataFrame(
+        [
+            ["song1", "song2", "song3", "song4"],
+            ["song2", "song1", "song3", "song4"],
+            ["song1", "song3", "song2", "song4"],
+            ["song1", "song2", "song4", "song3"],
+        ]
+    )
+    result = bootstrap_avg_ranking(data, 1, num_resamples=200, chunk_size=64)
+    averages = get_avg_ranking(data, 1)
+
+    assert list(result.index) == list(averages)
+    assert result["mean"].tolist() == pytest.approx(list(averages.values()))
+    assert (result["low"] <= result["mean"]).all()
+    assert (result["mean"] <= result["high"]).all()
+    assert result["position"].tolist() == [1, 2, 3, 4]
+    assert result.loc["song4", "position_low"] >= 3
+    assert result.equals(
+        bootstrap_avg_ranking(data, 1, num_resamples=200, chunk_size=64)
+    )
+
+
+def test_bootstrap_same_for_any_processes():
+    """
+    Checking that the bootstrap is the same with one process or several
+    """
+
+    playlists, _ = synthetic_playlists(60, seed=4)
+    data = pd.DataFrame(playlists)
+    single = bootstrap_avg_ranking(data, 5, num_resamples=90, chunk_size=20)
+    assert single.equals(
+        bootstrap_avg_ranking(data, 5, num_resamples=90, chunk_size=20, processes=3)
+    )
+
+
+@pytest.mark.parametrize(
+    "num_resamples,chunk_size", [(0, 250), (-5, 250), (100, 0), (100, -1)]
+)
+def test_bootstrap_rejects_sizes(num_resamples, chunk_size):
+    """
+    Checking that a bootstrap without resamples or chunks raises ValueError
+
+    Args:
+        num_resamples: the number of resamples.
+        chunk_size: the number of resamples per chunk.
+    """
+
+    with pytest.raises(ValueError, match="must be positive"):
+        bootstrap_avg_ranking(
+            [["song1", "song2"]], 1, num_resamples=num_resamples, chunk_size=chunk_size
+        )
+
+
+@pytest.mark.parametrize("cutoff,chunksize", [(5, 1), (5, 7), (1, 1000)])
+def test_streaming_matches_in_memory(cutoff, chunksize):
+    """
+    Checking that streaming the csv in chunks gives the same averages,
+    standard deviations and cut off songs as loading all of it
+
+    Args:
+        cutoff: the number of playlists a song needs to be in.
+        chunksize: the number of playlists to read at once.
+    """
+
+    data = pd.read_csv(MITSKI_CSV, index_col=0)
+    averages = get_avg_ranking(data, cutoff)
+    stds = find_std_of_songs(get_all_ranking(data, cutoff))
+    streamed = stream_avg_ranking(MITSKI_CSV, cutoff, chunksize)
+    streamed_stds = stream_std_of_songs(MITSKI_CSV, cutoff, chunksize)
+
+    assert list(streamed) == list(averages)
+    assert list(streamed.values()) == pytest.approx(list(averages.values()))
+    assert list(streamed_stds) == list(stds)
+    assert list(streamed_stds.values()) == pytest.approx(list(stds.values()))
@@ -0,0 +1,69 @@
+"""
+Test cases for deferred imports and the light core import path
+"""
+
+import sys
+import pytest
+from benchmark import measure_import
+from lazy import lazy_import
+
+IMPORT_CASES = [
+    # test that the ranking helpers only need numpy
+    "data_helpers",
+    # test that the api functions don't import spotipy until login
+    "data_collector",
+    # test that the plots don't import matplotlib until drawn
+    "annotations",
+    # test that the command line pipeline starts without them too
+    "pipeline",
+]
+
+
+@pytest.mark.parametrize("module", IMPORT_CASES)
+def test_import_is_light(module):
+    """
+    Checking that importing a module in a fresh interpreter loads none of
+    pandas, scipy, matplotlib, spotipy or requests
+
+    Args:
+        module: the name of the module to import.
+    """
+
+    assert measure_import(module)["heavy"] == []
+
+
+def test_ranking_lists_is_light():
+    """
+    Checking that ranking playlists given as lists doesn't import pandas
+    """
+
+    then = "data_helpers.get_avg_ranking([['a', 'b'], ['b', None, 'a']], 1)"
+    assert measure_import("data_helpers", then)["heavy"] == []
+
+
+def test_ranking_corpus_is_light():
+    """
+    Checking that interning and ranking a Corpus doesn't import pandas
+    """
+
+    then = (
+        "corpus = __import__('corpus').Corpus.from_playlists([['a', 'b'], ['b']]); "
+        "data_helpers.get_avg_ranking(corpus.reverse([0]), 1)"
+    )
+    assert measure_import("data_helpers", then)["heavy"] == []
+
+
+def test_lazy_module():
+    """
+    Checking that a lazy module is only imported when an attribute is used
+    """
+
+    sys.modules.pop("colorsys", None)
+    colorsys = lazy_import("colorsys")
+    assert not colorsys.loaded
+    assert "colorsys" not in sys.modules
+    assert colorsys.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert colorsys.loaded
+    assert colorsys.load() is sys.modules["colorsys"]
+    with pytest.raises(AttributeError):
+        colorsys.missing  # pylint: disable=pointless-statement
@@ -0,0 +1,148 @@
+"""
+Test cases for mergeable partial aggregates
+"""
+
+import tracemalloc
+import pandas as pd
+import pytest
+from partial_aggregate import PartialAggregate, aggregate_csv, aggregate_files
+from playlist_store import save_playlists
+from rank_matrix import build_rank_matrix
+
+PLAYLISTS = [
+    ["song1", "song2", "song3", "song4"],
+    ["song2", "song1", "song3"],
+    ["song3", "song4", "song1", "song2", "song5"],
+    ["song5", "song1"],
+    ["song6", "song2", "song1"],
+]
+
+SHARD_CASES = [
+    # test one shard per playlist
+    ([[0], [1], [2], [3], [4]], 1),
+    # test uneven shards with a cutoff
+    ([[0, 1, 2], [3, 4]], 2),
+    # test shards out of order
+    ([[4, 2], [0], [3, 1]], 3),
+]
+
+
+def _assert_same_stats(stats, expected):
+    """
+    Checks that two dataframes of song statistics match.
+
+    Args:
+        stats: the dataframe to check.
+        expected: the dataframe it should match, ignoring song order.
+    """
+    assert sorted(stats.index) == sorted(expected.index)
+    stats = stats.loc[expected.index]
+    for column in expected:
+        assert stats[column].tolist() == pytest.approx(expected[column].tolist())
+
+
+@pytest.mark.parametrize("shards,cutoff", SHARD_CASES)
+def test_merge(shards, cutoff):
+    """
+    Checking that merged shards match ranking every playlist at once
+
+    Args:
+        shards: lists of the indexes of the playlists in each shard.
+        cutoff: the number of playlists a song needs to be in.
+    """
+
+    partials = [
+        PartialAggregate.from_playlists([PLAYLISTS[i] for i in shard])
+        for shard in shards
+    ]
+    merged = PartialAggregate.empty()
+    for partial in partials:
+        merged = merged + partial
+
+    assert merged.num_playlists == len(PLAYLISTS)
+    _assert_same_stats(
+        merged.finalize(cutoff), build_rank_matrix(PLAYLISTS).song_stats(cutoff)
+    )
+
+
+def test_merge_associative():
+    """
+    Checking that the grouping of merges doesn't change the result
+    """
+
+    first, second, third = (
+        PartialAggregate.from_playlists(PLAYLISTS[:2]),
+        PartialAggregate.from_playlists(PLAYLISTS[2:4]),
+        PartialAggregate.from_playlists(PLAYLISTS[4:]),
+    )
+    _assert_same_stats(
+        ((first + second) + third).finalize(), (first + (second + third)).finalize()
+    )
+
+
+def test_aggregate_files(tmp_path):
+    """
+    Checking that shard files aggregate and merge across processes
+    """
+
+    paths = []
+    for i, shard in enumerate([PLAYLISTS[:2], PLAYLISTS[2:]]):
+        path = str(tmp_path / f"shard{i}.npz")
+        save_playlists(path, shard)
+        paths.append(path)
+
+    merged = aggregate_files(paths, processes=2)
+    merged.save(str(tmp_path / "merged.npz"))
+    loaded = PartialAggregate.load(str(tmp_path / "merged.npz"))
+    _assert_same_stats(loaded.finalize(2), build_rank_matrix(PLAYLISTS).song_stats(2))
+
+
+def test_aggregate_csv_bounded_memory(tmp_path):
+    """
+    Checking that aggregating a csv in chunks matches loading it, and that
+    peak memory doesn't grow with the number of playlists
+    """
+
+    peaks = []
+    for num_playlists in (4000, 16000):
+        rows = [
+            [f"song{(i * 7 + j) % 300}" for j in range(i % 30 + 5)]
+            for i in range(num_playlists)
+        ]
+        path = str(tmp_path / f"playlists{num_playlists}.csv")
+        pd.DataFrame(rows).to_csv(path)
+
+        tracemalloc.start()
+        aggregate = aggregate_csv(path, chunksize=100)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        assert aggregate.num_playlists == num_playlists
+        _assert_same_stats(aggregate.finalize(2), build_rank_matrix(rows).song_stats(2))
+    assert peaks[1] < 1.5 * peaks[0]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 5])
+def test_aggregate_csv_matches_merge(tmp_path, chunksize):
+    """
+    Checking that adding up the chunks of a csv in place gives the same
+    aggregate as merging a partial of each chunk
+
+    Args:
+        chunksize: the number of playlists read at once.
+    """
+
+    path = str(tmp_path / "playlists.csv")
+    pd.DataFrame(PLAYLISTS).to_csv(path)
+    merged = PartialAggregate.empty()
+    for start in range(0, len(PLAYLISTS), chunksize):
+        chunk = PLAYLISTS[start : start + chunksize]
+        merged = merged + PartialAggregate.from_playlists(chunk)
+
+    aggregate = aggregate_csv(path, chunksize)
+    assert aggregate.titles == merged.titles
+    assert aggregate.num_playlists == merged.num_playlists
+    for name in ("count", "total", "total_sq", "lowest", "highest"):
+        assert getattr(aggregate, name).tolist() == pytest.approx(
+            getattr(merged, name).tolist()
+        )
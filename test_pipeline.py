@@ -0,0 +1,141 @@
+"""
+Test cases for the headless pipeline's checkpointing
+"""
+
+import json
+import os
+import pytest
+from pipeline import checkpoint, parse_artist, run_artist
+from response_cache import ResponseCache
+
+PLAYLISTS = {
+    "a": ["song1", "song2", "song3", "song4"],
+    "b": ["song2", "song1", "song3", "song4"],
+    "c": ["song4", "song3", "song2", "song1"],
+}
+
+PARSE_ARTIST_CASES = [
+    # test a urls file without models
+    ("lists/mitski.txt", ("mitski", None, None, 0.5)),
+    # test a urls file with models and a threshold
+    ("phoebe.txt:6:2:0.2", ("phoebe", 6, 2, 0.2)),
+    # test a urls file with the orientation found from all playlists
+    ("phoebe.txt:auto:0.2", ("phoebe", None, None, 0.2)),
+]
+
+
+@pytest.mark.parametrize("spec,output", PARSE_ARTIST_CASES)
+def test_parse_artist(spec, output):
+    """
+    Checking that artist arguments are split into their parts
+
+    Args:
+        spec: the command line argument.
+        output: the expected name, forward, backward and threshold.
+    """
+
+    artist = parse_artist(spec)
+    assert (
+        artist["name"],
+        artist["forward"],
+        artist["backward"],
+        artist["threshold"],
+    ) == output
+
+
+def test_checkpoint(tmp_path):
+    """
+    Checking that a stage is skipped until its fingerprint changes
+    """
+
+    calls = []
+
+    def run():
+        calls.append(1)
+        (tmp_path / "out.txt").write_text("done")
+
+    directory = str(tmp_path)
+    assert checkpoint(directory, "stage", "one", ["out.txt"], run)
+    assert not checkpoint(directory, "stage", "one", ["out.txt"], run)
+    assert checkpoint(directory, "stage", "two", ["out.txt"], run)
+    os.remove(tmp_path / "out.txt")
+    assert checkpoint(directory, "stage", "two", ["out.txt"], run)
+    assert len(calls) == 3
+
+
+def test_run_artist_offline(tmp_path):
+    """
+    Checking the fetch, orient and rank stages from a cache, then resuming
+    """
+
+    cache_path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(cache_path)
+    for uri, playlist in PLAYLISTS.items():
+        cache.set(f"playlist:{uri}", playlist)
+    cache.close()
+    urls = tmp_path / "artist.txt"
+    urls.write_text(
+        "".join(f"https://open.spotify.com/playlist/{uri}?si=x\n" for uri in PLAYLISTS)
+    )
+
+    options = {
+        "out": str(tmp_path / "output"),
+        "cache": cache_path,
+        "offline": True,
+        "cutoff": 1,
+        "top": 2,
+        "plots": False,
+    }
+    artist = parse_artist(f"{urls}:0:2")
+    assert run_artist(artist, options) == ["fetch", "orient", "rank"]
+    assert run_artist(artist, options) == []
+
+    artist = parse_artist(f"{urls}:0:2:1.5")
+    assert run_artist(artist, options) == ["orient", "rank"]
+
+    artist = parse_artist(f"{urls}:auto")
+    assert run_artist(artist, options) == ["orient", "rank"]
+    with open(tmp_path / "output" / "artist" / "orientation.json") as file:
+        assert json.load(file)["reversed"] == [2]
+    assert os.path.exists(tmp_path / "output" / "artist" / "ranking.json")
+
+
+def test_failed_fetch_not_checkpointed(tmp_path):
+    """
+    Checking that a fetch with a failed playlist isn't checkpointed, so a
+    re-run fetches it again
+    """
+
+    cache_path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(cache_path)
+    cache.set("playlist:a", PLAYLISTS["a"])
+    cache.set("playlist:b", PLAYLISTS["b"])
+    cache.close()
+    urls = tmp_path / "artist.txt"
+    urls.write_text(
+        "".join(f"https://open.spotify.com/playlist/{uri}\n" for uri in PLAYLISTS)
+    )
+
+    options = {
+        "out": str(tmp_path / "output"),
+        "cache": cache_path,
+        "offline": True,
+        "workers": 2,
+        "cutoff": 1,
+        "top": 2,
+        "plots": False,
+    }
+    artist = parse_artist(str(urls))
+    with pytest.raises(RuntimeError, match="playlist/c"):
+        run_artist(artist, options)
+    assert not os.path.exists(tmp_path / "output" / "artist" / "fetch.checkpoint.json")
+
+    cache = ResponseCache(cache_path)
+    cache.set("playlist:c", PLAYLISTS["c"])
+    cache.close()
+    assert run_artist(artist, options) == ["fetch", "orient", "rank"]
+    assert not [
+        name
+        for name in os.listdir(tmp_path / "output" / "artist")
+        if name.endswith(".tmp")
+    ]
@@ -0,0 +1,53 @@
+"""
+Test cases for long-format playlist storage
+"""
+
+import pytest
+import pandas as pd
+from data_helpers import get_all_ranking
+from playlist_store import load_playlists, load_rank_matrix, save_playlists
+
+ROUND_TRIP_CASES = [
+    # test a padded dataframe
+    (
+        pd.DataFrame([["song1", "song2", "song3"], ["song3", "song1"]]),
+        [["song1", "song2", "song3"], ["song3", "song1"]],
+    ),
+    # test a 2d list with a repeated song and an empty playlist
+    (
+        [["song1", "song2", "song1"], [], ["song2"]],
+        [["song1", "song2", "song1"], [], ["song2"]],
+    ),
+]
+
+
+@pytest.mark.parametrize("data,playlists", ROUND_TRIP_CASES)
+def test_round_trip(tmp_path, data, playlists):
+    """
+    Checking that saved playlists load back unchanged
+
+    Args:
+        tmp_path: a temporary directory for the file.
+        data: the playlists to save.
+        playlists: the expected 2d list of song titles after loading.
+    """
+
+    path = str(tmp_path / "playlists.npz")
+    save_playlists(path, data)
+    assert load_playlists(path) == playlists
+
+
+@pytest.mark.parametrize("data,playlists", ROUND_TRIP_CASES)
+def test_load_rank_matrix(tmp_path, data, playlists):
+    """
+    Checking that a loaded rank matrix ranks the same as the original data
+
+    Args:
+        tmp_path: a temporary directory for the file.
+        data: the playlists to save.
+        playlists: the expected 2d list of song titles after loading.
+    """
+
+    path = str(tmp_path / "playlists.npz")
+    save_playlists(path, data)
+    assert get_all_ranking(load_rank_matrix(path), 1) == get_all_ranking(playlists, 1)
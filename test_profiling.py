@@ -0,0 +1,66 @@
+"""
+Test cases for the opt-in profiling instrumentation
+"""
+
+import pytest
+import profiling
+
+
+@pytest.fixture(name="enabled")
+def fixture_enabled(monkeypatch):
+    """
+    Turns profiling on with an empty registry for one test.
+    """
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    profiling.reset()
+    yield
+    profiling.reset()
+
+
+def test_disabled_is_unchanged(monkeypatch):
+    """
+    Checking that functions aren't wrapped when profiling is off
+    """
+
+    monkeypatch.setattr(profiling, "ENABLED", False)
+
+    def function():
+        return 1
+
+    assert profiling.profiled(function) is function
+    assert profiling.profiled(rows=profiling.rows_of_result)(function) is function
+
+
+def test_profiled(enabled):  # pylint: disable=unused-argument
+    """
+    Checking that calls, rows and memory are recorded for each function
+    """
+
+    @profiling.profiled(rows=profiling.rows_of_first_arg)
+    def double(values):
+        return [value * 2 for value in values]
+
+    assert double([1, 2, 3]) == [2, 4, 6]
+    double([4])
+    record = profiling.records()[f"{__name__}.test_profiled.<locals>.double"]
+    assert record["calls"] == 2
+    assert record["rows"] == 4
+    assert record["seconds"] >= 0
+    assert record["peak_memory"] >= 0
+
+
+def test_nested_stages(enabled):  # pylint: disable=unused-argument
+    """
+    Checking that an inner stage's peak memory counts towards the outer one
+    """
+
+    with profiling.stage("outer"):
+        with profiling.stage("inner", rows=5):
+            block = bytearray(1_000_000)
+        del block
+
+    records = profiling.records()
+    assert records["inner"]["rows"] == 5
+    assert records["inner"]["peak_memory"] >= 1_000_000
+    assert records["outer"]["peak_memory"] >= records["inner"]["peak_memory"]
+    assert "outer" in profiling.summary()
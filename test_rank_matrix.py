@@ -0,0 +1,240 @@
+"""
+Test cases for the array-backed rank matrix
+"""
+
+import sys
+import pytest
+import pandas as pd
+import numpy as np
+from rank_matrix import (
+    build_rank_matrix,
+    group_quantile,
+    spread_from_dict,
+    stats_from_dict,
+)
+
+TO_DICT_CASES = [
+    # test that padding cells don't count towards playlist length
+    (
+        pd.DataFrame([["song1", "song2", "song3", "song4"], ["song2", "song1"]]),
+        1,
+        {
+            "song1": [0.25, 1],
+            "song2": [0.5, 0.5],
+            "song3": [0.75],
+            "song4": [1],
+        },
+    ),
+    # test a 2d list with empty strings and a cutoff
+    (
+        [["song1", "song2", ""], ["song2", "song3", "song1", "song4"]],
+        2,
+        {
+            "song1": [0.5, 0.75],
+            "song2": [1, 0.25],
+        },
+    ),
+    # test that a repeated song is ranked by its first appearance
+    (
+        [["song1", "song2", "song1", "song3"]],
+        1,
+        {
+            "song1": [0.25, 0.25],
+            "song2": [0.5],
+            "song3": [1],
+        },
+    ),
+    # test with no playlists
+    ([], 1, {}),
+]
+
+ARRAY_CASES = [
+    # test the CSR arrays of a small ragged corpus
+    (
+        [["song1", "song2"], ["song3", "song1", "song2"]],
+        ["song1", "song2", "song3"],
+        [0, 2, 5],
+        [0, 1, 2, 0, 1],
+        [1, 2, 1, 2, 3],
+    ),
+    # test that padding and repeated songs are numbered like pd.factorize
+    (
+        [["song1", None, "song2"], ["", "song2", float("nan"), "song1", "song2"]],
+        ["song1", "song2"],
+        [0, 2, 5],
+        [0, 1, 1, 0, 1],
+        [1, 2, 1, 2, 1],
+    ),
+]
+
+STATS_CASES = [
+    # test one song with several percentiles and one with a single value
+    (
+        {"song1": [0.25, 0.75], "song2": [1]},
+        {
+            "count": [2, 1],
+            "mean": [0.5, 1],
+            "var": [0.0625, 0],
+            "std": [0.25, 0],
+            "min": [0.25, 1],
+            "max": [0.75, 1],
+        },
+    ),
+]
+
+SONG_STATS_CASES = [
+    # test that songs under the cutoff are masked out
+    (
+        [["song1", "song2", "song3", "song4"], ["song2", "song1", "song3", "song5"]],
+        2,
+        {"song1": 0.375, "song2": 0.375, "song3": 0.75},
+    ),
+]
+
+QUANTILE_CASES = [
+    # test the median of an odd and an even number of values
+    ([0, 0, 0, 1, 1], [0.3, 0.1, 0.2, 0.4, 0.8], 0.5, [0.2, 0.6]),
+    # test the quartiles of one song
+    ([0, 0, 0, 0, 0], [0.1, 0.2, 0.3, 0.4, 0.5], 0.25, [0.2]),
+]
+
+SPREAD_CASES = [
+    # test each measure of spread on one song
+    ({"song1": [0.1, 0.2, 0.3, 0.4, 0.9]}, "std", [np.std([0.1, 0.2, 0.3, 0.4, 0.9])]),
+    ({"song1": [0.1, 0.2, 0.3, 0.4, 0.9]}, "iqr", [0.2]),
+    ({"song1": [0.1, 0.2, 0.3, 0.4, 0.9]}, "mad", [0.1]),
+]
+
+
+@pytest.mark.parametrize("data,cutoff,output_dict", TO_DICT_CASES)
+def test_to_dict(data, cutoff, output_dict):
+    """
+    Checking that the dictionary view matches get_all_ranking's format
+
+    Args:
+        data: a dataframe or 2d list of playlists with songs in ranked order.
+        cutoff: the number of playlists a song needs to be in.
+        output_dict: a dictionary containing song titles as keys and lists
+            of percentiles as the values
+    """
+
+    assert build_rank_matrix(data).to_dict(cutoff) == output_dict
+
+
+@pytest.mark.parametrize("data,titles,offsets,song_id,rank", ARRAY_CASES)
+def test_build_rank_matrix(data, titles, offsets, song_id, rank):
+    """
+    Checking that playlists are interned into the right flat arrays
+
+    Args:
+        data: a 2d list of playlists with songs in ranked order.
+        titles: the song titles in the order they are first seen.
+        offsets: the start of each playlist in the flat arrays.
+        song_id: the interned id of every song entry.
+        rank: the position of every song entry in its playlist.
+    """
+
+    matrix = build_rank_matrix(data)
+    assert matrix.titles == titles
+    assert matrix.offsets.tolist() == offsets
+    assert matrix.song_id.tolist() == song_id
+    assert matrix.rank.tolist() == rank
+
+
+@pytest.mark.parametrize("data,titles,offsets,song_id,rank", ARRAY_CASES)
+def test_build_rank_matrix_without_pandas(
+    monkeypatch, data, titles, offsets, song_id, rank
+):
+    """
+    Checking that playlists are interned the same way when pandas hasn't
+    been imported
+
+    Args:
+        data: a 2d list of playlists with songs in ranked order.
+        titles: the song titles in the order they are first seen.
+        offsets: the start of each playlist in the flat arrays.
+        song_id: the interned id of every song entry.
+        rank: the position of every song entry in its playlist.
+    """
+
+    monkeypatch.delitem(sys.modules, "pandas")
+    matrix = build_rank_matrix(data)
+    assert matrix.titles == titles
+    assert matrix.offsets.tolist() == offsets
+    assert matrix.song_id.tolist() == song_id
+    assert matrix.rank.tolist() == rank
+    assert matrix.mean_percentiles(2) == {
+        title: float(np.mean(values)) for title, values in matrix.to_dict(2).items()
+    }
+
+
+@pytest.mark.parametrize("dictionary,columns", STATS_CASES)
+def test_stats_from_dict(dictionary, columns):
+    """
+    Checking that every statistic is found for every song
+
+    Args:
+        dictionary: a dictionary of song titles and lists of percentiles.
+        columns: a dictionary of statistic names and their expected
+            values for each song.
+    """
+
+    stats = stats_from_dict(dictionary)
+    assert list(stats.index) == list(dictionary)
+    for column, values in columns.items():
+        assert stats[column].tolist() == pytest.approx(values)
+
+
+@pytest.mark.parametrize("data,cutoff,averages", SONG_STATS_CASES)
+def test_song_stats(data, cutoff, averages):
+    """
+    Checking that song_stats masks out songs below the cutoff
+
+    Args:
+        data: a 2d list of playlists with songs in ranked order.
+        cutoff: the number of playlists a song needs to be in.
+        averages: a dictionary of the song titles kept and their mean
+            percentile.
+    """
+
+    stats = build_rank_matrix(data).song_stats(cutoff)
+    assert dict(zip(stats.index, stats["mean"])) == pytest.approx(averages)
+
+
+@pytest.mark.parametrize("song_id,values,quantile,output", QUANTILE_CASES)
+def test_group_quantile(song_id, values, quantile, output):
+    """
+    Checking that quantiles are interpolated within each song
+
+    Args:
+        song_id: the song id of every value.
+        values: the percentiles of every song.
+        quantile: the quantile to find.
+        output: the expected quantile of each song.
+    """
+
+    result = group_quantile(np.array(song_id), np.array(values), len(output), quantile)
+    assert result.tolist() == pytest.approx(output)
+
+
+@pytest.mark.parametrize("dictionary,by,output", SPREAD_CASES)
+def test_spread_from_dict(dictionary, by, output):
+    """
+    Checking every measure of spread
+
+    Args:
+        dictionary: a dictionary of song titles and lists of percentiles.
+        by: the measure of spread.
+        output: the expected spread of each song.
+    """
+
+    assert spread_from_dict(dictionary, by).tolist() == pytest.approx(output)
+
+
+def test_spread_from_dict_unknown():
+    """
+    Checking that an unknown measure of spread raises a ValueError
+    """
+
+    with pytest.raises(ValueError):
+        spread_from_dict({"song1": [0.5]}, "range")
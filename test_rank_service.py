@@ -0,0 +1,187 @@
+"""
+Test cases for the rank store query service
+"""
+
+import http.client
+import json
+import time
+from urllib.parse import quote
+import pytest
+from data_helpers import (
+    find_least_controversial,
+    find_most_controversial,
+    get_all_ranking,
+    get_avg_ranking,
+    make_dict_one_album,
+)
+from rank_service import RankQueries, RankService
+from rank_store import RankStore, save_rank_store
+
+PLAYLISTS = [
+    ["song1", "song2", "song3", "song4"],
+    ["song2", "song1", "song3"],
+    ["song3", "song4", "song1", "song2", "song5"],
+    ["song5", "song1"],
+    ["song6", "song2", "song1", "AC/DC?"],
+    ["song1", "song4", "song2", "AC/DC?"],
+]
+
+ALBUMS = {"first": ["song2", "song4", "song6", "missing"]}
+
+CONTROVERSIAL_CASES = [
+    # test the most controversial songs
+    ("/controversial?k=2", find_most_controversial, 2, "std"),
+    # test the least controversial songs by another spread
+    ("/controversial?k=3&order=least&by=iqr", find_least_controversial, 3, "iqr"),
+    # test asking for more songs than there are
+    ("/controversial?k=50", find_most_controversial, 50, "std"),
+]
+
+ERROR_CASES = [
+    # test an unknown song
+    ("/songs/song9", 404),
+    # test an unknown album
+    ("/albums/second", 404),
+    # test an unknown query
+    ("/playlists", 404),
+    # test a bad number
+    ("/controversial?k=many", 400),
+    # test an unknown spread
+    ("/controversial?by=range", 400),
+]
+
+
+@pytest.fixture(name="queries")
+def fixture_queries(tmp_path):
+    """
+    Saves PLAYLISTS to a rank store and makes its queries with a cutoff
+    of 2.
+    """
+    path = str(tmp_path / "playlists.rank")
+    save_rank_store(path, PLAYLISTS)
+    with RankStore(path) as store:
+        yield RankQueries(store, cutoff=2, albums=ALBUMS)
+
+
+@pytest.fixture(name="service")
+def fixture_service(queries):
+    """
+    Serves the queries for one test.
+    """
+    service = RankService(queries).start()
+    yield service
+    service.stop()
+
+
+def _get(service, path, headers=None):
+    """
+    Makes one request to a service.
+
+    Returns: the status, headers and decoded JSON body, or None for an
+    empty body.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", service.server_address[1])
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, response.headers, json.loads(body) if body else None
+    finally:
+        connection.close()
+
+
+def test_song(service):
+    """
+    Checking a song's stats and entries, and a title that needs quoting
+    """
+
+    status, _, song = _get(service, "/songs/song5")
+    assert status == 200
+    assert song["count"] == 2
+    assert song["mean"] == pytest.approx((5 / 5 + 1 / 2) / 2)
+    assert song["entries"] == [
+        {"playlist": 2, "rank": 5, "percentile": 1.0},
+        {"playlist": 3, "rank": 1, "percentile": 0.5},
+    ]
+
+    _, _, song = _get(service, "/songs/" + quote("AC/DC?", safe="") + "?offset=1")
+    assert song["count"] == 2
+    assert song["entries"] == [{"playlist": 5, "rank": 4, "percentile": 1.0}]
+
+
+def test_album(service):
+    """
+    Checking named and ad hoc albums against make_dict_one_album
+    """
+
+    averages = get_avg_ranking(PLAYLISTS, 2)
+    _, _, album = _get(service, "/albums/first")
+    assert album == pytest.approx(make_dict_one_album(ALBUMS["first"], averages))
+    assert list(album) == ["song2", "song4"]
+
+    _, _, album = _get(service, "/album?song=song1&song=song5&values=percentiles")
+    assert album == make_dict_one_album(
+        ["song1", "song5"], get_all_ranking(PLAYLISTS, 2)
+    )
+
+
+@pytest.mark.parametrize("path,function,num,by", CONTROVERSIAL_CASES)
+def test_controversial(queries, path, function, num, by):
+    """
+    Checking controversy queries against data_helpers
+
+    Args:
+        path: the query.
+        function: the data_helpers function giving the same songs.
+        num: the number of songs.
+        by: the measure of spread.
+    """
+
+    status, body, _ = queries.respond(path)
+    assert status == 200
+    expected = function(get_all_ranking(PLAYLISTS, 2), num, by)
+    assert [song["title"] for song in json.loads(body)] == list(expected)
+
+
+@pytest.mark.parametrize("path,status", ERROR_CASES)
+def test_errors(service, path, status):
+    """
+    Checking that bad queries get an error status and message
+
+    Args:
+        path: the query.
+        status: the expected HTTP status.
+    """
+
+    found, _, body = _get(service, path)
+    assert found == status
+    assert "error" in body
+
+
+def test_etag(service):
+    """
+    Checking that a client's current copy gets a 304 without a body
+    """
+
+    status, headers, _ = _get(service, "/controversial")
+    assert status == 200
+    tag = headers["ETag"]
+    status, headers, body = _get(service, "/controversial", {"If-None-Match": tag})
+    assert (status, headers["ETag"], body) == (304, tag, None)
+    status, _, _ = _get(service, "/controversial?k=1", {"If-None-Match": tag})
+    assert status == 200
+
+
+def test_cached_latency(queries):
+    """
+    Checking that answered queries come back in well under a millisecond
+    """
+
+    paths = ["/songs/song1", "/albums/first", "/controversial?k=3"]
+    for path in paths:
+        queries.respond(path)
+    start = time.perf_counter()
+    for _ in range(100):
+        for path in paths:
+            queries.respond(path)
+    assert (time.perf_counter() - start) / 300 < 1e-3
@@ -0,0 +1,102 @@
+"""
+Test cases for the memory-mapped rank store
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from data_helpers import find_std_of_songs, get_all_ranking, get_avg_ranking
+from rank_matrix import build_rank_matrix
+from rank_store import RankStore, save_rank_store
+
+PLAYLISTS = [
+    ["song1", "song2", "song3", "song4"],
+    ["song2", "song1", "song3"],
+    [],
+    ["song3", "song4", "song1", "song2", "song5"],
+    ["song5", "song1", "song5"],
+]
+
+ENTRIES_CASES = [
+    # test a song in most playlists
+    ("song1", [0, 1, 3, 4], [1, 2, 3, 2]),
+    # test a song repeated in one playlist, ranked by its first appearance
+    ("song5", [3, 4, 4], [5, 1, 1]),
+    # test a song in one playlist
+    ("song4", [0, 3], [4, 2]),
+]
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    """
+    Saves PLAYLISTS to a rank store and opens it for one test.
+    """
+    path = str(tmp_path / "playlists.rank")
+    save_rank_store(path, PLAYLISTS)
+    with RankStore(path) as store:
+        yield store
+
+
+@pytest.mark.parametrize("title,playlists,ranks", ENTRIES_CASES)
+def test_entries(store, title, playlists, ranks):
+    """
+    Checking that a song's entries are slices of the mapped file
+
+    Args:
+        title: the song to look up.
+        playlists: the playlists it is in, in order.
+        ranks: its rank in each of them.
+    """
+
+    found_playlists, found_ranks, percentiles = store.entries(title)
+    assert found_playlists.tolist() == playlists
+    assert found_ranks.tolist() == ranks
+    lengths = [len(PLAYLISTS[i]) for i in playlists]
+    assert percentiles.tolist() == pytest.approx(np.divide(ranks, lengths).tolist())
+    assert isinstance(percentiles, np.memmap)
+    assert np.shares_memory(store.percentiles(title), store.song_percentile)
+
+
+@pytest.mark.parametrize("cutoff", [1, 3, 10])
+def test_ranking_matches_get_all_ranking(store, cutoff):
+    """
+    Checking that the inverted layout gives get_all_ranking's dictionary,
+    song stats and standard deviations
+
+    Args:
+        cutoff: the number of playlists a song needs to be in.
+    """
+
+    expected = get_all_ranking(PLAYLISTS, cutoff)
+    ranking = store.ranking(cutoff)
+    assert list(ranking) == list(expected)
+    assert {title: values.tolist() for title, values in ranking.items()} == expected
+    assert find_std_of_songs(ranking) == pytest.approx(find_std_of_songs(expected))
+    stats = build_rank_matrix(PLAYLISTS).song_stats(cutoff)
+    assert store.song_stats(cutoff).equals(stats)
+
+
+def test_by_playlist(store):
+    """
+    Checking the playlist layout and using the store in place of playlists
+    """
+
+    assert len(store) == len(PLAYLISTS)
+    assert store.num_entries == sum(len(playlist) for playlist in PLAYLISTS)
+    assert [store.playlist(i) for i in range(len(store))] == PLAYLISTS
+    assert get_avg_ranking(store, 1) == get_avg_ranking(PLAYLISTS, 1)
+    assert "song5" in store and "song6" not in store
+    with pytest.raises(KeyError):
+        store.percentiles("song6")
+
+
+def test_not_a_store(tmp_path):
+    """
+    Checking that other files are refused
+    """
+
+    path = tmp_path / "playlists.csv"
+    pd.DataFrame(PLAYLISTS).to_csv(path)
+    with pytest.raises(ValueError, match="not a rank store"):
+        RankStore(str(path))
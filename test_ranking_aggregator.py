@@ -0,0 +1,81 @@
+"""
+Test cases for the incremental ranking aggregator
+"""
+
+import pytest
+from rank_matrix import build_rank_matrix
+from ranking_aggregator import RankingAggregator
+
+PLAYLISTS = [
+    ["song1", "song2", "song3", "song4"],
+    ["song2", "song1", "song3"],
+    ["song3", "song4", "song1", "song2", "song5"],
+    ["song1", "song5", "song1"],
+]
+
+SNAPSHOT_CASES = [
+    # test every playlist with no cutoff
+    (PLAYLISTS, [], 1),
+    # test with a cutoff
+    (PLAYLISTS, [], 3),
+    # test removing playlists after adding them
+    (PLAYLISTS, [1, 3], 1),
+]
+
+
+def _expected_stats(playlists, cutoff):
+    """
+    Finds the statistics of playlists in one batch, for comparison.
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        cutoff: the number of playlists a song needs to be in.
+
+    Returns: a dataframe of song_stats without min and max.
+    """
+    stats = build_rank_matrix(playlists).song_stats(cutoff)
+    return stats[["count", "mean", "var", "std"]]
+
+
+@pytest.mark.parametrize("playlists,removed,cutoff", SNAPSHOT_CASES)
+def test_snapshot(playlists, removed, cutoff):
+    """
+    Checking that running statistics match a batch computation
+
+    Args:
+        playlists: a 2d list of songs, with each inner list being a playlist.
+        removed: the indexes of playlists to remove after adding them all.
+        cutoff: the number of playlists a song needs to be in.
+    """
+
+    aggregator = RankingAggregator()
+    for playlist in playlists:
+        aggregator.add_playlist(playlist)
+    for i in removed:
+        aggregator.remove_playlist(playlists[i])
+
+    kept = [playlist for i, playlist in enumerate(playlists) if i not in removed]
+    expected = _expected_stats(kept, cutoff)
+    snapshot = aggregator.snapshot(cutoff)
+    assert list(snapshot.index) == list(expected.index)
+    for column in expected:
+        assert snapshot[column].tolist() == pytest.approx(expected[column].tolist())
+
+
+def test_save_load(tmp_path):
+    """
+    Checking that saved statistics load back and keep absorbing playlists
+    """
+
+    aggregator = RankingAggregator()
+    aggregator.add_playlist(PLAYLISTS[0])
+    path = str(tmp_path / "aggregate.npz")
+    aggregator.save(path)
+
+    loaded = RankingAggregator.load(path)
+    loaded.add_playlist(PLAYLISTS[1])
+    expected = _expected_stats(PLAYLISTS[:2], 1)
+    assert loaded.num_playlists == 2
+    assert loaded.snapshot()["mean"].tolist() == pytest.approx(
+        expected["mean"].tolist()
+    )
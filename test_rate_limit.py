@@ -0,0 +1,112 @@
+"""
+Test cases for rate limited, concurrent API calls
+"""
+
+import pytest
+from rate_limit import TokenBucket, call_with_backoff, fetch_all, retry_after
+
+
+class RateLimited(Exception):
+    """
+    A stand in for spotipy's SpotifyException on a 429 response.
+    """
+
+    http_status = 429
+
+    def __init__(self, seconds):
+        super().__init__("rate limited")
+        self.headers = {"Retry-After": str(seconds)}
+
+
+class FakeClock:
+    """
+    A clock that only moves forward when something sleeps on it.
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        """
+        Gets the current fake time.
+        """
+        return self.now
+
+    def sleep(self, seconds):
+        """
+        Moves the fake time forward.
+        """
+        self.now += seconds
+
+
+RETRY_AFTER_CASES = [
+    # test a rate limit response with a Retry-After header
+    (RateLimited(3), 3),
+    # test an error that isn't a rate limit
+    (ValueError("bad url"), None),
+]
+
+
+@pytest.mark.parametrize("error,seconds", RETRY_AFTER_CASES)
+def test_retry_after(error, seconds):
+    """
+    Checking that only 429 errors get a Retry-After time
+
+    Args:
+        error: an exception raised by an API call.
+        seconds: the expected time to wait.
+    """
+
+    assert retry_after(error) == seconds
+
+
+def test_token_bucket():
+    """
+    Checking that calls past the burst capacity wait for refilled tokens
+    """
+
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock.time, sleep=clock.sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(1)
+
+    bucket.pause(5)
+    bucket.acquire()
+    assert clock.now >= 6
+
+
+def test_call_with_backoff():
+    """
+    Checking that a rate limited call is retried until it succeeds
+    """
+
+    clock = FakeClock()
+    bucket = TokenBucket(rate=100, capacity=100, clock=clock.time, sleep=clock.sleep)
+    calls = []
+
+    def fetch(item):
+        calls.append(item)
+        if len(calls) < 3:
+            raise RateLimited(2)
+        return item * 2
+
+    assert call_with_backoff(fetch, 4, bucket, base_delay=0) == 8
+    assert calls == [4, 4, 4]
+    assert clock.now >= 4
+
+
+def test_fetch_all():
+    """
+    Checking that results keep their order and failures don't stop the rest
+    """
+
+    def fetch(item):
+        if item == "bad":
+            raise ValueError(item)
+        return [item]
+
+    results, failures = fetch_all(["a", "bad", "c", "d"], fetch, workers=3)
+    assert results == [["a"], None, ["c"], ["d"]]
+    assert list(failures) == [1]
+    assert isinstance(failures[1], ValueError)
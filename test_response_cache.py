@@ -0,0 +1,67 @@
+"""
+Test cases for the spotify response cache
+"""
+
+import pytest
+from response_cache import ResponseCache
+
+SET_GET_CASES = [
+    # test a list of song names
+    ("playlist:abc", ["song1", "song2"]),
+    # test an empty playlist
+    ("playlist:empty", []),
+]
+
+
+@pytest.mark.parametrize("key,value", SET_GET_CASES)
+def test_set_get(tmp_path, key, value):
+    """
+    Checking that stored values are read back, including after reopening
+
+    Args:
+        tmp_path: a temporary directory for the database.
+        key: the key to store the value under.
+        value: the value to store.
+    """
+
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    cache.set(key, value)
+    assert cache.get(key) == value
+    cache.close()
+
+    assert ResponseCache(path).get(key) == value
+
+
+def test_missing_key(tmp_path):
+    """
+    Checking that a key that was never stored is a miss
+    """
+
+    assert ResponseCache(str(tmp_path / "cache.sqlite")).get("album:none") is None
+
+
+def test_ttl(tmp_path):
+    """
+    Checking that expired entries are only served when stale is allowed
+    """
+
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl=-1)
+    cache.set("album:abc", ["song1"])
+    assert cache.get("album:abc") is None
+    assert cache.get("album:abc", allow_stale=True) == ["song1"]
+
+
+def test_eviction(tmp_path):
+    """
+    Checking that the least recently used entry is evicted first
+    """
+
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=25)
+    cache.set("album:a", ["song1"])
+    cache.set("album:b", ["song2"])
+    cache.get("album:a")
+    cache.set("album:c", ["song3"])
+    assert cache.get("album:a") == ["song1"]
+    assert cache.get("album:b") is None
+    assert cache.get("album:c") == ["song3"]
@@ -0,0 +1,194 @@
+"""
+Test cases for canonical song titles
+"""
+
+import pytest
+from data_helpers import get_all_ranking, get_avg_ranking
+from title_index import TitleIndex, strip_version, title_key
+
+STRIP_VERSION_CASES = [
+    # test a dashed live version
+    ("Class of 2013 - Audiotree Live Version", "Class of 2013"),
+    # test a bracketed version
+    ("Square (Solo Piano Version)", "Square"),
+    # test a studio session
+    ("Scott Street - Recorded at Spotify Studios NYC", "Scott Street"),
+    # test that only the version part of the brackets is removed
+    ("Motion Sickness (Demo - Bonus Track)", "Motion Sickness"),
+    # test that a title without a version is left alone
+    ("Why Didn't You Stop Me?", "Why Didn't You Stop Me?"),
+    # test that a dash that isn't a version is left alone
+    ("A Horse - Named Cold Air", "A Horse - Named Cold Air"),
+    # test that a title that is only a version marker is kept
+    ("(Live)", "(Live)"),
+    # test a past tense version word
+    ("Blue Light (Remastered 2019)", "Blue Light"),
+    # test that a word starting with a version word isn't a version
+    ("Song (Demolition)", "Song (Demolition)"),
+    ("Live Forever (Livelihood)", "Live Forever (Livelihood)"),
+    ("Nobody - Editorial Cut", "Nobody - Editorial Cut"),
+    # test that only remaster and mix take a suffix
+    ("Nine Lives (Many Lives)", "Nine Lives (Many Lives)"),
+    ("Nine Lives (Mixed)", "Nine Lives"),
+    # test that a version word inside a dashed part isn't a version
+    ("Me - Where I Live Now", "Me - Where I Live Now"),
+    ("Me - Where I Live", "Me - Where I Live"),
+    ("Me - Live Wire", "Me - Live Wire"),
+    # test dashed versions that start or end with version words
+    ("Me - Live", "Me"),
+    ("Me - Live at Pitchfork", "Me"),
+    ("Me - 2011 Remaster", "Me"),
+    ("Me - Remastered 2019", "Me"),
+    ("Me - Radio Edit", "Me"),
+]
+
+TITLE_KEY_CASES = [
+    # test that spacing and punctuation don't matter
+    ("First Love/Late Spring", "First Love / Late Spring"),
+    # test that case doesn't matter
+    ("Didn't Know What I Was in For", "Didn't Know What I Was In For"),
+    # test that accents don't matter
+    ("Café", "Cafe"),
+]
+
+FUZZY_CASES = [
+    # test that a typo joins the known song with fuzzy matching
+    (0.9, "Last Words of a Shootng Star", "Last Words of a Shooting Star"),
+    # test that exact matching keeps a typo apart
+    (None, "Last Words of a Shootng Star", "Last Words of a Shootng Star"),
+    # test that a different first block is never compared
+    (0.5, "Lost Words of a Shooting Star", "Lost Words of a Shooting Star"),
+]
+
+
+@pytest.mark.parametrize("title,stripped", STRIP_VERSION_CASES)
+def test_strip_version(title, stripped):
+    """
+    Test that version markers are removed from titles.
+
+    Args:
+        title: a string, the title to strip.
+        stripped: a string, the expected title.
+    """
+    assert strip_version(title) == stripped
+
+
+@pytest.mark.parametrize("title,other", TITLE_KEY_CASES)
+def test_title_key(title, other):
+    """
+    Test that spellings of the same title share a key.
+
+    Args:
+        title: a string, one spelling.
+        other: a string, another spelling.
+    """
+    assert title_key(title) == title_key(other)
+
+
+def test_canonical_is_first_seen():
+    """
+    Test that variants map to the first stripped title seen, and are
+    memoized.
+    """
+    index = TitleIndex()
+    assert index.canonical("Class of 2013 - Audiotree Live Version") == "Class of 2013"
+    assert index.canonical("class of 2013") == "Class of 2013"
+    assert index.canonical("First Love / Late Spring") == "First Love / Late Spring"
+    assert index.canonical("First Love/Late Spring") == "First Love / Late Spring"
+    assert len(index._canonical) == 4
+
+
+@pytest.mark.parametrize("fuzzy,title,canonical", FUZZY_CASES)
+def test_fuzzy(fuzzy, title, canonical):
+    """
+    Test the blocked fuzzy fallback.
+
+    Args:
+        fuzzy: a float, the similarity threshold, or None.
+        title: a string, the title to look up after a known one.
+        canonical: a string, the expected canonical title.
+    """
+    index = TitleIndex(fuzzy)
+    index.canonical("Last Words of a Shooting Star")
+    assert index.canonical(title) == canonical
+
+
+def test_save_and_load(tmp_path):
+    """
+    Test that a saved index remembers its titles and keeps matching new
+    variants of them.
+    """
+    index = TitleIndex(0.9)
+    index.canonical("Liquid Smooth")
+    index.canonical("Liquid Smooth - Audiotree Live Version")
+    index.save(tmp_path / "titles.json")
+
+    loaded = TitleIndex.load(tmp_path / "titles.json")
+    assert loaded.fuzzy == 0.9
+    assert loaded._canonical == index._canonical
+    assert loaded.canonical("Liquid Smooth (Live)") == "Liquid Smooth"
+    assert loaded.canonical("Liquid Smoth") == "Liquid Smooth"
+
+
+def test_normalize_keeps_padding():
+    """
+    Test that normalize maps titles and leaves empty cells alone.
+    """
+    index = TitleIndex()
+    playlists = [["Square (Solo Piano Version)", "Square", ""], ["Shame", None]]
+    assert index.normalize(playlists) == [["Square", "Square", ""], ["Shame", None]]
+
+
+def test_rankings_merge_versions():
+    """
+    Test that get_all_ranking and get_avg_ranking merge versions of a song
+    with a title index, and keep them apart without one.
+    """
+    playlists = [
+        ["Class of 2013 - Audiotree Live Version", "Pearl Diver", "Nobody", "Wife"],
+        ["Pearl Diver", "Class of 2013"],
+    ]
+    assert "Class of 2013" not in get_all_ranking(playlists, 2)
+
+    index = TitleIndex()
+    assert get_all_ranking(playlists, 2, index) == {
+        "Class of 2013": [0.25, 1],
+        "Pearl Diver": [0.5, 0.5],
+    }
+    assert get_avg_ranking(playlists, 2, index) == {
+        "Class of 2013": 0.625,
+        "Pearl Diver": 0.5,
+    }
+
+
+def test_versions_in_one_playlist_count_once():
+    """
+    Test that a playlist with two versions of a song counts it once, at
+    the rank of the first, towards the cutoff.
+    """
+    playlists = [
+        ["Nobody", "Pearl Diver", "Nobody - Live", "Wife"],
+        ["Wife", "Nobody"],
+    ]
+    index = TitleIndex()
+    assert get_all_ranking(playlists, 2, index) == {
+        "Nobody": [1 / 3, 1],
+        "Wife": [1, 0.5],
+    }
+    assert "Nobody" not in get_all_ranking(playlists[:1], 2, index)
+
+
+def test_repeated_titles_kept():
+    """
+    Test that a title index only collapses different versions in a
+    playlist, and leaves repeats of the same title as they are without one.
+    """
+    playlists = [["Wife", "Nobody", "Wife", "Wife - Live"], ["Nobody", "Wife"]]
+    assert get_all_ranking(playlists, 1, TitleIndex()) == get_all_ranking(
+        [playlists[0][:3], playlists[1]], 1
+    )
+    assert get_all_ranking(playlists, 1, TitleIndex())["Wife"] == [
+        1 / 3,
+        1 / 3,
+        1,
+    ]
@@ -0,0 +1,238 @@
+"""
+Canonical song titles for live, remastered and other alternate versions.
+
+Spotify lists versions such as "Class of 2013 - Audiotree Live Version" or
+"Square (Solo Piano Version)" as separate songs. A TitleIndex maps every
+title to one canonical title per song, remembering each answer so a title
+is only normalized once, and can be saved between runs.
+"""
+
+import json
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+VERSION_WORDS = (
+    "version",
+    "live",
+    "remaster",
+    "remastered",
+    "demo",
+    "acoustic",
+    "recorded",
+    "session",
+    "sessions",
+    "edit",
+    "mix",
+    "mixed",
+    "mono",
+    "stereo",
+    "instrumental",
+    "piano",
+)
+
+# the version words that can end a dashed version, like "2011 Remaster" or
+# "Radio Edit". "Live" or "Piano" ending a dashed part is usually part of
+# the title, like "Me - Where I Live"
+ENDING_WORDS = (
+    "version",
+    "remaster",
+    "remastered",
+    "edit",
+    "mix",
+    "mixed",
+    "demo",
+    "mono",
+    "stereo",
+    "instrumental",
+    "session",
+    "sessions",
+)
+
+_VERSION = "|".join(re.escape(word) for word in VERSION_WORDS)
+_ENDING = "|".join(re.escape(word) for word in ENDING_WORDS)
+# whole words only, so "(Demolition)" or "(Many Lives)" aren't versions
+_WORD = rf"\b(?:{_VERSION})\b"
+_YEAR = r"(?:\s+\d{4})?"
+_BRACKETED = re.compile(rf"\s*[\(\[][^\)\]]*{_WORD}[^\)\]]*[\)\]]", re.I)
+# a dashed part is a version if it starts with version words, followed by
+# nothing, a year, or a place like "Live at Pitchfork", or if it ends with
+# one, like "Audiotree Live Version" or "2011 Remaster"
+_DASHED = re.compile(
+    rf"\s+-\s+(?:{_WORD}(?:\s+{_WORD})*(?:{_YEAR}|\s+(?:at|from|in|on)\s.*)"
+    rf"|[^-]*\b(?:{_ENDING}){_YEAR})\s*$",
+    re.I,
+)
+_NOT_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def strip_version(title):
+    """
+    Removes version markers from a title.
+
+    Args:
+        title: a string, a song title.
+
+    Returns: the title without bracketed or " - " suffixes that name a
+    version, like "(Solo Piano Version)" or " - Audiotree Live Version".
+    """
+    stripped = _DASHED.sub("", _BRACKETED.sub("", title)).strip()
+    return stripped or title.strip()
+
+
+def title_key(title):
+    """
+    Finds the lookup key of a title.
+
+    Args:
+        title: a string, a song title.
+
+    Returns: a string, the title without version markers, case, accents,
+    punctuation or repeated spaces.
+    """
+    text = unicodedata.normalize("NFKD", strip_version(title))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _NOT_WORD.sub(" ", text.casefold())
+    return _SPACES.sub(" ", text).strip()
+
+
+class TitleIndex:
+    """
+    A memoized map from song titles to canonical titles.
+
+    Titles with the same title_key share the canonical title of the first
+    one seen, without its version markers. With fuzzy set, a title whose
+    key is new is also compared to the known keys sharing its first
+    block_size characters, and joins the closest one whose similarity is at
+    least fuzzy, so the fuzzy search stays near linear in catalog size.
+
+    Attributes:
+        fuzzy: a float between 0 and 1, the similarity needed to join a
+            known song, or None to only match exact keys.
+        block_size: an int, the length of the key prefix that fuzzy
+            candidates must share.
+    """
+
+    def __init__(self, fuzzy=None, block_size=4):
+        self.fuzzy = fuzzy
+        self.block_size = block_size
+        self._canonical = {}
+        self._by_key = {}
+        self._blocks = {}
+
+    def _add_key(self, key, canonical):
+        """
+        Remembers the canonical title of a new key.
+
+        Args:
+            key: a string from title_key.
+            canonical: a string, the canonical title for key.
+        """
+        self._by_key[key] = canonical
+        self._blocks.setdefault(key[: self.block_size], []).append(key)
+
+    def _fuzzy_match(self, key):
+        """
+        Finds the most similar known key in the same block.
+
+        Args:
+            key: a string from title_key.
+
+        Returns: the matching known key, or None.
+        """
+        best, best_ratio = None, self.fuzzy
+        for candidate in self._blocks.get(key[: self.block_size], []):
+            ratio = SequenceMatcher(None, key, candidate).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return best
+
+    def canonical(self, title):
+        """
+        Finds the canonical title of a song.
+
+        Args:
+            title: a string, a song title.
+
+        Returns: a string, the canonical title.
+        """
+        if title in self._canonical:
+            return self._canonical[title]
+
+        key = title_key(title)
+        if key not in self._by_key:
+            match = self._fuzzy_match(key) if self.fuzzy is not None else None
+            if match is not None:
+                self._by_key[key] = self._by_key[match]
+            else:
+                self._add_key(key, strip_version(title))
+        self._canonical[title] = self._by_key[key]
+        return self._canonical[title]
+
+    def normalize(self, playlists):
+        """
+        Maps every title in playlists to its canonical title.
+
+        Args:
+            playlists: a 2d list of songs, with each inner list being a
+            playlist.
+
+        Returns: a new 2d list with canonical titles. Empty entries are kept
+        as they are.
+        """
+        return [
+            [
+                self.canonical(song) if isinstance(song, str) and song else song
+                for song in playlist
+            ]
+            for playlist in playlists
+        ]
+
+    def mapping(self, titles):
+        """
+        Finds the canonical title of many titles.
+
+        Args:
+            titles: a list of strings.
+
+        Returns: a list of the canonical title of each.
+        """
+        return [self.canonical(title) for title in titles]
+
+    def save(self, path):
+        """
+        Writes every title seen so far and its canonical title to JSON.
+
+        Args:
+            path: a string, the file to write.
+        """
+        with open(path, "w", encoding="UTF-8") as file:
+            json.dump(
+                {
+                    "fuzzy": self.fuzzy,
+                    "block_size": self.block_size,
+                    "titles": self._canonical,
+                },
+                file,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by save.
+
+        Args:
+            path: a string, the file to read.
+
+        Returns: a TitleIndex that remembers every saved title.
+        """
+        with open(path, "r", encoding="UTF-8") as file:
+            saved = json.load(file)
+        index = cls(saved["fuzzy"], saved["block_size"])
+        for title, canonical in saved["titles"].items():
+            key = title_key(title)
+            if key not in index._by_key:
+                index._add_key(key, canonical)
+            index._canonical[title] = canonical
+        return index